@@ -1,17 +1,36 @@
-from flask import Flask, render_template, request, jsonify
-import folium
+import gzip
+import hashlib
+import json
+import time
 
-from main import get_passage_plan_bucks_to_somes, refine_passage_geospatial
-from feature_map import get_all_features, add_features_to_map
-from config import ES_FEATURES_INDEX, es
+import numpy as np
+from flask import Flask, render_template, request, jsonify, Response, g
+
+from main import get_passage_plan_bucks_to_somes
+from passage import refine_passage_geospatial_array, refined_point_count, simplify_passage_array
+from route_format import ROUTE_FORMATS, MIMETYPES, encode_route, route_key
+from feature_map import features_to_geojson, view_to_geojson
+from coords import parse_dms_pair
+from geoindex import parse_distance
+from backend import get_backend
+from cache import VersionedValue, LRUCache
+from config import (SEARCH_BACKEND, PROFILE_REQUESTS, ROUTE_INTERPOLATION_KM, ROUTE_SIMPLIFY_PIXELS,
+                    ROUTE_MAX_POINTS, ROUTE_CACHE_SIZE, get_async_es)
+from metrics import metrics, RequestProfiler
 
 app = Flask(__name__)
+backend = get_backend()
 
-@app.route('/')
-def index():
+
+@metrics.timed("map_render", view="index")
+def render_index_page() -> str:
+    import folium
+    from map_elements import AltClickJS, ViewportFeaturesJS
     # Default route: Bucks Harbour to Somes Sound
     waypoints = get_passage_plan_bucks_to_somes()
-    refined = refine_passage_geospatial(waypoints, 10.0)
+    # One polyline, simplified for the initial zoom, instead of every interpolated point
+    refined = simplify_passage_array(refine_passage_geospatial_array(waypoints, ROUTE_INTERPOLATION_KM), 9,
+                                     ROUTE_SIMPLIFY_PIXELS).tolist()
     # Generate map HTML
     avg_lat = sum(p[0] for p in waypoints) / len(waypoints)
     avg_lon = sum(p[1] for p in waypoints) / len(waypoints)
@@ -19,37 +38,213 @@ def index():
     folium.PolyLine(locations=refined, color='red', weight=3, opacity=0.8, tooltip="Refined Passage").add_to(m)
     for point in waypoints:
         folium.Marker(location=point, popup=f"Waypoint\n({point[0]:.4f}, {point[1]:.4f})", icon=folium.Icon(color='blue', icon='flag')).add_to(m)
-    # Load features from Elasticsearch and add to map
-    features = get_all_features(es, ES_FEATURES_INDEX)
-    add_features_to_map(m, features)
-    # Inject JS for ALT+click event in the map iframe
-    from folium import MacroElement
-    from jinja2 import Template
-    class AltClickJS(MacroElement):
-        _template = Template(r"""
-{% macro script(this, kwargs) %}
-if (typeof window.L !== 'undefined' && {{this._parent.get_name()}}) {
-    {{this._parent.get_name()}}.on('click', function(e) {
-        if (e.originalEvent && e.originalEvent.altKey) {
-            window.parent.postMessage({lat: e.latlng.lat, lng: e.latlng.lng, alt: true}, '*');
-        }
-    });
-}
-{% endmacro %}
-""")
+    # Features are fetched per viewport from /api/features by the page itself
+    m.add_child(ViewportFeaturesJS('/api/features'))
     m.get_root().add_child(AltClickJS())
     map_html = m._repr_html_()
     return render_template('index.html', map_html=map_html, sailing_directions="Sailing directions will appear here.")
 
+
+def encoded_payload(body: str | bytes) -> dict:
+    """Precomputed body, gzip body and ETag for a cached response."""
+    raw = body.encode("utf-8") if isinstance(body, str) else body
+    return {"raw": raw, "gzip": gzip.compress(raw, 6), "etag": hashlib.sha1(raw).hexdigest()}
+
+
+def cached_response(payload: dict, mimetype: str) -> Response:
+    """Serve a precomputed payload, honouring If-None-Match and Accept-Encoding: gzip."""
+    if request.if_none_match.contains(payload["etag"]):
+        resp = Response(status=304)
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        resp = Response(payload["gzip"], mimetype=mimetype)
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(payload["raw"], mimetype=mimetype)
+    resp.set_etag(payload["etag"])
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+@metrics.timed("map_render", view="geojson")
+def render_features_geojson() -> str:
+    return json.dumps(features_to_geojson(backend.feature_table()))
+
+
+# The page no longer embeds features, so it is rendered once; the full GeoJSON export is
+# rebuilt only when the features index changes.
+index_page = VersionedValue(lambda: None, lambda: encoded_payload(render_index_page()))
+features_geojson = VersionedValue(backend.features_version, lambda: encoded_payload(render_features_geojson()))
+# Encoded /api/route responses keyed by waypoint hash + parameters
+route_cache = LRUCache("route", ROUTE_CACHE_SIZE)
+metrics.register_collector("route_cache", route_cache.stats)
+
+
+# Per-request latency / status metrics, and ?profile=1 (cProfile) or ?profile=pyinstrument
+# returning a profile of the request instead of its response when PROFILE_REQUESTS is on.
+@app.before_request
+def start_request():
+    g.started = time.perf_counter()
+    kind = request.args.get('profile') if PROFILE_REQUESTS else None
+    g.profiler = RequestProfiler(kind) if kind else None
+
+@app.after_request
+def finish_request(resp):
+    endpoint = request.endpoint or 'unmatched'
+    metrics.observe('http', time.perf_counter() - g.started, endpoint=endpoint)
+    metrics.inc('http_requests', endpoint=endpoint, status=resp.status_code)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        return Response(profiler.stop(), mimetype=profiler.mimetype)
+    return resp
+
+@app.teardown_request
+def count_request_error(exc):
+    if exc is not None:
+        metrics.inc('errors', stage='http')
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/')
+def index():
+    _, payload = index_page.get()
+    return cached_response(payload, "text/html")
+
+@app.route('/api/features.geojson')
+def api_features_geojson():
+    _, payload = features_geojson.get()
+    return cached_response(payload, "application/geo+json")
+
+@app.route('/api/features')
+def api_features():
+    try:
+        bbox = [float(v) for v in request.args['bbox'].split(',')]
+        zoom = int(request.args.get('zoom', 9))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'bbox=west,south,east,north and integer zoom required'}), 400
+    if len(bbox) != 4 or not np.isfinite(bbox).all():
+        return jsonify({'error': 'bbox=west,south,east,north and integer zoom required'}), 400
+    items, total = backend.features_in_view(bbox, zoom)
+    with metrics.timer('map_render', view='viewport'):
+        body = json.dumps(view_to_geojson(items, total), separators=(',', ':'))
+    return cached_response(encoded_payload(body), "application/geo+json")
+
+def run_search(name, *args, **kwargs):
+    """
+    Elasticsearch searches go through the shared async service (one pooled event loop) when an
+    async client is available; otherwise, and for other backends, they run inline on the backend.
+    """
+    if SEARCH_BACKEND == "elasticsearch" and get_async_es() is not None:
+        from async_search import get_async_search
+        service = get_async_search()
+        return service.run(getattr(service, name)(*args, **kwargs))
+    return getattr(backend, name)(*args, **kwargs)
+
+@app.route('/api/search')
+def api_search():
+    q = request.args.get('q', '').strip()
+    mode = request.args.get('mode', 'hybrid')
+    if not q or mode not in ('semantic', 'lexical', 'hybrid'):
+        return jsonify({'error': 'q and mode=semantic|lexical|hybrid required'}), 400
+    try:
+        k, alpha = int(request.args.get('k', 5)), float(request.args.get('alpha', 0.5))
+    except ValueError:
+        return jsonify({'error': 'k must be an integer and alpha a number'}), 400
+    if mode == 'semantic':
+        return jsonify(run_search('semantic_search', q, k=k))
+    if mode == 'lexical':
+        return jsonify(run_search('lexical_search', q))
+    return jsonify(run_search('hybrid_search', q, alpha=alpha, k=k))
+
+@app.route('/api/route_context', methods=['POST'])
+def api_route_context():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON body {query, coords, distance, k} required'}), 400
+    query, coords = data.get('query', ''), data.get('coords', [])
+    if not isinstance(query, str) or not isinstance(coords, list) or not all(isinstance(c, str) for c in coords):
+        return jsonify({'error': 'query must be a string and coords a list of DDM coordinate strings'}), 400
+    try:
+        distance, k = data.get('distance', '2km'), int(data.get('k', 5))
+        # Validated here: inside the search (or its asyncio.gather) they would surface as 500s
+        parse_distance(distance)
+        for c in coords:
+            parse_dms_pair(c)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Bad route_context request: {e}'}), 400
+    return jsonify(run_search('route_context', query, coords, distance=distance, k=k))
+
+@metrics.timed("map_render", view="route")
+def render_route(waypoints, fmt: str, interpolation_km: float, zoom, precision: int) -> dict:
+    refined = refine_passage_geospatial_array(waypoints, interpolation_km)
+    points = refined if zoom is None else simplify_passage_array(refined, zoom, ROUTE_SIMPLIFY_PIXELS)
+    properties = {"points": len(points), "refined_points": len(refined), "interpolation_km": interpolation_km}
+    if zoom is not None:
+        properties["zoom"] = zoom
+    return encoded_payload(encode_route(points, fmt, precision, properties))
+
 @app.route('/api/route', methods=['POST'])
 def api_route():
-    data = request.json
+    """
+    Refined passage through {waypoints: [[lat, lon], ...]}. Optional: interpolation_km,
+    format (json = {"refined": [...]}, polyline, float32 = packed little-endian lat/lon
+    pairs, geojson), zoom (Douglas-Peucker simplify for display at that zoom) and
+    precision (polyline decimals). Responses are cached, gzipped and ETagged.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON body {waypoints, ...} required'}), 400
     waypoints = data.get('waypoints', [])
     if not waypoints:
         return jsonify({'error': 'No waypoints provided'}), 400
-    refined = refine_passage_geospatial(waypoints, 10.0)
-    # For demo, just return the refined route
-    return jsonify({'refined': refined})
+    fmt = data.get('format', request.args.get('format', 'json'))
+    try:
+        waypoints = np.asarray(waypoints, dtype=np.float64).reshape(-1, 2)
+        interpolation_km = float(data.get('interpolation_km', ROUTE_INTERPOLATION_KM))
+        zoom = data.get('zoom', request.args.get('zoom'))
+        zoom = None if zoom is None else float(zoom)
+        precision = int(data.get('precision', 5))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'waypoints must be [lat, lon] pairs; interpolation_km, zoom and precision numbers'}), 400
+    if fmt not in ROUTE_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(ROUTE_FORMATS)}"}), 400
+    if not (interpolation_km > 0 and 0 <= precision <= 7 and (zoom is None or 0 <= zoom <= 24)):
+        return jsonify({'error': 'interpolation_km > 0, 0 <= precision <= 7 and 0 <= zoom <= 24 required'}), 400
+    if refined_point_count(waypoints, interpolation_km) > ROUTE_MAX_POINTS:
+        return jsonify({'error': f'Route would exceed {ROUTE_MAX_POINTS} points; increase interpolation_km'}), 400
+    key = route_key(waypoints, fmt=fmt, interpolation_km=interpolation_km, zoom=zoom, precision=precision)
+    payload = route_cache.get(key)
+    if payload is None:
+        payload = render_route(waypoints, fmt, interpolation_km, zoom, precision)
+        route_cache.put(key, payload)
+    return cached_response(payload, MIMETYPES[fmt])
+
+@app.route('/api/corridor', methods=['POST'])
+def api_corridor():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON body {waypoints, interpolation_km, buffer} required'}), 400
+    try:
+        waypoints = np.asarray(data.get('waypoints', []), dtype=np.float64).reshape(-1, 2)
+        interpolation_km = float(data.get('interpolation_km', ROUTE_INTERPOLATION_KM))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'waypoints must be [lat, lon] pairs and interpolation_km a number'}), 400
+    if len(waypoints) < 2:
+        return jsonify({'error': 'At least two waypoints are required'}), 400
+    if not interpolation_km > 0:
+        return jsonify({'error': 'interpolation_km > 0 required'}), 400
+    if refined_point_count(waypoints, interpolation_km) > ROUTE_MAX_POINTS:
+        return jsonify({'error': f'Route would exceed {ROUTE_MAX_POINTS} points; increase interpolation_km'}), 400
+    try:
+        refined = refine_passage_geospatial_array(waypoints, interpolation_km)
+        corridor = backend.features_along_corridor(refined, data.get('buffer', '2km'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Bad corridor request: {e}'}), 400
+    return jsonify(corridor)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5050)
@@ -0,0 +1,164 @@
+# async_search.py
+# asyncio search layer: AsyncElasticsearch + AsyncOpenAI with pooled connections, async versions
+# of the search functions, and concurrent fan-out of independent sub-queries.
+# Sync callers (Flask views, scripts) share one background event loop via AsyncSearchService.run().
+
+import asyncio
+import threading
+
+from cache import get_cache, query_embedding_cache
+from config import (ES_INDEX_NAME, ES_FEATURES_INDEX, KNN_NUM_CANDIDATES, HYBRID_FUSION, HYBRID_WINDOW,
+                    get_async_es, get_async_openai)
+from fusion import fuse
+from llm import with_retry_async
+from metrics import metrics, record_openai_usage
+from search import (semantic_body, section_results, geo_body, geo_results, geo_dms_body, feature_results,
+                    lexical_body, lexical_results, hybrid_body, embedding_params, embed_cache_key)
+
+
+class AsyncSearchService:
+    """
+    Async counterparts of search.py bound to one pair of indices. Clients default to the
+    shared config.get_async_es() / get_async_openai() ones, whose connections bind to the
+    event loop that first uses them, so keep a service on one loop (run() takes care of
+    that for sync callers).
+    """
+
+    def __init__(self, index_name: str = ES_INDEX_NAME, features_index: str = ES_FEATURES_INDEX,
+                 es=None, openai_client=None):
+        self.index_name = index_name
+        self.features_index = features_index
+        self._es = es
+        self._openai = openai_client
+        self._inflight = {}     # normalised query -> Task embedding it
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    # ——— Clients ——————————————————————————————————————————————————
+
+    @property
+    def es(self):
+        if self._es is None:
+            self._es = get_async_es()
+            if self._es is None:
+                raise ValueError("No async Elasticsearch client configured; set ES_CLOUD_ID")
+        return self._es
+
+    @property
+    def openai(self):
+        if self._openai is None:
+            self._openai = get_async_openai()
+        return self._openai
+
+    async def close(self):
+        if self._es is not None:
+            await self._es.close()
+        if self._openai is not None:
+            await self._openai.close()
+
+    # ——— Embeddings ———————————————————————————————————————————————
+
+    async def embed_query(self, query: str) -> list[float]:
+        """Query embedding via the shared query cache; concurrent misses share one request."""
+        if (vec := query_embedding_cache.peek(query)) is not None:
+            return vec
+        key = query_embedding_cache.normalize(query)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._embed(query))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            query_embedding_cache.coalesced += 1
+            metrics.inc("cache", cache="query", result="coalesced")
+        return await asyncio.shield(task)
+
+    async def _embed(self, query: str) -> list[float]:
+        # Same path as search.embed_query: the on-disk content cache first (off the loop, it's
+        # SQLite), then one embeddings request retried on 429.
+        cache, key = get_cache(), embed_cache_key(query)
+        vec = await asyncio.to_thread(cache.get_vector, key) if cache is not None else None
+        if vec is None:
+            metrics.inc("api_calls", service="openai", op="embeddings")
+            with metrics.timer("embed"):
+                resp = await with_retry_async(
+                    lambda: self.openai.embeddings.create(**embedding_params(), input=[query]))
+            record_openai_usage(embedding_params()["model"], getattr(resp, "usage", None))
+            vec = resp.data[0].embedding
+            if cache is not None:
+                await asyncio.to_thread(cache.put_vector, key, vec)
+        query_embedding_cache.put(query, vec)
+        return vec
+
+    # ——— Searches —————————————————————————————————————————————————
+
+    async def _search(self, op: str, index: str, body: dict):
+        metrics.inc("api_calls", service="elasticsearch", op="search")
+        with metrics.timer("es_query", op=op):
+            return await self.es.search(index=index, body=body)
+
+    async def semantic_search(self, query, k=5, num_candidates=KNN_NUM_CANDIDATES, exact=False):
+        qv = await self.embed_query(query)
+        res = await self._search("semantic", self.index_name, semantic_body(qv, k, num_candidates, exact))
+        return section_results(res)
+
+    async def geo_search(self, lat, lon, distance="10km"):
+        res = await self._search("geo", self.index_name, geo_body(lat, lon, distance))
+        return geo_results(res)
+
+    async def geo_search_dms(self, coord_input, distance="10km"):
+        res = await self._search("geo_dms", self.features_index, geo_dms_body(coord_input, distance))
+        return feature_results(res)
+
+    async def lexical_search(self, term):
+        res = await self._search("lexical", self.index_name, lexical_body(term))
+        return lexical_results(res, term)
+
+    async def hybrid_search(self, query, alpha=0.5, k=5, num_candidates=KNN_NUM_CANDIDATES, exact=False,
+                            fusion=HYBRID_FUSION, window=HYBRID_WINDOW):
+        if fusion and not exact:
+            # The BM25 leg doesn't need the embedding, so it runs while the query is embedded.
+            window = max(window, k)
+            async def vector_leg():
+                qv = await self.embed_query(query)
+                return await self._search("hybrid", self.index_name, semantic_body(qv, window, num_candidates))
+            vec_res, lex_res = await asyncio.gather(
+                vector_leg(), self._search("hybrid", self.index_name, {**lexical_body(query), "size": window}))
+            return fuse(section_results(vec_res), section_results(lex_res), alpha, k, fusion)
+        qv = await self.embed_query(query)
+        res = await self._search("hybrid", self.index_name, hybrid_body(qv, query, alpha, k, num_candidates, exact))
+        return section_results(res)
+
+    async def route_context(self, query: str, coords, distance="2km", k=5) -> dict:
+        """
+        Everything needed to write directions for a stretch of route, fetched concurrently:
+        semantic and lexical matches for `query` plus charted features near each coordinate.
+        """
+        semantic, lexical, *geo = await asyncio.gather(
+            self.semantic_search(query, k=k),
+            self.lexical_search(query),
+            *(self.geo_search_dms(c, distance) for c in coords),
+        )
+        return {"semantic": semantic, "lexical": lexical, "features": geo}
+
+    # ——— Sync bridge ——————————————————————————————————————————————
+
+    def run(self, coro):
+        """Run a coroutine on the service's background event loop and wait for its result."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="async-search", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_async_search() -> AsyncSearchService:
+    """Process-wide service, so every caller shares the same connection pools."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = AsyncSearchService()
+    return _service
@@ -0,0 +1,239 @@
+# backend.py
+# Pluggable search backends: every entry point in search.py (ensure_index, index_sections and
+# the search functions) behind one interface, so the app can run against Elastic Cloud or a
+# local in-process engine (see local_search.py).
+
+from abc import ABC, abstractmethod
+
+from config import (ES_INDEX_NAME, ES_FEATURES_INDEX, RE_INDEX_INCREMENTAL, INGEST_BATCH_SIZE,
+                    INGEST_WORKERS, SEARCH_BACKEND, LOCAL_INDEX_PATH, VIEWPORT_MAX_POINTS, CLUSTER_MAX_ZOOM,
+                    CLUSTER_PRECISION_OFFSET, get_es)
+
+
+class SearchBackend(ABC):
+    """Interface implemented by every search backend. Results match the search.py functions."""
+
+    @abstractmethod
+    def ensure_index(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def index_sections(self, sections, incremental: bool = RE_INDEX_INCREMENTAL,
+                       batch_size: int = INGEST_BATCH_SIZE, workers: int = INGEST_WORKERS):
+        raise NotImplementedError
+
+    @abstractmethod
+    def semantic_search(self, query, k=5):
+        raise NotImplementedError
+
+    @abstractmethod
+    def geo_search(self, lat, lon, distance="10km"):
+        raise NotImplementedError
+
+    @abstractmethod
+    def geo_search_dms(self, coord_input, distance="10km"):
+        raise NotImplementedError
+
+    @abstractmethod
+    def lexical_search(self, term):
+        raise NotImplementedError
+
+    @abstractmethod
+    def hybrid_search(self, query, alpha=0.5, k=5):
+        raise NotImplementedError
+
+    # Batch variants: results in input order, None for a query that failed. The defaults just
+    # loop; backends with a round-trip per search override them.
+
+    def batch_semantic_search(self, queries, k=5):
+        return [self.semantic_search(q, k=k) for q in queries]
+
+    def batch_lexical_search(self, terms):
+        return [self.lexical_search(t) for t in terms]
+
+    def batch_geo_search_dms(self, coord_inputs, distance="10km"):
+        out = []
+        for c in coord_inputs:
+            try:
+                out.append(self.geo_search_dms(c, distance))
+            except ValueError as e:
+                print(f"[Warning] Skipping coordinates {c!r}: {e}")
+                out.append(None)
+        return out
+
+    def route_context(self, query, coords, distance="2km", k=5) -> dict:
+        """
+        Semantic and lexical matches for `query` plus charted features near each coordinate
+        (one after another; the async service fetches them concurrently).
+        """
+        return {"semantic": self.semantic_search(query, k=k), "lexical": self.lexical_search(query),
+                "features": [self.geo_search_dms(c, distance) for c in coords]}
+
+    @abstractmethod
+    def iter_features(self):
+        """Stream every feature doc in constant memory."""
+        raise NotImplementedError
+
+    def all_features(self) -> list[dict]:
+        return list(self.iter_features())
+
+    @abstractmethod
+    def features_version(self):
+        """Opaque value that changes whenever the features index changes (used to invalidate caches)."""
+        raise NotImplementedError
+
+    def feature_grid(self, refresh: bool = False):
+        """
+        In-memory FeatureGrid over a FeatureTable streamed from iter_features(),
+        rebuilt when features_version() changes.
+        """
+        from cache import VersionedValue
+        from geoindex import FeatureGrid
+        if getattr(self, "_feature_grid", None) is None:
+            self._feature_grid = VersionedValue(self.features_version, lambda: FeatureGrid(self.iter_features()))
+        if refresh:
+            self._feature_grid.invalidate()
+        return self._feature_grid.get()[1]
+
+    def feature_table(self, refresh: bool = False):
+        """Every feature as a columnar FeatureTable (shared with feature_grid)."""
+        return self.feature_grid(refresh).features
+
+    def features_along_corridor(self, waypoints, buffer="2km", refresh: bool = False) -> dict:
+        """
+        Deduplicated features and sections within `buffer` of a refined route, ordered
+        by along-track distance.
+        """
+        from geoindex import features_along_corridor
+        return features_along_corridor(self.feature_grid(refresh), waypoints, buffer)
+
+    def features_in_view(self, bbox, zoom: int, max_points: int = VIEWPORT_MAX_POINTS) -> tuple[list[dict], int]:
+        """
+        Features inside bbox (west, south, east, north) for a map at `zoom`, as items with a
+        `location` and `count`: single features (count 1, with their fields) or clusters;
+        and the number of features in the bbox. From CLUSTER_MAX_ZOOM items are never
+        clustered, so only the first max_points are returned.
+        """
+        from geoindex import normalize_bbox, view_items
+        return view_items(self.feature_grid(), normalize_bbox(bbox), zoom, max_points, CLUSTER_MAX_ZOOM, CLUSTER_PRECISION_OFFSET)
+
+
+class ElasticsearchBackend(SearchBackend):
+    """Thin wrapper binding the search.py functions to a client and a pair of indices."""
+
+    def __init__(self, es=None, index_name: str = ES_INDEX_NAME, features_index: str = ES_FEATURES_INDEX):
+        self._es = es
+        self.index_name = index_name
+        self.features_index = features_index
+
+    @property
+    def es(self):
+        # The shared client is only built (and the library imported) on first use.
+        if self._es is None:
+            self._es = get_es()
+            if self._es is None:
+                raise ValueError("No Elasticsearch client configured; set ES_CLOUD_ID or use SEARCH_BACKEND=local")
+        return self._es
+
+    def ensure_index(self):
+        from search import ensure_index, ensure_features_index
+        ensure_index(self.es, self.index_name)
+        ensure_features_index(self.es, self.features_index)
+
+    def index_sections(self, sections, incremental=RE_INDEX_INCREMENTAL,
+                       batch_size=INGEST_BATCH_SIZE, workers=INGEST_WORKERS):
+        # Incremental loads write to the live indices with refresh paused (replicas kept, no
+        # force-merge); full loads build new versioned indices and swap the aliases.
+        from search import bulk_load, index_sections_incremental, rebuild_indices
+        if not incremental:
+            return rebuild_indices(self.es, sections, self.index_name, self.features_index,
+                                   batch_size=batch_size, workers=workers)
+        with bulk_load(self.es, [self.index_name, self.features_index], replicas=True, force_merge=False):
+            return index_sections_incremental(self.es, sections, self.index_name, self.features_index,
+                                              batch_size=batch_size, workers=workers)
+
+    def semantic_search(self, query, k=5):
+        from search import semantic_search
+        return semantic_search(self.es, self.index_name, query, k=k)
+
+    def geo_search(self, lat, lon, distance="10km"):
+        from search import geo_search
+        return geo_search(self.es, self.index_name, lat, lon, distance)
+
+    def geo_search_dms(self, coord_input, distance="10km"):
+        from search import geo_search_dms
+        return geo_search_dms(self.es, coord_input, distance)
+
+    def lexical_search(self, term):
+        from search import lexical_search
+        return lexical_search(self.es, self.index_name, term)
+
+    def hybrid_search(self, query, alpha=0.5, k=5):
+        from search import hybrid_search
+        return hybrid_search(self.es, self.index_name, query, alpha=alpha, k=k)
+
+    def batch_semantic_search(self, queries, k=5):
+        from search import batch_semantic_search
+        return batch_semantic_search(self.es, self.index_name, queries, k=k)
+
+    def batch_lexical_search(self, terms):
+        from search import batch_lexical_search
+        return batch_lexical_search(self.es, self.index_name, terms)
+
+    def batch_geo_search_dms(self, coord_inputs, distance="10km"):
+        from search import batch_geo_search_dms
+        return batch_geo_search_dms(self.es, coord_inputs, distance)
+
+    def iter_features(self):
+        from export import iter_features
+        return iter_features(self.es, self.features_index)
+
+    def features_in_view(self, bbox, zoom, max_points=VIEWPORT_MAX_POINTS):
+        # One request: up to max_points hits plus a geotile_grid clustering of everything in view.
+        # Leaflet bounds can run past +-180 after panning across the antimeridian; ES needs them
+        # wrapped, with west > east for a box crossing it.
+        from geoindex import MAX_TILE_PRECISION, normalize_bbox
+        from search import es_search
+        west, south, east, north = normalize_bbox(bbox)
+        fields = ["feature_id", "name", "location", "section_id"]
+        body = {
+            "size": max_points, "_source": fields, "track_total_hits": True,
+            "query": {"bool": {"filter": {"geo_bounding_box": {"location": {
+                "top_left": {"lat": north, "lon": west}, "bottom_right": {"lat": south, "lon": east}}}}}},
+        }
+        if zoom < CLUSTER_MAX_ZOOM:
+            body["aggs"] = {"cells": {
+                "geotile_grid": {"field": "location", "size": 10000,
+                                 "precision": min(zoom + CLUSTER_PRECISION_OFFSET, MAX_TILE_PRECISION)},
+                "aggs": {"centroid": {"geo_centroid": {"field": "location"}},
+                         "sample": {"top_hits": {"size": 1, "_source": fields}}}}}
+        res = es_search(self.es, "viewport", index=self.features_index, body=body)
+        total = res["hits"]["total"]["value"]
+        if total <= max_points or zoom >= CLUSTER_MAX_ZOOM:
+            return [{**h["_source"], "count": 1} for h in res["hits"]["hits"]], total
+        return [{**b["sample"]["hits"]["hits"][0]["_source"], "count": 1} if b["doc_count"] == 1
+                else {"location": b["centroid"]["location"], "count": b["doc_count"]}
+                for b in res["aggregations"]["cells"]["buckets"]], total
+
+    def features_version(self):
+        # Index + delete operations on the primaries of each concrete index behind the alias:
+        # unlike the highest _seq_no (which is per shard) they move on a write to any shard, and
+        # the index name changes when a rebuild swaps the alias. Counted writes may not be
+        # searchable yet, so refresh once whenever they move, before the caller rescans.
+        stats = self.es.indices.stats(index=self.features_index, metric="indexing")
+        version = tuple(sorted((name, s["primaries"]["indexing"]["index_total"] + s["primaries"]["indexing"]["delete_total"])
+                               for name, s in stats["indices"].items()))
+        if version != getattr(self, "_seen_version", None):
+            self.es.indices.refresh(index=self.features_index)
+            self._seen_version = version
+        return version
+
+
+def get_backend(kind: str = SEARCH_BACKEND) -> SearchBackend:
+    """Build the backend selected by SEARCH_BACKEND ("elasticsearch" or "local")."""
+    if kind == "local":
+        from local_search import LocalSearchBackend
+        return LocalSearchBackend(LOCAL_INDEX_PATH)
+    if kind == "elasticsearch":
+        return ElasticsearchBackend()
+    raise ValueError(f"Unknown SEARCH_BACKEND '{kind}'")
@@ -0,0 +1,698 @@
+# bench.py
+# Ad-hoc benchmarks for the ingest/search hot paths.
+# Usage: python bench.py <name> [value ...] [param=value ...]   (python bench.py lists the available benchmarks)
+# e.g.   python bench.py offline scales=100,1000 save=true
+
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+
+def timed(fn, *args, repeat: int = 1, **kwargs):
+    """Run fn repeat times, returning (last result, list of latencies in ms)."""
+    lat = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        lat.append((time.perf_counter() - t0) * 1000)
+    return out, lat
+
+
+def percentiles(lat: list[float]) -> str:
+    lat = sorted(lat)
+    p = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))]
+    return f"p50={p(0.50):.1f}ms p99={p(0.99):.1f}ms mean={statistics.fmean(lat):.1f}ms"
+
+
+def recall_at_k(truth: list, got: list) -> float:
+    return len(set(truth) & set(got)) / max(len(truth), 1)
+
+
+def synthetic_route(n: int, seed: int = 0, step_km: float = 5.0) -> list[tuple[float, float]]:
+    """Random-walk passage of n waypoints starting off Mount Desert Island, legs ~step_km."""
+    import random
+    rng = random.Random(seed)
+    lat, lon, heading = 44.3, -68.2, 120.0
+    out = [(lat, lon)]
+    for _ in range(n - 1):
+        heading += rng.uniform(-30, 30)
+        d = rng.uniform(0.2, 2.0) * step_km / 111.0
+        lat = max(-80.0, min(80.0, lat + d * math.cos(math.radians(heading))))
+        lon = (lon + d * math.sin(math.radians(heading)) / math.cos(math.radians(lat)) + 180) % 360 - 180
+        out.append((lat, lon))
+    return out
+
+
+def synthetic_pilot_book(n_sections: int, seed: int = 0) -> str:
+    """Markdown in the shape of an Admiralty chapter: headings, numbered sections, DDM coordinates."""
+    import random
+    rng = random.Random(seed)
+    words = ("the channel passes between ledges marked by buoys and leads to an anchorage "
+             "with good holding in mud depths of vessels should keep clear of the shoal").split()
+    out, sec = ["# CHAPTER 2 - Synthetic Coast"], 0
+    for i in range(n_sections):
+        if i % 40 == 0: out.append(f"## Area {i // 40}")
+        if i % 10 == 0: out.append(f"### Approach {i // 10}")
+        if i % 200 == 0: sec += 1
+        out.append(f"{sec}.{i + 1} Feature {i}")
+        for _ in range(rng.randint(2, 8)):
+            body = " ".join(rng.choice(words) for _ in range(rng.randint(15, 40)))
+            lat = f"{rng.randint(40, 47):02d}{rng.randint(0, 59):02d}{rng.randint(0, 99):02d}N"
+            lon = f"{rng.randint(60, 71):03d}{rng.randint(0, 59):02d}{rng.randint(0, 99):02d}W"
+            out.append(f"{body.capitalize()} Island {rng.randint(1, 999)} ({lat} {lon}).")
+            out.append("")
+    return "\n".join(out) + "\n"
+
+
+# ——— Benchmarks ————————————————————————————————————————————————
+
+DEFAULT_QUERIES = ["Bar Island", "Somes Sound", "anchorage", "Bass Harbor Head Light",
+                   "tidal streams", "Frenchman Bay", "pilotage", "fog signal"]
+
+def bench_knn(k: int = 10, num_candidates: int = 100, repeat: int = 5):
+    """Recall@k and latency of HNSW kNN vs exact script_score for semantic/hybrid search."""
+    from config import es, ES_INDEX_NAME
+    from search import semantic_search, hybrid_search
+    for name, fn, extra in (("semantic", semantic_search, {}), ("hybrid", hybrid_search, {"alpha": 0.7, "fusion": ""})):
+        exact_lat, approx_lat, recalls = [], [], []
+        for q in DEFAULT_QUERIES:
+            truth, lat = timed(fn, es, ES_INDEX_NAME, q, k=k, exact=True, repeat=repeat, **extra)
+            exact_lat += lat
+            got, lat = timed(fn, es, ES_INDEX_NAME, q, k=k, num_candidates=num_candidates, repeat=repeat, **extra)
+            approx_lat += lat
+            recalls.append(recall_at_k([r["section_id"] for r in truth], [r["section_id"] for r in got]))
+        print(f"{name:9s} exact : {percentiles(exact_lat)}")
+        print(f"{name:9s} knn   : {percentiles(approx_lat)} recall@{k}={statistics.fmean(recalls):.3f}")
+
+
+def bench_hybrid(k: int = 10, alpha: float = 0.7, repeat: int = 5):
+    """hybrid_search variants: script_score (old), combined knn+query, client-side RRF / weighted fusion."""
+    from config import es, ES_INDEX_NAME
+    from search import semantic_search, lexical_search, hybrid_search
+    variants = (("script_score", {"exact": True}), ("knn+query", {"fusion": ""}),
+                ("rrf", {"fusion": "rrf"}), ("weighted", {"fusion": "weighted"}))
+    # Relevance proxy: union of the exact vector top-k and every lexical match.
+    truth = {q: {r["section_id"] for r in semantic_search(es, ES_INDEX_NAME, q, k=k, exact=True)} |
+                {r["section_id"] for r in lexical_search(es, ES_INDEX_NAME, q)[:k]} for q in DEFAULT_QUERIES}
+    old = {q: [r["section_id"] for r in hybrid_search(es, ES_INDEX_NAME, q, alpha=alpha, k=k, exact=True)]
+           for q in DEFAULT_QUERIES}
+    for name, extra in variants:
+        lat, hit_rate, overlap = [], [], []
+        for q in DEFAULT_QUERIES:
+            got, l = timed(hybrid_search, es, ES_INDEX_NAME, q, alpha=alpha, k=k, repeat=repeat, **extra)
+            lat += l
+            ids = [r["section_id"] for r in got]
+            hit_rate.append(len(truth[q] & set(ids)) / max(min(len(truth[q]), k), 1))
+            overlap.append(recall_at_k(old[q], ids))
+        print(f"{name:12s}: {percentiles(lat)} recall@{k}={statistics.fmean(hit_rate):.3f} "
+              f"overlap-with-old={statistics.fmean(overlap):.3f}")
+
+
+def bench_batch(n: int = 200, chunk_size: int = 100, repeat: int = 3):
+    """n lexical / geo_dms / semantic searches one request at a time vs the _msearch batch APIs."""
+    from config import es, ES_INDEX_NAME
+    from cache import query_embedding_cache
+    from search import (lexical_search, geo_search_dms, semantic_search, batch_lexical_search,
+                        batch_geo_search_dms, batch_semantic_search)
+    terms = [DEFAULT_QUERIES[i % len(DEFAULT_QUERIES)] + ("" if i < len(DEFAULT_QUERIES) else f" {i}") for i in range(n)]
+    coords = [f"44{i % 60:02d}00N 068{(i * 7) % 60:02d}00W" for i in range(n)]
+    cases = (("lexical", lambda: [lexical_search(es, ES_INDEX_NAME, t) for t in terms],
+              lambda: batch_lexical_search(es, ES_INDEX_NAME, terms, chunk_size=chunk_size)),
+             ("geo_dms", lambda: [geo_search_dms(es, c, "5km") for c in coords],
+              lambda: batch_geo_search_dms(es, coords, "5km", chunk_size=chunk_size)),
+             ("semantic", lambda: [semantic_search(es, ES_INDEX_NAME, t) for t in terms],
+              lambda: batch_semantic_search(es, ES_INDEX_NAME, terms, chunk_size=chunk_size)))
+    for name, one_by_one, batched in cases:
+        query_embedding_cache.clear()      # cold embeddings: one request per query vs one per batch
+        _, seq = timed(one_by_one)
+        lat = []
+        for _ in range(repeat):
+            query_embedding_cache.clear()
+            lat += timed(batched)[1]
+        print(f"{name:9s}: sequential {seq[0]:.0f}ms ({seq[0] / n:.1f}ms/query)  "
+              f"batched {statistics.fmean(lat):.0f}ms ({statistics.fmean(lat) / n:.1f}ms/query)")
+
+
+def bench_vectors(n: int = 20000, dims: int = 1536, k: int = 10, queries: int = 50, source: str = "synthetic"):
+    """
+    Memory, latency and recall@k of the compact vector store (float16 / int8, and embeddings
+    cut to fewer dims) against exact float32 search. source is "synthetic" (clustered random
+    vectors) or a local index directory, whose own vectors are then used as queries, e.g.
+    `python bench.py vectors source=.local_index k=20`.
+    """
+    import os
+    import numpy as np
+    from vectors import VectorStore, quantize
+    rng = np.random.default_rng(0)
+    if source == "synthetic":
+        centres = rng.normal(size=(max(n // 50, 1), dims)).astype(np.float32)
+        base = centres[rng.integers(0, len(centres), n)] + 0.6 * rng.normal(size=(n, dims)).astype(np.float32)
+    else:
+        base = np.asarray(np.load(os.path.join(source, "vectors.npy")), dtype=np.float32)
+        n, dims = base.shape
+    q = base[rng.integers(0, n, queries)] + 0.3 * rng.normal(size=(queries, dims)).astype(np.float32)
+    exact = VectorStore(quantize(base))
+    truth = [np.argsort(-exact.scores(v))[:k] for v in q]
+    print(f"{n} vectors x {dims} dims; python lists of floats would take ~{n * (56 + dims * 32) / 2**20:.0f} MiB")
+    variants = [(f"{dt} x{dims}", dt, dims) for dt in ("float32", "float16", "int8")]
+    variants += [(f"{dt} x{d}", dt, d) for d in (dims // 2, dims // 4) for dt in ("float32", "int8") if d >= 64]
+    for name, dt, d in variants:
+        store = VectorStore(quantize(base[:, :d], dt))     # prefix cut, as shortened text-embedding-3 vectors
+        lat, recalls = [], []
+        for v, t in zip(q, truth):
+            scores, l = timed(store.scores, v[:d])
+            lat += l
+            recalls.append(recall_at_k(t.tolist(), np.argsort(-scores)[:k].tolist()))
+        print(f"{name:14s}: {store.nbytes / 2**20:7.1f} MiB  {percentiles(lat)}  recall@{k}={statistics.fmean(recalls):.3f}")
+
+
+def bench_payload(repeat: int = 10, k: int = 10):
+    """Response bytes and latency of every search request, full _source (old) vs lean bodies."""
+    import json
+    from config import es, ES_INDEX_NAME, ES_FEATURES_INDEX
+    from search import embed_query, semantic_body, geo_body, geo_dms_body, lexical_body, hybrid_body
+    vecs = {q: embed_query(q) for q in DEFAULT_QUERIES}
+    requests = (("semantic", ES_INDEX_NAME, lambda q, lean: semantic_body(vecs[q], k, lean=lean)),
+                ("hybrid", ES_INDEX_NAME, lambda q, lean: hybrid_body(vecs[q], q, 0.7, k, lean=lean)),
+                ("lexical", ES_INDEX_NAME, lambda q, lean: lexical_body(q, lean)),
+                ("geo", ES_INDEX_NAME, lambda q, lean: geo_body(44.3983, -68.2067, "5km", lean)),
+                ("geo_dms", ES_FEATURES_INDEX, lambda q, lean: geo_dms_body("442390N 681240W", "5km", lean)))
+    for name, index, body in requests:
+        for lean in (False, True):
+            lat, size = [], []
+            for q in DEFAULT_QUERIES:
+                res, l = timed(lambda: es.search(index=index, body=body(q, lean)), repeat=repeat)
+                lat += l
+                size.append(len(json.dumps(res.body, separators=(",", ":"))))
+            print(f"{name:9s} {'lean' if lean else 'full':4s}: {statistics.fmean(size) / 1024:8.1f} KiB/response  "
+                  f"{percentiles(lat)}")
+
+
+def bench_bulkload(n: int = 20000, batch: int = 500):
+    """
+    Bulk-load n synthetic section docs (random vectors) into a scratch index with default
+    settings vs the bulk-load profile, timing the load and a concurrent query's p50/p99.
+    """
+    import random
+    import threading
+    from elasticsearch import helpers
+    from config import es, ES_INDEX_NAME
+    from search import BULK_LOAD_SETTINGS, bulk_load, embed_dims, sections_mapping
+    rng = random.Random(0)
+    dims = embed_dims()
+    docs = [{"section_id": f"b.{i}", "title": f"Feature {i}", "parents": {}, "content": f"synthetic section {i}",
+             "content_hash": str(i), "content_vector": [rng.uniform(-1, 1) for _ in range(dims)],
+             "features": [], "locations": [], "feature_names": []} for i in range(n)]
+    for profile in (False, True):
+        index = f"{ES_INDEX_NAME}-bench-{'profile' if profile else 'default'}"
+        if es.indices.exists(index=index):
+            es.indices.delete(index=index)
+        es.indices.create(index=index, body={"mappings": sections_mapping(),
+                                             **({"settings": {"index": BULK_LOAD_SETTINGS}} if profile else {})})
+        stop, lat = threading.Event(), []
+        def query():
+            while not stop.is_set():
+                lat.extend(timed(es.search, index=ES_INDEX_NAME, body={"size": 5, "_source": ["section_id"],
+                                                                         "query": {"match": {"content": "anchorage"}}})[1])
+        t = threading.Thread(target=query, daemon=True)
+        t.start()
+        t0 = time.perf_counter()
+        if profile:
+            with bulk_load(es, [index], restore={"refresh_interval": None, "number_of_replicas": None}):
+                helpers.bulk(es, ({"_index": index, "_id": d["section_id"], "_source": d} for d in docs), chunk_size=batch)
+        else:
+            helpers.bulk(es, ({"_index": index, "_id": d["section_id"], "_source": d} for d in docs), chunk_size=batch)
+            es.indices.refresh(index=index)
+        load_s = time.perf_counter() - t0
+        stop.set()
+        t.join()
+        print(f"{'bulk profile' if profile else 'default':12s}: {n / load_s:7.0f} docs/s ({load_s:.1f}s)  "
+              f"live queries during load {percentiles(lat)}")
+        es.indices.delete(index=index)
+
+
+def bench_local(repeat: int = 20):
+    """Latency of every search entry point on the local in-process backend (LOCAL_INDEX_PATH)."""
+    from config import LOCAL_INDEX_PATH
+    from local_search import LocalSearchBackend
+    b, lat = timed(LocalSearchBackend, LOCAL_INDEX_PATH)
+    print(f"load      : {lat[0]:.1f}ms ({len(b.sections)} sections, {len(b.features)} features)")
+    b.all_features()
+    for q in DEFAULT_QUERIES:      # warm the query embedding cache so only the engine is timed
+        b.semantic_search(q)
+    for name, call in (("semantic", lambda q: b.semantic_search(q, k=5)),
+                       ("lexical", lambda q: b.lexical_search(q)),
+                       ("hybrid", lambda q: b.hybrid_search(q, alpha=0.7, k=5)),
+                       ("geo_dms", lambda q: b.geo_search_dms("442390N 681240W", "5km")),
+                       ("geo", lambda q: b.geo_search(44.3983, -68.2067, "5km"))):
+        lat = [l for q in DEFAULT_QUERIES for l in timed(call, q, repeat=repeat)[1]]
+        print(f"{name:9s} : {percentiles(lat)}")
+
+
+def _refine_passage_geospatial_legacy(waypoints, interpolation_distance_km):
+    """The original point-by-point implementation (with its O(n^2) `not in` scan), kept as a baseline."""
+    from passage import haversine_distance, calculate_initial_bearing, find_destination_point
+    refined_path = [waypoints[0]]
+    for start_point, end_point in zip(waypoints, waypoints[1:]):
+        segment_length = haversine_distance(start_point, end_point)
+        if segment_length > interpolation_distance_km:
+            bearing = calculate_initial_bearing(start_point, end_point)
+            for j in range(1, int(segment_length / interpolation_distance_km) + 1):
+                refined_path.append(find_destination_point(start_point, bearing, j * interpolation_distance_km))
+        if end_point not in refined_path:
+            refined_path.append(end_point)
+    return refined_path
+
+def bench_passage(sizes: str = "10000,100000,1000000", interpolation_km: float = 2.0, legacy_max: int = 20000):
+    """refine_passage_geospatial: vectorized array path vs the legacy loop on synthetic routes."""
+    import numpy as np
+    from passage import refine_passage_geospatial, refine_passage_geospatial_array
+    d = interpolation_km
+    for n in map(int, sizes.split(",")):
+        route = synthetic_route(n)
+        arr = np.asarray(route)
+        out, lat = timed(refine_passage_geospatial_array, arr, d, repeat=3)
+        line = f"n={n:>8d} out={len(out):>9d}  array={min(lat):9.1f}ms"
+        _, lat = timed(refine_passage_geospatial, route, d)
+        line += f"  list-wrapper={lat[0]:9.1f}ms"
+        if n <= legacy_max:
+            ref, lat = timed(_refine_passage_geospatial_legacy, route, d)
+            err = float(np.abs(np.asarray(ref) - out).max()) if len(ref) == len(out) else float("nan")
+            line += f"  legacy={lat[0]:9.1f}ms  max|diff|={err:.2e}"
+        print(line)
+
+
+def bench_route(nm: float = 1000.0, interpolation_km: str = "1,10", zooms: str = "6,10", repeat: int = 5):
+    """/api/route bodies for a long passage: legacy JSON list vs polyline / float32 / GeoJSON, simplified per zoom."""
+    import gzip
+    import numpy as np
+    import folium
+    from passage import haversine_distance_array, refine_passage_geospatial_array, simplify_passage_array
+    from route_format import encode_route
+    # Waypoints every ~50 nm on a random walk offshore, trimmed to the requested length
+    route = np.asarray(synthetic_route(200, step_km=50 * 1.852 / 1.1))
+    legs = np.cumsum(haversine_distance_array(route[:-1], route[1:])) / 1.852
+    route = route[:int(np.searchsorted(legs, nm)) + 2]
+    total_nm = float(haversine_distance_array(route[:-1], route[1:]).sum() / 1.852)
+    print(f"passage: {len(route)} waypoints, {total_nm:.0f} nm")
+    for d in map(float, interpolation_km.split(",")):
+        refined = refine_passage_geospatial_array(route, d)
+        print(f"\ninterpolation {d:g} km: {len(refined)} points")
+        variants = [("json", None)] + [(fmt, z) for z in [None] + [float(z) for z in zooms.split(",")]
+                                       for fmt in ("polyline", "float32", "geojson")]
+        for fmt, zoom in variants:
+            def render():
+                pts = refined if zoom is None else simplify_passage_array(refined, zoom)
+                return pts, encode_route(pts, fmt)
+            (pts, body), lat = timed(render, repeat=repeat)
+            raw = body.encode("utf-8") if isinstance(body, str) else body
+            print(f"  {fmt:8s} zoom={'-' if zoom is None else f'{zoom:g}':3s} points={len(pts):7d}  "
+                  f"{len(raw) / 1024:9.1f} KiB  gzip {len(gzip.compress(raw, 6)) / 1024:8.1f} KiB  "
+                  f"encode {min(lat):7.2f}ms")
+        # Map page: one CircleMarker per point (old main.py) vs one simplified PolyLine
+        for name, build in (("markers", lambda m: [folium.CircleMarker(location=p, radius=3).add_to(m)
+                                                   for p in refined.tolist()]),
+                            ("polyline z6", lambda m: folium.PolyLine(
+                                simplify_passage_array(refined, 6).tolist()).add_to(m))):
+            def page():
+                m = folium.Map(location=route.mean(axis=0).tolist(), zoom_start=6)
+                build(m)
+                return m.get_root().render()
+            html, lat = timed(page)
+            print(f"  map page {name:11s}: {len(html) / 1024:9.1f} KiB html  render {lat[0]:8.1f}ms")
+
+
+def _parse_and_chunk_legacy(text):
+    """The original parse_and_chunk (four uncompiled re.match calls per line), kept as a baseline."""
+    import re
+    sections, parents = [], {"chapter": None, "section": None, "subsection": None}
+    buf, cur_id, cur_title = [], None, None
+    flush = lambda: sections.append({"id": cur_id, "title": cur_title,
+                                     "parents": {k: v for k, v in parents.items() if v},
+                                     "content": "\n".join(buf).strip()})
+    for line in text.splitlines():
+        if m := re.match(r'^#\s+CHAPTER\s+\d+\s*-\s*(.+)$', line): parents["chapter"] = m.group(1); continue
+        if m := re.match(r'^##\s+(.+)$', line): parents["section"] = m.group(1); continue
+        if m := re.match(r'^###\s+(.+)$', line): parents["subsection"] = m.group(1); continue
+        if m := re.match(r'^(\d+\.\d+)\s+(.+)$', line):
+            if buf and cur_id: flush(); buf = []
+            cur_id, cur_title = m.group(1), m.group(2)
+            continue
+        if cur_id and line.strip(): buf.append(line)
+    if buf and cur_id: flush()
+    return sections
+
+def bench_parse(sections: int = 20000, repeat: int = 3):
+    """Markdown parser throughput in MB/s: legacy parse_and_chunk vs streaming iter_sections."""
+    import io
+    from ingest import iter_sections, parse_and_chunk
+    text = synthetic_pilot_book(sections)
+    mb = len(text.encode("utf-8")) / 1e6
+    ref, lat = timed(_parse_and_chunk_legacy, text, repeat=repeat)
+    print(f"{mb:.1f} MB, {len(ref)} sections")
+    print(f"legacy          : {mb / (min(lat) / 1000):7.1f} MB/s")
+    got, lat = timed(parse_and_chunk, text, repeat=repeat)
+    print(f"parse_and_chunk : {mb / (min(lat) / 1000):7.1f} MB/s  identical={[sec.to_dict() for sec in got] == ref}")
+    _, lat = timed(lambda: sum(1 for _ in iter_sections(io.StringIO(text))), repeat=repeat)
+    print(f"iter_sections   : {mb / (min(lat) / 1000):7.1f} MB/s  (streamed from a file object)")
+
+
+def _parse_ddm_coordinates_legacy(coord_string):
+    """The original llm.parse_ddm_coordinates success path (regexes and float(f"...") per call), as a baseline."""
+    import re
+    lat_str, lon_str = coord_string.strip().upper().split()
+    lat_match = re.match(r'^(\d{2})(\d{4})([NS])$', lat_str)
+    latitude = int(lat_match.group(1)) + float(f"{lat_match.group(2)[:2]}.{lat_match.group(2)[2:]}") / 60.0
+    if lat_match.group(3) == 'S': latitude *= -1
+    lon_match = re.match(r'^(\d{3})(\d{4})([EW])$', lon_str.zfill(8))
+    longitude = int(lon_match.group(1)) + float(f"{lon_match.group(2)[:2]}.{lon_match.group(2)[2:]}") / 60.0
+    if lon_match.group(3) == 'W': longitude *= -1
+    return latitude, longitude
+
+def bench_coords(n: int = 200000, sections: int = 2000, repeat: int = 3):
+    """DDM coordinate parsing: legacy vs coords.parse_ddm, bulk parse_ddm_array, and find_coordinates on text."""
+    import numpy as np
+    from coords import parse_ddm, parse_ddm_array, find_coordinates
+    import random
+    rng = random.Random(0)
+    strings = [f"{rng.randint(0, 89):02d}{rng.randint(0, 59):02d}{rng.randint(0, 99):02d}{rng.choice('NS')} "
+               f"{rng.randint(0, 179):0{rng.choice((2, 3))}d}{rng.randint(0, 59):02d}{rng.randint(0, 99):02d}{rng.choice('EW')}"
+               for _ in range(n)]
+    ref, lat = timed(lambda: [_parse_ddm_coordinates_legacy(s) for s in strings], repeat=repeat)
+    print(f"legacy          : {len(strings) / min(lat) * 1000 / 1e6:6.2f} M coords/s")
+    got, lat = timed(lambda: [parse_ddm(s) for s in strings], repeat=repeat)
+    print(f"parse_ddm       : {len(strings) / min(lat) * 1000 / 1e6:6.2f} M coords/s  identical={got == ref}")
+    (arr, errors), lat = timed(parse_ddm_array, strings, repeat=repeat)
+    print(f"parse_ddm_array : {len(strings) / min(lat) * 1000 / 1e6:6.2f} M coords/s  "
+          f"identical={np.array_equal(arr, np.array(ref))} errors={int(errors.sum())}")
+    text = synthetic_pilot_book(sections)
+    found, lat = timed(find_coordinates, text, repeat=repeat)
+    print(f"find_coordinates: {len(text.encode('utf-8')) / 1e6 / (min(lat) / 1000):6.1f} MB/s  ({len(found)} pairs)")
+
+
+def bench_extract(source: str = "synthetic", sections: int = 2000, llm_sample: int = 0):
+    """
+    Rule-based feature extraction over a pilot book (a markdown file, or a synthetic one):
+    throughput and the fraction of sections that would need the LLM. With llm_sample > 0,
+    also runs the LLM on that many sections with coordinates and reports how many of its
+    features (by coordinates) the rules found, e.g.
+    `python bench.py extract source=e-NP68_17_2021-chapter2.md llm_sample=20`.
+    """
+    from ingest import parse_and_chunk
+    from extract import rule_extract_features, _COORD_LIKE
+    from llm import llm_extract_features
+    if source == "synthetic":
+        text = synthetic_pilot_book(sections)
+    else:
+        with open(source, encoding="utf-8") as f:
+            text = f.read()
+    secs = parse_and_chunk(text)
+    out, lat = timed(lambda: [rule_extract_features(sec["content"]) for sec in secs])
+    with_coords = [i for i, sec in enumerate(secs) if _COORD_LIKE.search(sec["content"])]
+    fallback = sum(1 for _, complete in out if not complete)
+    print(f"{len(secs)} sections ({len(with_coords)} with coordinates) in {lat[0]:.0f}ms "
+          f"({lat[0] / max(len(secs), 1):.3f}ms/section), {sum(len(f) for f, _ in out)} features")
+    print(f"LLM fallback needed for {fallback}/{len(secs)} sections ({fallback / max(len(secs), 1):.1%}); "
+          f"previously every section went to the LLM")
+    if llm_sample:
+        key = lambda f: (round(f["location"]["lat"], 4), round(f["location"]["lon"], 4))
+        found, total, l = 0, 0, []
+        for i in with_coords[:llm_sample]:
+            ref, t = timed(llm_extract_features, secs[i]["content"])
+            l += t
+            got = {key(f) for f in out[i][0]}
+            total += len(ref)
+            found += sum(1 for f in ref if key(f) in got)
+        print(f"LLM on {min(len(with_coords), llm_sample)} sections: {percentiles(l)}; "
+              f"rules found {found}/{total} of its features")
+
+
+def _synthetic_feature_docs(n: int, seed: int = 0):
+    import random
+    rng = random.Random(seed)
+    for i in range(n):
+        sid = f"{i // 200 + 1}.{i // 5 + 1}"
+        name = f"{rng.choice(('Bar', 'Bass', 'Bear', 'Long', 'Sheep', 'Black'))} {rng.choice(('Island', 'Ledge', 'Point', 'Rock'))} {i % 997}"
+        yield {"feature_id": f"{sid}_{name.replace(' ', '_')}", "name": name,
+               "location": {"lat": rng.uniform(40, 47), "lon": rng.uniform(-71, -60)}, "section_id": sid}
+
+def bench_records(n: int = 200000, sections: int = 20000):
+    """Peak memory of feature docs as dicts vs Feature records vs a FeatureTable, and of parsed sections."""
+    import gc
+    import tracemalloc
+    from records import Feature, FeatureTable
+    from ingest import parse_and_chunk
+    def peak(build):
+        gc.collect()
+        tracemalloc.start()
+        out = build()
+        cur, top = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return out, cur, top
+    for name, build in (("list of dicts", lambda: list(_synthetic_feature_docs(n))),
+                        ("Feature records", lambda: [Feature.from_dict(d) for d in _synthetic_feature_docs(n)]),
+                        ("FeatureTable", lambda: FeatureTable.from_docs(_synthetic_feature_docs(n)))):
+        (out, cur, top), lat = timed(peak, build)
+        print(f"{n} features as {name:16s}: held {cur / 2**20:7.1f} MiB  peak {top / 2**20:7.1f} MiB  "
+              f"({cur / n:.0f} B/feature, built in {lat[0]:.0f}ms)")
+        del out
+    text = synthetic_pilot_book(sections)
+    for name, build in (("dicts", lambda: [sec.to_dict() for sec in parse_and_chunk(text)]),
+                        ("Section records", lambda: parse_and_chunk(text))):
+        out, cur, top = peak(build)
+        print(f"{len(out)} sections as {name:16s}: held {cur / 2**20:7.1f} MiB (including content)")
+        del out
+
+
+# ——— Offline suite ———————————————————————————————————————————————
+# Every subsystem against the fakes.py stand-ins (no credentials or network), at several scales
+# of synthetic pilot book / route, with ES and OpenAI latency injected per request. Results are
+# compared with the stored baseline for the same latency settings.
+
+BASELINE_PATH = "bench_baseline.json"
+REGRESSION_TOLERANCE = 0.15     # throughput drop (fraction) reported as a regression
+
+
+def _rate(n: float, lat_ms: list[float]) -> float:
+    return n / (min(lat_ms) / 1000) if min(lat_ms) > 0 else float("inf")
+
+
+def _ok(response):
+    """Flask test response, which must have succeeded."""
+    if response.status_code != 200:
+        raise AssertionError(f"{response.request.path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def _offline_scale(n: int, fake_es, repeat: int, queries: int) -> dict:
+    """Throughput / latency of each subsystem on a synthetic book of n sections and a route of n waypoints."""
+    import cache
+    from backend import ElasticsearchBackend
+    from cache import query_embedding_cache
+    from coords import COORD_TOKEN
+    from feature_map import features_to_geojson
+    from ingest import parse_and_chunk
+    from llm import parse_ddm_coordinates
+    from metrics import metrics
+    from passage import refine_passage_geospatial
+    cache.CACHE_ENABLED = False         # every run pays for its embeddings
+    out = {}
+    text = synthetic_pilot_book(n, seed=n)
+    mb = len(text.encode("utf-8")) / 1e6
+    secs, lat = timed(parse_and_chunk, text, repeat=repeat)
+    out["parse"] = {"value": _rate(mb, lat), "unit": "MB/s", "p50_ms": statistics.median(lat)}
+    route = synthetic_route(n, seed=n)
+    refined, lat = timed(refine_passage_geospatial, route, 2.0, repeat=repeat)
+    out["passage"] = {"value": _rate(len(refined), lat), "unit": "points/s", "p50_ms": statistics.median(lat)}
+    coords = [m.group(0) for m in COORD_TOKEN.finditer(text)]
+    _, lat = timed(lambda: [parse_ddm_coordinates(c) for c in coords], repeat=repeat)
+    out["coords"] = {"value": _rate(len(coords), lat), "unit": "coords/s", "p50_ms": statistics.median(lat)}
+    # Default index names: geo_search_dms always queries ES_FEATURES_INDEX. Each scale's
+    # rebuild swaps the aliases over to its own versioned indices.
+    backend = ElasticsearchBackend(fake_es)
+    metrics.reset()
+    _, lat = timed(backend.index_sections, secs, incremental=False)
+    stages = metrics.summary()["stages"]
+    out["index"] = {"value": _rate(len(secs), lat), "unit": "sections/s", "p50_ms": lat[0],
+                    **{f"{k}_s": v["total_s"] for k, v in stages.items() if k in ("embed", "es_write", "rule_extract", "llm_extract")}}
+    # Unchanged book, incremental run: every section must be found by its content hash (scroll
+    # over the fingerprints), so nothing is re-embedded, upserted or deleted.
+    res, lat = timed(backend.index_sections, secs, incremental=True)
+    if res["added"] or res["modified"] or res["removed"]:
+        raise AssertionError(f"incremental re-index of an unchanged book changed sections: {res}")
+    out["reindex"] = {"value": _rate(len(secs), lat), "unit": "sections/s", "p50_ms": lat[0]}
+    terms = [f"Island {i * 37 % 999 + 1}" for i in range(queries)]
+    points = [coords[i * 7919 % len(coords)] for i in range(queries)] if coords else []
+    for name, call, args in (("semantic", backend.semantic_search, terms), ("lexical", backend.lexical_search, terms),
+                             ("hybrid", backend.hybrid_search, terms),
+                             ("geo_dms", lambda c: backend.geo_search_dms(c, "2km"), points)):
+        query_embedding_cache.clear()
+        lat = [timed(call, a)[1][0] for a in args]
+        if lat:
+            out[name] = {"value": len(lat) / (sum(lat) / 1000), "unit": "queries/s", "p50_ms": statistics.median(lat),
+                         "p99_ms": sorted(lat)[min(len(lat) - 1, int(0.99 * len(lat)))]}
+    # Viewports at clustering zooms (geotile_grid aggregations): every feature in view is counted
+    lat = []
+    for zoom in (2, 5, 8):
+        (items, total), t = timed(backend.features_in_view, [-180.0, -85.0, 180.0, 85.0], zoom)
+        if sum(it["count"] for it in items) != total:
+            raise AssertionError(f"viewport at zoom {zoom} covers {sum(it['count'] for it in items)} of {total} features")
+        lat += t
+    out["viewport"] = {"value": len(lat) / (sum(lat) / 1000), "unit": "views/s", "p50_ms": statistics.median(lat)}
+    # The same searches through Flask, i.e. app.run_search and the shared async service
+    import app
+    client = app.app.test_client()
+    for name, call, args in (("api_search", lambda q: _ok(client.get("/api/search", query_string={"q": q})), terms),
+                             ("api_context", lambda c: _ok(client.post("/api/route_context",
+                                                                       json={"query": "anchorage", "coords": [c]})), points)):
+        query_embedding_cache.clear()
+        lat = [timed(call, a)[1][0] for a in args]
+        if lat:
+            out[name] = {"value": len(lat) / (sum(lat) / 1000), "unit": "queries/s", "p50_ms": statistics.median(lat)}
+    _, lat = timed(lambda: json.dumps(features_to_geojson(backend.feature_table(refresh=True))), repeat=repeat)
+    out["geojson"] = {"value": _rate(len(backend.feature_table()), lat), "unit": "features/s", "p50_ms": statistics.median(lat)}
+    return out
+
+
+def bench_offline(scales: str = "100,1000,5000", es_ms: float = 2.0, openai_ms: float = 20.0, repeat: int = 3,
+                  queries: int = 50, save: bool = False, baseline: str = BASELINE_PATH):
+    """
+    Offline suite (fakes.py, no credentials): parse, passage, coords, index, an unchanged
+    incremental re-index (which must upsert nothing), searches (direct and through the API),
+    clustered viewports, GeoJSON and the index page render at each scale, vs the stored
+    baseline. save=true records this run as the baseline for its latency settings.
+    """
+    from fakes import install_fakes
+    fake_es, fake_openai = install_fakes(es_ms, openai_ms)
+    import app
+    import openai       # deferred by llm.with_retry; import it now so it isn't timed as embedding latency
+    results = {}
+    with app.app.test_request_context("/"):
+        app.render_index_page()     # first render imports folium (see bench_importtime)
+        _, lat = timed(app.render_index_page, repeat=repeat)
+    results["render"] = {"index_page": {"value": 1000 / min(lat), "unit": "pages/s", "p50_ms": statistics.median(lat)}}
+    for n in map(int, scales.split(",")):
+        results[str(n)] = _offline_scale(n, fake_es, repeat, queries)
+    key = f"es={es_ms:g}ms openai={openai_ms:g}ms"
+    print(f"offline suite, {key}, {fake_es.requests} ES / {fake_openai.requests} OpenAI requests")
+    _report_against_baseline(results, key, save, baseline)
+
+
+def _report_against_baseline(results: dict, key: str, save: bool, baseline: str = BASELINE_PATH):
+    """
+    Print {group: {name: {value, unit, p50_ms, ...}}} with the change vs the baseline stored
+    under key, flagging slowdowns beyond REGRESSION_TOLERANCE (values in "ms" are lower-is-better,
+    anything else is a throughput). Saves results as the baseline if asked or none exists yet.
+    """
+    stored = json.load(open(baseline)) if os.path.exists(baseline) else {}
+    base = stored.get(key, {})
+    regressions = 0
+    for group, entries in results.items():
+        for name, r in entries.items():
+            line = f"{group:>6s} {name:10s}: {r['value']:12.1f} {r['unit']:11s}"
+            line += "".join(f" {k[:-3]}={v:8.2f}ms" for k, v in r.items() if k.endswith("_ms"))
+            line += "".join(f" {k}={v:.2f}" for k, v in r.items() if k.endswith("_s"))
+            line += "".join(f" {k}={v}" for k, v in r.items() if isinstance(v, str) and k not in ("unit",))
+            if (b := base.get(group, {}).get(name)) is not None and b["value"] and r["value"]:
+                change = b["value"] / r["value"] - 1 if r["unit"] == "ms" else r["value"] / b["value"] - 1
+                line += f"  vs baseline {change:+.1%}"
+                if change < -REGRESSION_TOLERANCE:
+                    line += "  REGRESSION"
+                    regressions += 1
+            print(line)
+    if save or not base:
+        stored[key] = results
+        with open(baseline, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=1, sort_keys=True)
+        print(f"Baseline for {key} saved to '{baseline}'")
+    elif regressions:
+        print(f"{regressions} regressions beyond {REGRESSION_TOLERANCE:.0%}")
+
+
+def _importtime(module: str) -> tuple[float, list[tuple[float, str]]]:
+    """Cumulative import time (ms) of module in a fresh interpreter, and its direct imports by cost."""
+    import subprocess
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                          text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    total, children, pending = None, [], []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # Children are listed before their parent, so collect them until the parent shows up.
+        if depth == 0:
+            if name.strip() == module:
+                total, children = int(cumulative) / 1000, pending
+            pending = []
+        elif depth == 1:
+            pending.append((int(cumulative) / 1000, name.strip()))
+    return total, sorted(children, reverse=True)
+
+
+def bench_importtime(modules: str = "config,passage,search,app,main", repeat: int = 5, save: bool = False,
+                     baseline: str = BASELINE_PATH):
+    """
+    Cold-start cost: `python -X importtime -c "import <module>"` for each module (best of
+    repeat fresh interpreters), with its heaviest direct imports, vs the stored baseline.
+    """
+    results = {"import": {}}
+    for module in modules.split(","):
+        runs = [_importtime(module) for _ in range(repeat)]
+        total, children = min(runs)
+        results["import"][module] = {"value": total, "unit": "ms",
+                                     "heaviest": ", ".join(f"{n} {ms:.0f}ms" for ms, n in children[:4])}
+    _report_against_baseline(results, "importtime", save, baseline)
+
+BENCHMARKS = {name[len("bench_"):]: fn for name, fn in globals().items() if name.startswith("bench_")}
+
+
+def _coerce(value: str, default):
+    """CLI string -> the type of the parameter's default (bool accepts true/false/1/0/yes/no)."""
+    if isinstance(default, bool):
+        if value.lower() not in ("true", "1", "yes", "false", "0", "no"):
+            raise ValueError(f"expected true or false, got {value!r}")
+        return value.lower() in ("true", "1", "yes")
+    if isinstance(default, (int, float)):
+        return type(default)(value)
+    return value
+
+
+def parse_args(fn, argv: list[str]) -> dict:
+    """Bind positional values and key=value pairs to fn's parameters, coerced to their defaults' types."""
+    import inspect
+    params = inspect.signature(fn).parameters
+    kwargs, names, keyword = {}, list(params), False
+    for i, arg in enumerate(argv):
+        key, sep, value = arg.partition("=")
+        if sep and key in params:
+            keyword = True
+        elif keyword or i >= len(names):
+            raise TypeError(f"unexpected argument {arg!r}; parameters are {', '.join(names)}")
+        else:
+            key, value = names[i], arg
+        if key in kwargs:
+            raise TypeError(f"{key} given twice")
+        try:
+            kwargs[key] = _coerce(value, params[key].default)
+        except ValueError as e:
+            raise TypeError(f"bad value for {key}: {e}") from None
+    return kwargs
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        for name, fn in BENCHMARKS.items():
+            print(f"{name:12s} {fn.__doc__}")
+        sys.exit(0 if len(sys.argv) < 2 else 1)
+    fn = BENCHMARKS[sys.argv[1]]
+    try:
+        kwargs = parse_args(fn, sys.argv[2:])
+    except TypeError as e:
+        sys.exit(f"bench.py {sys.argv[1]}: {e}")
+    fn(**kwargs)
@@ -0,0 +1,278 @@
+# cache.py
+# Persistent, content-addressed cache for embeddings and LLM feature extraction so
+# re-indexing unchanged sections makes no API calls.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from metrics import metrics
+from config import (CACHE_PATH, CACHE_MAX_BYTES, CACHE_ENABLED, QUERY_CACHE_SIZE, QUERY_CACHE_TTL,
+                    MAP_CACHE_CHECK_INTERVAL)
+
+
+def content_key(kind: str, model: str, version: str, text: str) -> str:
+    """Hash of everything that determines a cached result."""
+    h = hashlib.sha256()
+    for part in (kind, model, version, text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class ContentCache:
+    """
+    SQLite-backed key/value store with least-recently-used eviction once the
+    stored payloads exceed max_bytes. Safe to share between threads.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+            " size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache(last_used)")
+        self._db.commit()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM cache WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.inc("cache", cache="content", result="miss")
+                return None
+            self.hits += 1
+            metrics.inc("cache", cache="content", result="hit")
+            self._db.execute("UPDATE cache SET last_used=? WHERE key=?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM cache ORDER BY last_used").fetchall():
+            self._db.execute("DELETE FROM cache WHERE key=?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    # ——— Typed helpers ———————————————————————————————————————————
+
+    def get_vector(self, key: str) -> list[float] | None:
+        raw = self.get(key)
+        return None if raw is None else array("f", raw).tolist()
+
+    def put_vector(self, key: str, vec: list[float]) -> None:
+        self.put(key, array("f", vec).tobytes())
+
+    def get_json(self, key: str):
+        raw = self.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def put_json(self, key: str, value) -> None:
+        self.put(key, json.dumps(value).encode("utf-8"))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> ContentCache | None:
+    """Shared process-wide cache, or None when CACHE_ENABLED is off."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ContentCache()
+    return _cache
+
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU + TTL cache for query embeddings. Keys are whitespace/case
+    normalised, and concurrent lookups of the same uncached query share a single
+    in-flight computation instead of each calling the API.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()   # key -> (expires_at, vector)
+        self._inflight = {}             # key -> Future
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def get_or_compute(self, query: str, compute):
+        key = self.normalize(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("cache", cache="query", result="hit")
+                return entry[1]
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+                self.misses += 1
+                metrics.inc("cache", cache="query", result="miss")
+            else:
+                self.coalesced += 1
+                metrics.inc("cache", cache="query", result="coalesced")
+        if not owner:
+            return fut.result()
+        try:
+            value = compute(query)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            fut.set_exception(e)
+            raise
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            del self._inflight[key]
+        fut.set_result(value)
+        return value
+
+    def peek(self, query: str):
+        """Cached value or None, counting a hit or miss (for callers doing their own coalescing)."""
+        key = self.normalize(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("cache", cache="query", result="hit")
+                return entry[1]
+            self.misses += 1
+            metrics.inc("cache", cache="query", result="miss")
+            return None
+
+    def put(self, query: str, value) -> None:
+        key = self.normalize(query)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                    "size": len(self._entries), "maxsize": self.maxsize}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+query_embedding_cache = QueryEmbeddingCache()
+metrics.register_collector("query_cache", lambda: {k: v for k, v in query_embedding_cache.stats().items()
+                                                           if k in ("size", "maxsize")})
+
+
+class LRUCache:
+    """Bounded in-memory LRU mapping, counting lookups as cache{cache=name} hits / misses."""
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            metrics.inc("cache", cache=self.name, result="miss" if value is None else "hit")
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize}
+
+
+class VersionedValue:
+    """
+    A single derived value (e.g. rendered map HTML) rebuilt only when the version of
+    its source changes. The version itself is re-checked at most every
+    check_interval seconds, so hot reads cost nothing.
+    """
+
+    def __init__(self, version_fn, build, check_interval: float = MAP_CACHE_CHECK_INTERVAL):
+        self.version_fn = version_fn
+        self.build = build
+        self.check_interval = check_interval
+        self.builds = 0
+        self._version = None
+        self._value = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return (version, value), rebuilding if the source changed."""
+        with self._lock:
+            now = time.monotonic()
+            if self.builds and now - self._checked_at < self.check_interval:
+                return self._version, self._value
+            try:
+                version = self.version_fn()
+            except Exception as e:
+                if not self.builds:
+                    raise
+                print(f"[Warning] Version check failed, serving cached value: {e}")
+                return self._version, self._value
+            self._checked_at = now
+            if not self.builds or version != self._version:
+                self._value = self.build()
+                self._version = version
+                self.builds += 1
+            return self._version, self._value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.builds = 0
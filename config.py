@@ -1,8 +1,7 @@
 
 import os
+import threading
 from dotenv import load_dotenv
-from elasticsearch import Elasticsearch
-from openai import OpenAI
 
 
 # ——— Load env & configure clients —————————————————————————————
@@ -17,10 +16,166 @@ ES_API_KEY        = os.getenv("ES_API_KEY")     # single Base64 id:secret API ke
 # OpenAI config
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 EMBED_MODEL    = os.getenv("EMBED_MODEL", "text-embedding-ada-002")
+# Shortened embeddings (text-embedding-3-* only); 0 keeps the model's native size
+EMBED_DIMS     = int(os.getenv("EMBED_DIMS", "0"))
+
+# content_vector storage: "float" (float32 HNSW), "int8_hnsw" (float32 source, int8-quantized
+# HNSW graph; Elasticsearch 8.12+) or "byte" (vectors quantized client-side to int8)
+VECTOR_ELEMENT_TYPE = os.getenv("VECTOR_ELEMENT_TYPE", "float").lower()
+# Local backend vector store: "float32", "float16" or "int8"
+LOCAL_VECTOR_DTYPE  = os.getenv("LOCAL_VECTOR_DTYPE", "float32").lower()
+
+# Approximate kNN (HNSW) tuning for content_vector
+HNSW_M               = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+KNN_NUM_CANDIDATES   = int(os.getenv("KNN_NUM_CANDIDATES", "100"))
+
+# Hybrid search: "rrf" or "weighted" fuse separate kNN and BM25 result lists client-side,
+# "" keeps the single combined knn + query request. HYBRID_WINDOW hits are taken from each list.
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf").lower()
+HYBRID_WINDOW = int(os.getenv("HYBRID_WINDOW", "50"))
+
+# Full rebuilds load into versioned indices behind the ES_INDEX_NAME / ES_FEATURES_INDEX aliases.
+# INDEX_REPLICAS is restored after a load (unset = cluster default); previous versions kept for rollback.
+INDEX_REPLICAS            = int(os.environ["INDEX_REPLICAS"]) if os.getenv("INDEX_REPLICAS") else None
+INDEX_KEEP_PREVIOUS       = int(os.getenv("INDEX_KEEP_PREVIOUS", "1"))
+INDEX_FORCE_MERGE_TIMEOUT = int(os.getenv("INDEX_FORCE_MERGE_TIMEOUT", "600"))   # seconds
+
+# Lean search responses: fetch only the _source fields results use (never content_vector),
+# detect lexical matches with named queries, and skip hit counting unless TRACK_TOTAL_HITS
+LEAN_RESPONSES   = os.getenv("LEAN_RESPONSES", "true").lower() in ("true", "1", "yes")
+TRACK_TOTAL_HITS = os.getenv("TRACK_TOTAL_HITS", "false").lower() in ("true", "1", "yes")
+
+# Batch search APIs: searches per _msearch request / texts per embeddings request
+BATCH_CHUNK_SIZE       = int(os.getenv("BATCH_CHUNK_SIZE", "100"))
+EMBED_BATCH_MAX_INPUTS = int(os.getenv("EMBED_BATCH_MAX_INPUTS", "2048"))
 
 RE_INDEX = os.getenv("RE_INDEX", "false").lower() in ("true", "1", "yes")
+# Only re-embed/upsert sections whose content changed, and drop removed ones
+RE_INDEX_INCREMENTAL = os.getenv("RE_INDEX_INCREMENTAL", "true").lower() in ("true", "1", "yes")
+
+# Ingest pipeline tuning
+INGEST_BATCH_SIZE  = int(os.getenv("INGEST_BATCH_SIZE", "64"))   # sections per embeddings request / bulk write
+INGEST_WORKERS     = int(os.getenv("INGEST_WORKERS", "8"))       # concurrent LLM feature extractions
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))   # retries on 429 / rate limit
+
+# Feature extraction: "rules" (rule-based, LLM only for sections with unattributed coordinates),
+# "rules_only" (never call the LLM) or "llm" (every section)
+FEATURE_EXTRACTION = os.getenv("FEATURE_EXTRACTION", "rules").lower()
+
+# On-disk embedding / feature-extraction cache
+CACHE_PATH      = os.getenv("CACHE_PATH", ".cache/sailing_cache.sqlite")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_ENABLED   = os.getenv("CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+
+# In-process query embedding cache used by the search entry points
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL  = float(os.getenv("QUERY_CACHE_TTL", "3600"))   # seconds
+
+# Rendered base map / feature GeoJSON: how often (seconds) to re-check the features index version
+MAP_CACHE_CHECK_INTERVAL = float(os.getenv("MAP_CACHE_CHECK_INTERVAL", "5"))
+
+# Viewport feature API: below this many features in view individual features are returned, otherwise
+# clusters on a geotile grid CLUSTER_PRECISION_OFFSET levels finer than the map zoom; from CLUSTER_MAX_ZOOM
+# never clusters, returning at most this many features (flagged as truncated)
+VIEWPORT_MAX_POINTS      = int(os.getenv("VIEWPORT_MAX_POINTS", "500"))
+CLUSTER_MAX_ZOOM         = int(os.getenv("CLUSTER_MAX_ZOOM", "14"))
+CLUSTER_PRECISION_OFFSET = int(os.getenv("CLUSTER_PRECISION_OFFSET", "3"))
+
+# /api/route: default interpolation distance, Douglas-Peucker tolerance (screen pixels) for
+# requests giving a zoom, cap on refined points per request, and encoded responses kept in memory
+ROUTE_INTERPOLATION_KM = float(os.getenv("ROUTE_INTERPOLATION_KM", "10"))
+ROUTE_SIMPLIFY_PIXELS  = float(os.getenv("ROUTE_SIMPLIFY_PIXELS", "1.0"))
+ROUTE_MAX_POINTS       = int(os.getenv("ROUTE_MAX_POINTS", "200000"))
+ROUTE_CACHE_SIZE       = int(os.getenv("ROUTE_CACHE_SIZE", "256"))
+
+
+# Connection pools of the shared sync clients (get_es / get_openai)
+ES_CONNECTIONS     = int(os.getenv("ES_CONNECTIONS", "16"))       # per ES node
+OPENAI_CONNECTIONS = int(os.getenv("OPENAI_CONNECTIONS", "16"))
+
+# Async search service connection pools
+ES_ASYNC_CONNECTIONS     = int(os.getenv("ES_ASYNC_CONNECTIONS", "32"))    # per ES node
+OPENAI_ASYNC_CONNECTIONS = int(os.getenv("OPENAI_ASYNC_CONNECTIONS", "32"))
+
+# Instrumentation: JSON summary of each ingest run (empty = print only), and whether ?profile=1
+# (cProfile) / ?profile=pyinstrument may profile individual Flask requests
+INGEST_SUMMARY_PATH = os.getenv("INGEST_SUMMARY_PATH", "ingest_summary.json")
+PROFILE_REQUESTS    = os.getenv("PROFILE_REQUESTS", "false").lower() in ("true", "1", "yes")
+
+# Search backend: "elasticsearch" (Elastic Cloud) or "local" (in-process, persisted under LOCAL_INDEX_PATH)
+SEARCH_BACKEND   = os.getenv("SEARCH_BACKEND", "elasticsearch").lower()
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", ".local_index")
+
+
+# ——— Clients ——————————————————————————————————————————————————
+# Built on first use and shared by every caller, so importing config (or a module that only
+# needs settings, e.g. route refinement) never loads the client libraries.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_es():
+    """Shared pooled Elasticsearch client, or None when running offline without ES_CLOUD_ID."""
+    if "es" not in _clients:
+        with _clients_lock:
+            if "es" not in _clients:
+                if ES_CLOUD_ID:
+                    from elasticsearch import Elasticsearch
+                    _clients["es"] = Elasticsearch(cloud_id=ES_CLOUD_ID, api_key=ES_API_KEY,
+                                                   connections_per_node=ES_CONNECTIONS)
+                else:
+                    _clients["es"] = None
+    return _clients["es"]
+
+def get_openai():
+    """Shared pooled OpenAI client."""
+    if "openai" not in _clients:
+        with _clients_lock:
+            if "openai" not in _clients:
+                import httpx
+                from openai import OpenAI
+                limits = httpx.Limits(max_connections=OPENAI_CONNECTIONS, max_keepalive_connections=OPENAI_CONNECTIONS)
+                _clients["openai"] = OpenAI(api_key=OPENAI_API_KEY, http_client=httpx.Client(limits=limits))
+    return _clients["openai"]
+
+def get_async_es():
+    """
+    Shared AsyncElasticsearch for the async search service, or None without ES_CLOUD_ID.
+    Its connections bind to the event loop of its first request (the service's loop).
+    """
+    if "async_es" not in _clients:
+        with _clients_lock:
+            if "async_es" not in _clients:
+                if ES_CLOUD_ID:
+                    from elasticsearch import AsyncElasticsearch
+                    _clients["async_es"] = AsyncElasticsearch(cloud_id=ES_CLOUD_ID, api_key=ES_API_KEY,
+                                                              connections_per_node=ES_ASYNC_CONNECTIONS)
+                else:
+                    _clients["async_es"] = None
+    return _clients["async_es"]
+
+def get_async_openai():
+    """Shared pooled AsyncOpenAI client for the async search service."""
+    if "async_openai" not in _clients:
+        with _clients_lock:
+            if "async_openai" not in _clients:
+                import httpx
+                from openai import AsyncOpenAI
+                limits = httpx.Limits(max_connections=OPENAI_ASYNC_CONNECTIONS,
+                                      max_keepalive_connections=OPENAI_ASYNC_CONNECTIONS)
+                _clients["async_openai"] = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=httpx.AsyncClient(limits=limits))
+    return _clients["async_openai"]
 
+def set_clients(es=None, openai=None, async_es=None, async_openai=None):
+    """Install clients (e.g. the fakes.py stand-ins) in place of the lazily built ones."""
+    with _clients_lock:
+        if es is not None: _clients["es"] = es
+        if openai is not None: _clients["openai"] = openai
+        if async_es is not None: _clients["async_es"] = async_es
+        if async_openai is not None: _clients["async_openai"] = async_openai
 
-# Instantiate clients
-es = Elasticsearch(cloud_id=ES_CLOUD_ID, api_key=ES_API_KEY)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
\ No newline at end of file
+def __getattr__(name):
+    # config.es / config.openai_client, for callers predating the accessors
+    if name == "es": return get_es()
+    if name == "openai_client": return get_openai()
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
\ No newline at end of file
@@ -0,0 +1,117 @@
+# coords.py
+# Fast parsing of the UKHO coordinate notations used in the pilot books: precompiled patterns,
+# arithmetic-only minute parsing and no printing, so failures are reported by return value
+# (or ValueError) and callers decide whether to warn. Shared by ingest (feature extraction)
+# and search (geo_search_dms).
+
+import re
+
+import numpy as np
+
+# 'DDMMmmH DDDMMmmH' (mm = hundredths of a minute), e.g. '441782N 681870W'
+_DDM = re.compile(r"\s*(\d{2})(\d{4})([NS])\s+(\d{0,3})(\d{4})([EW])\s*", re.IGNORECASE)
+# 'DDMM.mmN DDMM.mmW' or 'DDMMmmN DDMMmmW' (as accepted by geo_search_dms)
+_PAIR = re.compile(r"(\d{2})(\d{2,}(?:\.\d*)?)([NS])\s*(\d{2})(\d{2,}(?:\.\d*)?)([EW])")
+# DDM pairs as they appear in running text, e.g. 'Moose Peak Light (442847N 673192W)'
+COORD_TOKEN = re.compile(r"(?<![\w.])(\d{2})(\d{4})([NS])\s+(\d{2,3})(\d{4})([EW])(?![\w.])")
+
+
+def _minutes(m: str) -> float:
+    # '1782' -> 17.82, '17.82' -> 17.82, '17' -> 17.0; one correctly rounded division, like float('17.82')
+    if "." in m:
+        return float(m)
+    return int(m) / 10 ** (len(m) - 2) if len(m) > 2 else float(int(m))
+
+
+def parse_ddm(s) -> tuple[float, float] | None:
+    """
+    'DDMMmmH DDDMMmmH' -> (lat, lon) in decimal degrees, or None if s is not a
+    string in that format or is out of range. Example: '441782N 681870W' -> (44.297, -68.3111...).
+    """
+    if not isinstance(s, str):
+        return None
+    m = _DDM.fullmatch(s)
+    if m is None:
+        return None
+    lat = int(m.group(1)) + int(m.group(2)) / 100 / 60.0
+    lon = int(m.group(4) or 0) + int(m.group(5)) / 100 / 60.0
+    if m.group(3) in "Ss":
+        lat = -lat
+    if m.group(6) in "Ww":
+        lon = -lon
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def parse_dms_pair(s: str) -> tuple[float, float]:
+    """
+    Convert UKHO DDM ('DDMM.mmN DDDMM.mmW' or compact 'DDMMmmN DDMMmmW') to (lat, lon).
+    Without a decimal point, digits after the first two of the minutes are decimals
+    (2205 = 22.05'). Raises ValueError on a bad format or out-of-range result.
+    """
+    s = s.strip()
+    m = _PAIR.fullmatch(s)
+    if m is None:
+        raise ValueError(f"Bad coordinate format: {s}")
+    d0, m0, dir0, d1, m1, dir1 = m.groups()
+    lat = (int(d0) + _minutes(m0) / 60) * (1 if dir0 == "N" else -1)
+    lon = (int(d1) + _minutes(m1) / 60) * (1 if dir1 == "E" else -1)
+    if not -90 <= lat <= 90:
+        raise ValueError(f"Latitude out of range: {lat} from '{s}'")
+    if not -180 <= lon <= 180:
+        raise ValueError(f"Longitude out of range: {lon} from '{s}'")
+    return lat, lon
+
+
+_DIGITS = [0, 1, 2, 3, 4, 5, 8, 9, 10, 11, 12, 13, 14]     # in the canonical 'DDMMmmH DDDMMmmH'
+
+
+def parse_ddm_array(strings) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Bulk parse_ddm: an iterable (or array) of 'DDMMmmH DDDMMmmH' strings -> an (N, 2)
+    float64 array of (lat, lon) and a boolean error mask; rows that failed are NaN.
+    Strings in the canonical form (2- or 3-digit longitude degrees, one space) are decoded
+    as a character matrix in NumPy; anything else goes through parse_ddm.
+    """
+    strs = [s.strip().upper() if isinstance(s, str) else "" for s in strings]
+    strs = [s[:8] + "0" + s[8:] if len(s) == 15 else s for s in strs]      # DDMMmmH -> 0DDMMmmH longitude
+    n = len(strs)
+    out = np.full((n, 2), np.nan)
+    if not n:
+        return out, np.zeros(0, dtype=bool)
+    chars = np.array(strs, dtype="U16").view(np.uint32).reshape(n, 16)
+    lengths = np.fromiter(map(len, strs), dtype=np.int64, count=n)
+    digits = chars[:, _DIGITS].astype(np.int64) - ord("0")
+    canonical = ((lengths == 16) & ((digits >= 0) & (digits <= 9)).all(axis=1) & (chars[:, 7] == ord(" "))
+                 & np.isin(chars[:, 6], (ord("N"), ord("S"))) & np.isin(chars[:, 15], (ord("E"), ord("W"))))
+    # Degrees and hundredths of minutes as integers, then the same divisions as parse_ddm.
+    lat = (digits[:, 0] * 10 + digits[:, 1]) + (digits[:, 2:6] @ np.array([1000, 100, 10, 1])) / 100 / 60.0
+    lon = (digits[:, 6:9] @ np.array([100, 10, 1])) + (digits[:, 9:13] @ np.array([1000, 100, 10, 1])) / 100 / 60.0
+    lat = np.where(chars[:, 6] == ord("S"), -lat, lat)
+    lon = np.where(chars[:, 15] == ord("W"), -lon, lon)
+    ok = canonical & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    out[ok, 0], out[ok, 1] = lat[ok], lon[ok]
+    for i in np.flatnonzero(~canonical).tolist():
+        if (latlon := parse_ddm(strs[i])) is not None:
+            out[i] = latlon
+            ok[i] = True
+    return out, ~ok
+
+
+def find_coordinates(text: str) -> list[tuple[int, int, float, float]]:
+    """
+    Every 'DDMMmmN DDDMMmmW' pair in free text as (start, end, lat, lon), in order of
+    appearance; tokens that are out of range are skipped.
+    """
+    out = []
+    for m in COORD_TOKEN.finditer(text):
+        lat = int(m.group(1)) + int(m.group(2)) / 100 / 60.0
+        lon = int(m.group(4)) + int(m.group(5)) / 100 / 60.0
+        if m.group(3) == "S":
+            lat = -lat
+        if m.group(6) == "W":
+            lon = -lon
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            out.append((m.start(), m.end(), lat, lon))
+    return out
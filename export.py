@@ -0,0 +1,193 @@
+# export.py
+# Constant-memory streaming over the sections and features indices (point-in-time + search_after)
+# and exporters to NDJSON, GeoJSON and a columnar directory layout.
+# Usage: python export.py {features|sections} OUT [--format ndjson|geojson|columnar] [--with-vectors]
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from records import FeatureTable, feature_id
+
+FEATURE_FIELDS = ["feature_id", "name", "location", "section_id"]
+SECTION_FIELDS = ["section_id", "title", "parents", "content", "content_hash", "features", "feature_names"]
+
+
+def scan_index(es, index_name, source=None, query=None, page_size: int = 1000, keep_alive: str = "2m"):
+    """
+    Yield the _source of every document in index_name from a consistent point-in-time
+    snapshot, paging with search_after so neither memory nor the 10k result window
+    limits the size of the index. `source` is passed through as _source filtering.
+    """
+    pit_id = es.open_point_in_time(index=index_name, keep_alive=keep_alive)["id"]
+    try:
+        search_after = None
+        while True:
+            body = {"size": page_size, "query": query or {"match_all": {}},
+                    "pit": {"id": pit_id, "keep_alive": keep_alive},
+                    "sort": [{"_shard_doc": "asc"}], "track_total_hits": False}
+            if source is not None:
+                body["_source"] = source
+            if search_after is not None:
+                body["search_after"] = search_after
+            res = es.search(body=body)
+            pit_id = res.get("pit_id", pit_id)
+            hits = res["hits"]["hits"]
+            for h in hits:
+                yield h.get("_source", {})
+            if len(hits) < page_size:
+                return
+            search_after = hits[-1]["sort"]
+    finally:
+        es.close_point_in_time(id=pit_id)
+
+
+def iter_features(es, index_name):
+    """Stream feature docs from the features index."""
+    return scan_index(es, index_name, source=FEATURE_FIELDS)
+
+
+def iter_sections(es, index_name, with_vectors: bool = False):
+    """Stream section docs, leaving out content_vector unless asked for."""
+    return scan_index(es, index_name, source=SECTION_FIELDS + (["content_vector"] if with_vectors else []))
+
+
+# ——— Exporters ———————————————————————————————————————————————
+
+def export_ndjson(docs, path: str) -> int:
+    """One JSON document per line."""
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for doc in docs:
+            f.write(json.dumps(doc, separators=(",", ":")))
+            f.write("\n")
+            n += 1
+    return n
+
+
+def export_geojson(features, path: str) -> int:
+    """Feature docs as a GeoJSON FeatureCollection, written incrementally."""
+    from feature_map import features_to_geojson
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"type":"FeatureCollection","features":[\n')
+        for feat in features:
+            if n:
+                f.write(",\n")
+            f.write(json.dumps(features_to_geojson([feat])["features"][0], separators=(",", ":")))
+            n += 1
+        f.write("\n]}\n")
+    return n
+
+
+def export_columnar(features, path: str, chunk_rows: int = 65536) -> int:
+    """
+    Feature docs (or a FeatureTable) as a directory of columns written in row groups of
+    chunk_rows: lat.f8 / lon.f8 are raw little-endian float64 (np.memmap-able), feature_id /
+    name / section_id are newline-separated UTF-8, and meta.json records the row count.
+    """
+    os.makedirs(path, exist_ok=True)
+    if isinstance(features, FeatureTable):
+        return _export_table_columnar(features, path, chunk_rows)
+    text_cols = ("feature_id", "name", "section_id")
+    files = {c: open(os.path.join(path, c + ".txt"), "w", encoding="utf-8") for c in text_cols}
+    files.update({c: open(os.path.join(path, c + ".f8"), "wb") for c in ("lat", "lon")})
+    n = 0
+    try:
+        rows = []
+        def flush():
+            for c in text_cols:
+                files[c].write("".join(str(r[c]).replace("\n", " ") + "\n" for r in rows))
+            for c in ("lat", "lon"):
+                files[c].write(np.array([r["location"][c] for r in rows], dtype="<f8").tobytes())
+            rows.clear()
+        for feat in features:
+            rows.append(feat)
+            n += 1
+            if len(rows) >= chunk_rows:
+                flush()
+        flush()
+    finally:
+        for f in files.values():
+            f.close()
+    _write_columnar_meta(path, n)
+    return n
+
+
+def _write_columnar_meta(path: str, n: int):
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"rows": n, "columns": {"lat": "<f8", "lon": "<f8", "feature_id": "utf8-lines",
+                                          "name": "utf8-lines", "section_id": "utf8-lines"}}, f)
+
+
+def _export_table_columnar(table: FeatureTable, path: str, chunk_rows: int) -> int:
+    # Coordinates go straight from the arrays; text columns are rendered chunk by chunk.
+    for c, arr in (("lat", table.lats), ("lon", table.lons)):
+        arr.astype("<f8").tofile(os.path.join(path, c + ".f8"))
+    with open(os.path.join(path, "feature_id.txt"), "w", encoding="utf-8") as fid, \
+         open(os.path.join(path, "name.txt"), "w", encoding="utf-8") as name, \
+         open(os.path.join(path, "section_id.txt"), "w", encoding="utf-8") as sid:
+        for start in range(0, len(table), chunk_rows):
+            rows = range(start, min(start + chunk_rows, len(table)))
+            sids = [str(table.section_id(i)) for i in rows]
+            names = [table.names[i] for i in rows]
+            fid.write("".join(feature_id(s, n).replace("\n", " ") + "\n" for s, n in zip(sids, names)))
+            name.write("".join(n.replace("\n", " ") + "\n" for n in names))
+            sid.write("".join(s.replace("\n", " ") + "\n" for s in sids))
+    _write_columnar_meta(path, len(table))
+    return len(table)
+
+
+def read_columnar(path: str) -> dict:
+    """Load a columnar export: lat/lon as memory-mapped arrays, text columns as lists."""
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        rows = json.load(f)["rows"]
+    out = {c: np.memmap(os.path.join(path, c + ".f8"), dtype="<f8", mode="r", shape=(rows,)) if rows
+           else np.zeros(0) for c in ("lat", "lon")}
+    for c in ("feature_id", "name", "section_id"):
+        with open(os.path.join(path, c + ".txt"), encoding="utf-8") as f:
+            out[c] = f.read().splitlines()
+    return out
+
+
+def read_feature_table(path: str) -> FeatureTable:
+    """Load a columnar export as a FeatureTable (lat/lon stay memory-mapped)."""
+    cols = read_columnar(path)
+    codes, section_ids, code_of = np.empty(len(cols["section_id"]), dtype=np.int32), [], {}
+    for i, sid in enumerate(cols["section_id"]):
+        if sid not in code_of:
+            code_of[sid] = len(section_ids)
+            section_ids.append(sid)
+        codes[i] = code_of[sid]
+    names = [sys.intern(n) for n in cols["name"]]
+    return FeatureTable(cols["lat"], cols["lon"], names, codes, section_ids)
+
+
+EXPORTERS = {"ndjson": export_ndjson, "geojson": export_geojson, "columnar": export_columnar}
+
+if __name__ == "__main__":
+    from backend import get_backend
+    from config import get_es, ES_INDEX_NAME
+    parser = argparse.ArgumentParser(description="Stream an index to disk in constant memory.")
+    parser.add_argument("index", choices=["features", "sections"])
+    parser.add_argument("out")
+    parser.add_argument("--format", choices=list(EXPORTERS), default="ndjson")
+    parser.add_argument("--with-vectors", action="store_true", help="include content_vector in section exports")
+    args = parser.parse_args()
+    if args.index == "sections":
+        if args.format != "ndjson":
+            parser.error("sections can only be exported as ndjson")
+        es = get_es()
+        if es is None:
+            parser.error("exporting sections needs Elasticsearch; set ES_CLOUD_ID")
+        docs = iter_sections(es, ES_INDEX_NAME, with_vectors=args.with_vectors)
+    else:
+        # Features come from whichever backend SEARCH_BACKEND selects (the local index works offline)
+        try:
+            docs = get_backend().iter_features()
+        except ValueError as e:
+            parser.error(str(e))
+    print(f"Exported {EXPORTERS[args.format](docs, args.out)} {args.index} to {args.out}")
@@ -0,0 +1,121 @@
+# extract.py
+# Rule-based feature extraction for pilot-book sections: UKHO text mostly cites features as
+# `Name (DDMMmmN DDDMMmmW)`, so names are attributed to coordinates locally and the LLM is
+# only asked about sections whose coordinates the rules can't attribute.
+
+import re
+import threading
+
+from config import FEATURE_EXTRACTION
+from coords import find_coordinates
+from llm import llm_extract_features
+from metrics import metrics
+from records import Feature
+
+MAX_NAME_WORDS = 10
+NAME_WINDOW = 300       # chars before the coordinates searched for the name
+# Anything that looks like a latitude, parsed or not ('442847N', '4428.47N', '44 28.47N')
+_COORD_LIKE = re.compile(r"(?<![\w.])\d{2}\s?\d{2}(?:\.?\d+)?\s?[NS](?![\w])")
+# The name ends at the last clause break before the coordinates ...
+_CLAUSE_BREAK = re.compile(r"[.;:,!?\n()\[\]]|\s-\s")
+# ... or the last connecting word, which never belongs to a name
+_CONNECTOR = re.compile(r"\b(?:and|or|between|through|via|to|from|past|passes|passing|leads|lies|lying|"
+                        r"is|are|was|with|at|on|in|into|off|near|by|towards?|then|until|as|also|see)\b")
+# Sentence openers that are capitalised but not part of a name ('The', 'Pass N of …')
+_LEADING_WORDS = {"the", "a", "an", "pass", "keep", "steer", "head", "enter", "leave", "there", "this", "that", "it"}
+_COMPASS = re.compile(r"^(?:[NSEW]|[NS][EW]|[NSEW][NS][EW])$")
+
+
+def _attribute_name(text: str, open_paren: int) -> str | None:
+    """Name cited just before the '(' at open_paren, or None if there isn't a plausible one."""
+    prefix = text[max(0, open_paren - NAME_WINDOW):open_paren].rstrip()
+    note = ""
+    if prefix.endswith(")"):
+        # A descriptive parenthetical belongs to the name: 'Moose Peak Light (white tower) (…)'
+        start = prefix.rfind("(")
+        if start == -1 or find_coordinates(prefix[start:]):
+            return None
+        note, prefix = " " + prefix[start:], prefix[:start].rstrip()
+    breaks = [m.end() for m in _CLAUSE_BREAK.finditer(prefix)]
+    clause = prefix[breaks[-1] if breaks else 0:]
+    connectors = [m.end() for m in _CONNECTOR.finditer(clause)]
+    words = clause[connectors[-1] if connectors else 0:].split()
+    # Leading lowercase words and sentence openers are context, not name.
+    while words and (words[0].lower() in _LEADING_WORDS or
+                     not (words[0][:1].isupper() or words[0][:1].isdigit() or _COMPASS.match(words[0]))):
+        words.pop(0)
+    if not words or len(words) > MAX_NAME_WORDS:
+        return None
+    return " ".join(words) + note
+
+
+def rule_extract_features(text: str) -> tuple[list[Feature], bool]:
+    """
+    Features cited as `Name (DDMMmmN DDDMMmmW)` in text, as Feature records,
+    plus whether every coordinate-like string in text was attributed to a name.
+    """
+    feats, attributed = [], 0
+    for start, end, lat, lon in find_coordinates(text):
+        open_paren = start - 1
+        while open_paren >= 0 and text[open_paren].isspace():
+            open_paren -= 1
+        close_paren = end
+        while close_paren < len(text) and text[close_paren].isspace():
+            close_paren += 1
+        if open_paren < 0 or text[open_paren] != "(" or text[close_paren:close_paren + 1] != ")":
+            continue
+        name = _attribute_name(text, open_paren)
+        if name is None:
+            continue
+        feats.append(Feature(name, lat, lon))
+        attributed += 1
+    return feats, attributed == len(_COORD_LIKE.findall(text))
+
+
+class ExtractionStats:
+    """Thread-safe counts of how each section's features were extracted."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.sections = self.rules = self.llm = self.no_coords = 0
+
+    def record(self, kind: str) -> None:
+        with self._lock:
+            self.sections += 1
+            setattr(self, kind, getattr(self, kind) + 1)
+
+    def stats(self) -> dict:
+        return {"sections": self.sections, "rules": self.rules, "llm": self.llm, "no_coords": self.no_coords,
+                "llm_fraction": self.llm / self.sections if self.sections else 0.0}
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (f"Feature extraction: {s['sections']} sections, {s['rules']} by rules, {s['no_coords']} without "
+                f"coordinates, {s['llm']} needed the LLM ({s['llm_fraction']:.1%})")
+
+
+extraction_stats = ExtractionStats()
+metrics.register_collector("extraction", extraction_stats.stats)
+
+
+def extract_features(text: str, mode: str = FEATURE_EXTRACTION) -> list[Feature]:
+    """
+    Features of a section as Feature records. mode "rules" uses the rule-based
+    parser and falls back to llm_extract_features for sections with unattributed
+    coordinates; "rules_only" never calls the LLM; "llm" always does.
+    """
+    if mode == "llm":
+        extraction_stats.record("llm")
+        return llm_extract_features(text)
+    if mode not in ("rules", "rules_only"):
+        raise ValueError(f"Unknown FEATURE_EXTRACTION '{mode}'")
+    with metrics.timer("rule_extract"):
+        feats, complete = rule_extract_features(text)
+    if complete or mode == "rules_only":
+        extraction_stats.record("rules" if feats or not complete else "no_coords")
+        return feats
+    extraction_stats.record("llm")
+    return llm_extract_features(text)
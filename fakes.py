@@ -0,0 +1,625 @@
+# fakes.py
+# Offline stand-ins for the Elasticsearch and OpenAI clients, for benchmarks and demos without
+# cloud credentials: an in-memory Elasticsearch that evaluates the subset of the query DSL this
+# repo sends (match_phrase, nested, bool, geo_distance, geo_bounding_box, terms, knn,
+# script_score, point-in-time and scroll paging, aliases, bulk, the viewport's geotile_grid /
+# geo_centroid / top_hits aggregations) and an OpenAI client returning deterministic
+# embeddings and extraction JSON. Both sleep a configurable latency per request
+# so network-bound paths (batching, fan-out) can be compared.
+
+import asyncio
+import fnmatch
+import hashlib
+import itertools
+import json
+import math
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from elastic_transport import JsonSerializer
+
+from coords import COORD_TOKEN
+from geoindex import tile_keys
+
+
+class _Response(dict):
+    """dict that also answers .body, like the client's ObjectApiResponse."""
+
+    @property
+    def body(self):
+        return self
+
+
+def _sleep(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+# ——— Elasticsearch ——————————————————————————————————————————————
+
+_DISTANCE_UNITS = {"km": 1000.0, "m": 1.0, "mi": 1609.344, "nmi": 1852.0, "NM": 1852.0}
+
+
+def _meters(distance) -> float:
+    if isinstance(distance, (int, float)):
+        return float(distance)
+    for unit in sorted(_DISTANCE_UNITS, key=len, reverse=True):
+        if distance.endswith(unit):
+            return float(distance[:-len(unit)]) * _DISTANCE_UNITS[unit]
+    return float(distance)
+
+
+def _haversine_m(a: dict, b: dict) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (a["lat"], a["lon"], b["lat"], b["lon"]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000.0 * math.asin(math.sqrt(h))
+
+
+def _values(src: dict, field: str) -> list:
+    """Every value at a dotted path, flattening lists along the way."""
+    vals = [src]
+    for part in field.split("."):
+        nxt = []
+        for v in vals:
+            v = v.get(part) if isinstance(v, dict) else None
+            if isinstance(v, list):
+                nxt.extend(v)
+            elif v is not None:
+                nxt.append(v)
+        vals = nxt
+    return vals
+
+
+def _field_query(spec):
+    """(field, text, boost, name) of a {field: text | {"query": ...}} leaf query."""
+    field, value = next((k, v) for k, v in spec.items() if k not in ("_name", "boost"))
+    if isinstance(value, dict):
+        return field, value.get("query", value.get("value")), value.get("boost", 1.0), value.get("_name")
+    return field, value, spec.get("boost", 1.0), spec.get("_name")
+
+
+def _evaluate(q: dict, src: dict, names: set) -> float | None:
+    """Score of src for query q (None when it doesn't match), collecting matched _names."""
+    kind, spec = next(iter(q.items()))
+    score, name = None, spec.get("_name") if isinstance(spec, dict) else None
+    if kind == "match_all":
+        score = spec.get("boost", 1.0)
+    elif kind in ("match_phrase", "match"):
+        field, text, boost, name = _field_query(spec)
+        text = str(text).lower()
+        hay = [str(v).lower() for v in _values(src, field)]
+        hit = any(text in v for v in hay) if kind == "match_phrase" else \
+            any(t in v for t in text.split() for v in hay)
+        score = boost * (1.0 + sum(v.count(text) for v in hay) / 10) if hit else None
+    elif kind in ("term", "terms"):
+        field, wanted = next((k, v) for k, v in spec.items() if k not in ("_name", "boost"))
+        wanted = wanted if isinstance(wanted, list) else [wanted.get("value") if isinstance(wanted, dict) else wanted]
+        score = 1.0 if set(map(str, _values(src, field))) & set(map(str, wanted)) else None
+    elif kind == "nested":
+        items = src.get(spec["path"]) or []
+        scores = [s for it in items if (s := _evaluate(spec["query"], {spec["path"]: it}, names)) is not None]
+        score = max(scores) if scores else None
+    elif kind == "bool":
+        required = [c for key in ("must", "filter") for c in _as_list(spec.get(key))]
+        should = _as_list(spec.get("should"))
+        req = [_evaluate(c, src, names) for c in required]
+        opt = [s for c in should if (s := _evaluate(c, src, names)) is not None]
+        if any(s is None for s in req) or (should and not required and not opt) \
+                or any(_evaluate(c, src, set()) is not None for c in _as_list(spec.get("must_not"))):
+            return None
+        score = sum(s for s, c in zip(req, required) if c not in _as_list(spec.get("filter"))) + sum(opt)
+        score = score or 1.0
+    elif kind == "geo_distance":
+        field, origin = next((k, v) for k, v in spec.items() if k not in ("distance", "_name", "boost"))
+        limit = _meters(spec["distance"])
+        score = 1.0 if any(_haversine_m(p, origin) <= limit for p in _values(src, field)) else None
+    elif kind == "geo_bounding_box":
+        field, box = next((k, v) for k, v in spec.items() if k not in ("_name", "boost"))
+        tl, br = box["top_left"], box["bottom_right"]
+        # top_left lon > bottom_right lon: the box crosses the antimeridian
+        in_lon = (lambda lon: tl["lon"] <= lon <= br["lon"]) if tl["lon"] <= br["lon"] else \
+                 (lambda lon: lon >= tl["lon"] or lon <= br["lon"])
+        score = 1.0 if any(br["lat"] <= p["lat"] <= tl["lat"] and in_lon(p["lon"])
+                           for p in _values(src, field)) else None
+    elif kind == "script_score":
+        base = _evaluate(spec["query"], src, names)
+        params = spec["script"].get("params", {})
+        if base is not None and "query_vector" in params:
+            vec = src.get("content_vector")
+            cos = _cosine(vec, params["query_vector"]) if vec is not None else 0.0
+            alpha = params.get("alpha", 1.0)
+            base = (cos + 1.0) * alpha + base * (1 - alpha) if "alpha" in params else cos + 1.0
+        score = base
+    else:
+        score = 1.0     # unsupported clause: treat as match_all
+    if score is not None and name:
+        names.add(name)
+    return score
+
+
+def _aggregate(aggs: dict, hits: list) -> dict:
+    """
+    geotile_grid (with nested aggregations), geo_centroid and top_hits over the matching
+    hits, as (index, id, score, seq_no, source, names); any other aggregation comes back empty.
+    """
+    out = {}
+    for name, spec in aggs.items():
+        if "geotile_grid" in spec:
+            grid, z = spec["geotile_grid"], spec["geotile_grid"].get("precision", 7)
+            located = [(h, p) for h in hits for p in _values(h[4], grid["field"])[:1] if isinstance(p, dict)]
+            keys = tile_keys(np.array([p["lat"] for _, p in located], dtype=np.float64),
+                             np.array([p["lon"] for _, p in located], dtype=np.float64), z).tolist()
+            cells = {}
+            for (h, _), key in zip(located, keys):
+                cells.setdefault(key, []).append(h)
+            top = sorted(cells.items(), key=lambda c: -len(c[1]))[:grid.get("size", 10000)]
+            out[name] = {"buckets": [{"key": f"{z}/{key // (1 << z)}/{key % (1 << z)}", "doc_count": len(members),
+                                      **_aggregate(spec.get("aggs", {}), members)} for key, members in top]}
+        elif "geo_centroid" in spec:
+            points = [p for h in hits for p in _values(h[4], spec["geo_centroid"]["field"]) if isinstance(p, dict)]
+            out[name] = {"count": len(points)}
+            if points:
+                out[name]["location"] = {"lat": sum(p["lat"] for p in points) / len(points),
+                                         "lon": sum(p["lon"] for p in points) / len(points)}
+        elif "top_hits" in spec:
+            top_hits = []
+            for index, doc_id, score, _, src, _ in hits[:spec["top_hits"].get("size", 3)]:
+                h = {"_index": index, "_id": doc_id, "_score": score}
+                if (filtered := _filter_source(src, spec["top_hits"].get("_source"))) is not None:
+                    h["_source"] = filtered
+                top_hits.append(h)
+            out[name] = {"hits": {"total": {"value": len(hits), "relation": "eq"},
+                                  "max_score": max((h[2] for h in hits), default=None), "hits": top_hits}}
+        else:
+            out[name] = {"buckets": []}
+    return out
+
+
+def _as_list(v) -> list:
+    return [] if v is None else v if isinstance(v, list) else [v]
+
+
+def _cosine(a, b) -> float:
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    n = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / n if n else 0.0
+
+
+def _filter_source(src: dict, source):
+    if source is None or source is True:
+        return src
+    if source is False:
+        return None
+    fields = source if isinstance(source, list) else source.get("includes", [])
+    return {k: v for k, v in src.items() if k in fields}
+
+
+class _FakeIndex:
+    def __init__(self, mappings=None, settings=None):
+        self.docs = {}              # id -> (seq_no, source)
+        self.mappings = mappings or {}
+        self.settings = {f"index.{k}": str(v) for k, v in (settings or {}).items()}
+        self._matrix = None         # (ids, float32 unit-vector matrix) for knn, rebuilt after writes
+        self.index_total = 0        # write counters reported by indices.stats
+        self.delete_total = 0
+
+    def put(self, doc_id, src, seq_no):
+        self.docs[str(doc_id)] = (seq_no, src)
+        self.index_total += 1
+        self._matrix = None
+
+    def delete(self, doc_id) -> bool:
+        self._matrix = None
+        if self.docs.pop(str(doc_id), None) is None:
+            return False
+        self.delete_total += 1
+        return True
+
+    def matrix(self):
+        if self._matrix is None:
+            ids = [i for i, (_, s) in self.docs.items() if s.get("content_vector") is not None]
+            m = np.array([self.docs[i][1]["content_vector"] for i in ids], dtype=np.float32).reshape(len(ids), -1)
+            norms = np.linalg.norm(m, axis=1, keepdims=True)
+            self._matrix = ids, m / np.where(norms > 0, norms, 1.0)
+        return self._matrix
+
+
+class _FakeIndices:
+    def __init__(self, es: "FakeElasticsearch"):
+        self._es = es
+
+    def exists(self, index):
+        self._es._request()
+        return bool(self._es._resolve(index, missing_ok=True))
+
+    def create(self, index, body=None, mappings=None, settings=None):
+        self._es._request()
+        if index in self._es._indices or index in self._es._aliases:
+            raise ValueError(f"resource_already_exists_exception: {index}")
+        body = body or {}
+        settings = settings or body.get("settings", {})
+        self._es._indices[index] = _FakeIndex(mappings or body.get("mappings"), settings.get("index", settings))
+        return _Response(acknowledged=True, index=index)
+
+    def put_mapping(self, index, body=None, **kwargs):
+        self._es._request()
+        for name in self._es._resolve(index):
+            self._es._indices[name].mappings = body or kwargs
+        return _Response(acknowledged=True)
+
+    def get_settings(self, index, flat_settings=True, **kwargs):
+        self._es._request()
+        return _Response({name: {"settings": dict(self._es._indices[name].settings)} for name in self._es._resolve(index)})
+
+    def put_settings(self, index, body=None, settings=None, **kwargs):
+        self._es._request()
+        new = (body or {}).get("index", settings or {})
+        for name in self._es._resolve(index):
+            s = self._es._indices[name].settings
+            for k, v in new.items():
+                if v is None:
+                    s.pop(f"index.{k}", None)
+                else:
+                    s[f"index.{k}"] = str(v)
+        return _Response(acknowledged=True)
+
+    def refresh(self, index=None, **kwargs):
+        self._es._request()
+        return _Response(_shards={"failed": 0})
+
+    def stats(self, index=None, metric=None, **kwargs):
+        self._es._request()
+        per_index = {}
+        for name in self._es._resolve(index or "*"):
+            idx = self._es._indices[name]
+            indexing = {"index_total": idx.index_total, "delete_total": idx.delete_total}
+            per_index[name] = {"primaries": {"indexing": indexing}, "total": {"indexing": dict(indexing)}}
+        return _Response(indices=per_index)
+
+    def forcemerge(self, index=None, **kwargs):
+        self._es._request()
+        return _Response(_shards={"failed": 0})
+
+    def delete(self, index, **kwargs):
+        self._es._request()
+        for name in self._es._resolve(index):
+            del self._es._indices[name]
+            for targets in self._es._aliases.values():
+                targets.discard(name)
+        return _Response(acknowledged=True)
+
+    def get(self, index, **kwargs):
+        self._es._request()
+        return _Response({name: {"mappings": self._es._indices[name].mappings} for name in self._es._resolve(index, missing_ok=True)})
+
+    def exists_alias(self, name, **kwargs):
+        self._es._request()
+        return bool(self._es._aliases.get(name))
+
+    def get_alias(self, name=None, index=None, **kwargs):
+        self._es._request()
+        return _Response({i: {"aliases": {a: {}}} for a, targets in self._es._aliases.items()
+                          if name is None or fnmatch.fnmatch(a, name) for i in targets})
+
+    def update_aliases(self, body=None, actions=None, **kwargs):
+        self._es._request()
+        for action in (body or {}).get("actions", actions or []):
+            (op, spec), = action.items()
+            if op == "add":
+                self._es._aliases.setdefault(spec["alias"], set()).add(spec["index"])
+            elif op == "remove":
+                self._es._aliases.get(spec["alias"], set()).discard(spec["index"])
+            elif op == "remove_index":
+                self._es._indices.pop(spec["index"], None)
+        return _Response(acknowledged=True)
+
+
+class FakeElasticsearch:
+    """
+    In-memory Elasticsearch client covering the calls made by search.py, backend.py,
+    export.py and the bulk helpers. Every request sleeps latency_ms first; writes are
+    visible immediately (refresh is a no-op). Scores are plausible, not BM25.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self._indices = {}          # name -> _FakeIndex
+        self._aliases = {}          # alias -> set of index names
+        self._pits = {}             # pit id -> index names
+        self._scrolls = {}          # scroll id -> (remaining hits, page size, total)
+        self._seq = itertools.count()
+        self.indices = _FakeIndices(self)
+        self.transport = SimpleNamespace(serializers=SimpleNamespace(get_serializer=lambda _: JsonSerializer()))
+
+    def options(self, **kwargs):
+        return self
+
+    def _request(self):
+        self.requests += 1
+        _sleep(self.latency_ms)
+
+    def _resolve(self, index, missing_ok: bool = False) -> list[str]:
+        names = []
+        for part in (index.split(",") if isinstance(index, str) else index):
+            if part in self._aliases and self._aliases[part]:
+                names += sorted(self._aliases[part])
+            elif any(c in part for c in "*?"):
+                names += sorted(n for n in self._indices if fnmatch.fnmatch(n, part))
+            elif part in self._indices:
+                names.append(part)
+            elif not missing_ok:
+                raise KeyError(f"index_not_found_exception: {part}")
+        return names
+
+    # ——— Documents ——————————————————————————————————————————————
+
+    def index(self, index, id=None, body=None, document=None, **kwargs):
+        self._request()
+        name = (self._resolve(index, missing_ok=True) or [index])[0]
+        self._indices.setdefault(name, _FakeIndex()).put(id, body if body is not None else document, next(self._seq))
+        return _Response(_index=name, _id=str(id), result="created")
+
+    def delete(self, index, id, **kwargs):
+        self._request()
+        found = any(self._indices[n].delete(id) for n in self._resolve(index))
+        return _Response(_id=str(id), result="deleted" if found else "not_found")
+
+    def delete_by_query(self, index, body=None, query=None, **kwargs):
+        self._request()
+        q, deleted = (body or {}).get("query", query), 0
+        for name in self._resolve(index, missing_ok=True):
+            idx = self._indices[name]
+            for doc_id in [i for i, (_, s) in idx.docs.items() if _evaluate(q, s, set()) is not None]:
+                deleted += idx.delete(doc_id)
+        return _Response(deleted=deleted)
+
+    def bulk(self, operations, **kwargs):
+        self._request()
+        lines = [json.loads(op) if isinstance(op, (bytes, str)) else op for op in operations]
+        items, i = [], 0
+        while i < len(lines):
+            (op, meta), = lines[i].items()
+            name = (self._resolve(meta["_index"], missing_ok=True) or [meta["_index"]])[0]
+            if op == "delete":
+                found = name in self._indices and self._indices[name].delete(meta["_id"])
+                items.append({op: {"_index": name, "_id": meta["_id"], "status": 200 if found else 404}})
+                i += 1
+                continue
+            src = lines[i + 1]
+            if op == "update":
+                prev = self._indices.get(name, _FakeIndex()).docs.get(str(meta["_id"]), (0, {}))[1]
+                src = {**prev, **src.get("doc", {})}
+            self._indices.setdefault(name, _FakeIndex()).put(meta.get("_id"), src, next(self._seq))
+            items.append({op: {"_index": name, "_id": meta.get("_id"), "status": 201}})
+            i += 2
+        return _Response(took=0, errors=False, items=items)
+
+    # ——— Search —————————————————————————————————————————————————
+
+    def open_point_in_time(self, index, keep_alive=None, **kwargs):
+        self._request()
+        pit = hashlib.sha1(f"{index}{next(self._seq)}".encode()).hexdigest()
+        self._pits[pit] = self._resolve(index)
+        return _Response(id=pit)
+
+    def close_point_in_time(self, id=None, body=None, **kwargs):
+        self._request()
+        self._pits.pop(id, None)
+        return _Response(succeeded=True)
+
+    def search(self, index=None, body=None, scroll=None, **kwargs):
+        self._request()
+        body = {**(body or {}), **kwargs}
+        if scroll is None:
+            return self._search(index, body)
+        # Scroll: materialise every hit now (a snapshot, like the real scroll context) and page it out
+        size = body.get("size", 10)
+        res = self._search(index, {**body, "from": 0, "size": 1 << 62, "track_total_hits": True})
+        scroll_id = hashlib.sha1(f"scroll{next(self._seq)}".encode()).hexdigest()
+        self._scrolls[scroll_id] = (res["hits"]["hits"], size, res["hits"]["total"])
+        return self._scroll_page(scroll_id)
+
+    def scroll(self, scroll_id=None, body=None, scroll=None, **kwargs):
+        self._request()
+        scroll_id = scroll_id or (body or {}).get("scroll_id")
+        if scroll_id not in self._scrolls:
+            raise KeyError(f"search_context_missing_exception: {scroll_id}")
+        return self._scroll_page(scroll_id)
+
+    def clear_scroll(self, scroll_id=None, body=None, **kwargs):
+        self._request()
+        ids = scroll_id or (body or {}).get("scroll_id") or []
+        ids = [ids] if isinstance(ids, str) else ids
+        freed = sum(self._scrolls.pop(i, None) is not None for i in ids)
+        return _Response(succeeded=True, num_freed=freed)
+
+    def _scroll_page(self, scroll_id: str) -> _Response:
+        hits, size, total = self._scrolls[scroll_id]
+        self._scrolls[scroll_id] = (hits[size:], size, total)
+        return _Response(_scroll_id=scroll_id, took=0, timed_out=False,
+                         _shards={"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+                         hits={"total": total, "hits": hits[:size]})
+
+    def msearch(self, body=None, searches=None, **kwargs):
+        self._request()
+        lines = body if body is not None else searches
+        responses = []
+        for header, query in zip(lines[::2], lines[1::2]):
+            try:
+                responses.append(self._search(header.get("index"), query))
+            except Exception as e:
+                responses.append({"error": {"type": type(e).__name__, "reason": str(e)}, "status": 400})
+        return _Response(took=0, responses=responses)
+
+    def _search(self, index, body: dict) -> _Response:
+        t0 = time.perf_counter()
+        pit = body.get("pit")
+        names = self._pits[pit["id"]] if pit else self._resolve(index or "*")
+        query, knn = body.get("query"), body.get("knn")
+        scored = {}                 # (index, id) -> [score, seq_no, source, names]
+        if query is not None or knn is None:
+            for name in names:
+                for doc_id, (seq, src) in self._indices[name].docs.items():
+                    matched = set()
+                    if (s := _evaluate(query or {"match_all": {}}, src, matched)) is not None:
+                        scored[(name, doc_id)] = [s, seq, src, matched]
+        for clause in _as_list(knn):
+            qv = np.asarray(clause["query_vector"], dtype=np.float32)
+            qv = qv / (np.linalg.norm(qv) or 1.0)
+            for name in names:
+                ids, m = self._indices[name].matrix()
+                if not ids:
+                    continue
+                sims = m @ qv
+                top = np.argsort(-sims)[:clause.get("k", 10)]
+                for j in top.tolist():
+                    seq, src = self._indices[name].docs[ids[j]]
+                    s = (1 + float(sims[j])) / 2 * clause.get("boost", 1.0)
+                    entry = scored.setdefault((name, ids[j]), [0.0, seq, src, set()])
+                    entry[0] += s
+        hits = [(name, doc_id, *v) for (name, doc_id), v in scored.items()]
+        sort = body.get("sort")
+        if sort:
+            for key in reversed(sort):
+                field, order = (next(iter(key.items())) if isinstance(key, dict) else (key, "asc"))
+                order = order.get("order", "asc") if isinstance(order, dict) else order
+                pick = {"_shard_doc": lambda h: h[3], "_seq_no": lambda h: h[3], "_score": lambda h: h[2]}.get(
+                    field, lambda h: (_values(h[4], field) or [""])[0])
+                hits.sort(key=pick, reverse=order == "desc")
+            if "search_after" in body:
+                after = body["search_after"][0]
+                hits = [h for h in hits if h[3] > after]
+        else:
+            hits.sort(key=lambda h: -h[2])
+        matching, total = hits, len(hits)
+        start = body.get("from", 0)
+        hits = hits[start:start + body.get("size", 10)]
+        out = []
+        for name, doc_id, score, seq, src, matched in hits:
+            h = {"_index": name, "_id": doc_id, "_score": score}
+            if (filtered := _filter_source(src, body.get("_source"))) is not None:
+                h["_source"] = filtered
+            if matched:
+                h["matched_queries"] = sorted(matched)
+            if sort:
+                h["sort"] = [seq]
+            if body.get("seq_no_primary_term"):
+                h["_seq_no"], h["_primary_term"] = seq, 1
+            out.append(h)
+        res = _Response(took=int((time.perf_counter() - t0) * 1000), timed_out=False,
+                        hits={"max_score": max((h["_score"] for h in out), default=None), "hits": out})
+        if body.get("track_total_hits", True) is not False:
+            res["hits"]["total"] = {"value": total, "relation": "eq"}
+        if pit:
+            res["pit_id"] = pit["id"]
+        if body.get("aggs"):
+            res["aggregations"] = _aggregate(body["aggs"], matching)
+        return res
+
+
+# ——— OpenAI —————————————————————————————————————————————————————
+
+class _FakeEmbeddings:
+    def __init__(self, client: "FakeOpenAI"):
+        self._client = client
+
+    def create(self, model, input, dimensions=None, **kwargs):
+        inputs = [input] if isinstance(input, str) else list(input)
+        self._client._request(len(inputs))
+        dims = dimensions or self._client.dims
+        data = [SimpleNamespace(index=i, embedding=self._client.embedding(text, dims), object="embedding")
+                for i, text in enumerate(inputs)]
+        tokens = sum(len(t.split()) for t in inputs)
+        return SimpleNamespace(data=data, model=model,
+                               usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+class _FakeCompletions:
+    def __init__(self, client: "FakeOpenAI"):
+        self._client = client
+
+    def create(self, model, messages, **kwargs):
+        self._client._request(1)
+        text = messages[-1]["content"]
+        # Every 'DDMMmmN DDDMMmmW' pair, named after the words just before it.
+        items = [{"name": " ".join(text[:m.start()].replace("(", " ").split()[-2:]) or f"Feature {i}",
+                  "coords": m.group(0)} for i, m in enumerate(COORD_TOKEN.finditer(text))]
+        content = "```json\n" + json.dumps(items) + "\n```"
+        prompt = sum(len(m["content"].split()) for m in messages)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=content))],
+                               model=model, usage=SimpleNamespace(prompt_tokens=prompt, completion_tokens=len(items) * 12,
+                                                                  total_tokens=prompt + len(items) * 12))
+
+
+class FakeOpenAI:
+    """
+    OpenAI client stand-in: embeddings are deterministic unit vectors derived from the
+    text (identical texts embed identically), chat completions return the coordinates
+    found in the prompt as feature JSON. Each request sleeps latency_ms plus
+    per_input_ms for every input text.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, per_input_ms: float = 0.0, dims: int = 1536):
+        self.latency_ms = latency_ms
+        self.per_input_ms = per_input_ms
+        self.dims = dims
+        self.requests = 0
+        self.embeddings = _FakeEmbeddings(self)
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+    def _request(self, n_inputs: int):
+        self.requests += 1
+        _sleep(self.latency_ms + self.per_input_ms * n_inputs)
+
+    @staticmethod
+    def embedding(text: str, dims: int) -> list[float]:
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(dims, dtype=np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def close(self):
+        pass
+
+
+# ——— Async ————————————————————————————————————————————————————
+
+class AsyncFacade:
+    """
+    Awaitable view of a fake client for the async search service: every method runs the sync
+    one in a worker thread, so injected latencies of concurrent requests overlap as they
+    would over a connection pool instead of blocking the event loop.
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if isinstance(attr, (_FakeIndices, _FakeEmbeddings, _FakeCompletions, SimpleNamespace)):
+            return AsyncFacade(attr)
+        if not callable(attr):
+            return attr
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        return call
+
+    async def close(self):
+        pass
+
+
+# ——— Wiring ————————————————————————————————————————————————————
+
+def install_fakes(es_latency_ms: float = 0.0, openai_latency_ms: float = 0.0, per_input_ms: float = 0.0,
+                  dims: int = 0) -> tuple[FakeElasticsearch, FakeOpenAI]:
+    """
+    Install fakes as the shared clients returned by config.get_es() / get_openai() (and, as
+    AsyncFacades, get_async_es() / get_async_openai()), and return them.
+    """
+    from config import EMBED_DIMS, EMBED_MODEL, set_clients
+    from search import MODEL_DIMS
+    fake_es = FakeElasticsearch(es_latency_ms)
+    fake_openai = FakeOpenAI(openai_latency_ms, per_input_ms, dims or EMBED_DIMS or MODEL_DIMS.get(EMBED_MODEL, 1536))
+    set_clients(es=fake_es, openai=fake_openai, async_es=AsyncFacade(fake_es), async_openai=AsyncFacade(fake_openai))
+    return fake_es, fake_openai
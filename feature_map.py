@@ -1,21 +1,12 @@
-import folium
-from config import ES_FEATURES_INDEX, es
+from config import ES_FEATURES_INDEX
+from export import iter_features
 
 def get_all_features(es, index_name):
-    """Fetch all features from the features index."""
-    body = {"query": {"match_all": {}}}
-    res = es.search(index=index_name, body=body, size=10000)  # adjust size as needed
-    return [
-        {
-            "feature_id": h["_source"]["feature_id"],
-            "name": h["_source"]["name"],
-            "location": h["_source"]["location"],
-            "section_id": h["_source"]["section_id"]
-        }
-        for h in res["hits"]["hits"]
-    ]
+    """Fetch all features from the features index (streamed, so not capped at 10k hits)."""
+    return list(iter_features(es, index_name))
 
 def add_features_to_map(m, features):
+    import folium
     for feat in features:
         loc = feat["location"]
         folium.Marker(
@@ -23,3 +14,38 @@ def add_features_to_map(m, features):
             popup=f"{feat['name']}\n({loc['lat']:.4f}, {loc['lon']:.4f})",
             icon=folium.Icon(color='green', icon='info-sign')
         ).add_to(m)
+
+
+def features_to_geojson(features) -> dict:
+    """FeatureCollection of Point features (GeoJSON coordinates are [lon, lat])."""
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "id": feat["feature_id"],
+                "geometry": {"type": "Point", "coordinates": [feat["location"]["lon"], feat["location"]["lat"]]},
+                "properties": {"name": feat["name"], "section_id": feat["section_id"]}
+            }
+            for feat in features
+        ]
+    }
+
+
+def view_to_geojson(items, total: int | None = None) -> dict:
+    """
+    Compact FeatureCollection for the viewport API: clusters carry only a count. With the
+    number of features in view, also reports it as `total` and whether items left some out.
+    """
+    out = []
+    for it in items:
+        point = {"type": "Point", "coordinates": [round(it["location"]["lon"], 6), round(it["location"]["lat"], 6)]}
+        if it["count"] > 1:
+            out.append({"type": "Feature", "geometry": point, "properties": {"count": it["count"]}})
+        else:
+            out.append({"type": "Feature", "id": it["feature_id"], "geometry": point,
+                        "properties": {"name": it["name"], "section_id": it["section_id"]}})
+    fc = {"type": "FeatureCollection", "features": out}
+    if total is not None:
+        fc.update(total=total, truncated=sum(it["count"] for it in items) < total)
+    return fc
@@ -0,0 +1,48 @@
+# fusion.py
+# Client-side fusion of ranked result lists (vector + lexical) for hybrid search.
+
+RRF_RANK_CONSTANT = 60
+
+
+def rrf_fuse(result_lists, weights, k: int, rank_constant: int = RRF_RANK_CONSTANT, key: str = "section_id"):
+    """
+    Weighted Reciprocal Rank Fusion: each hit scores weight / (rank_constant + rank)
+    in every list it appears in (rank starting at 1). Returns the top k merged hits
+    (first-seen fields kept) with the fused score.
+    """
+    scores, docs = {}, {}
+    for results, w in zip(result_lists, weights):
+        for rank, hit in enumerate(results, start=1):
+            scores[hit[key]] = scores.get(hit[key], 0.0) + w / (rank_constant + rank)
+            docs.setdefault(hit[key], hit)
+    top = sorted(scores, key=lambda d: -scores[d])[:k]
+    return [{**docs[d], "score": scores[d]} for d in top]
+
+
+def weighted_fuse(result_lists, weights, k: int, key: str = "section_id"):
+    """
+    Weighted score fusion: scores are min-max normalised per list, then combined as
+    sum(weight * normalised score); a hit missing from a list contributes 0 for it.
+    """
+    scores, docs = {}, {}
+    for results, w in zip(result_lists, weights):
+        if not results:
+            continue
+        raw = [h["score"] for h in results]
+        lo, hi = min(raw), max(raw)
+        for hit in results:
+            norm = (hit["score"] - lo) / (hi - lo) if hi > lo else 1.0
+            scores[hit[key]] = scores.get(hit[key], 0.0) + w * norm
+            docs.setdefault(hit[key], hit)
+    top = sorted(scores, key=lambda d: -scores[d])[:k]
+    return [{**docs[d], "score": scores[d]} for d in top]
+
+
+FUSERS = {"rrf": rrf_fuse, "weighted": weighted_fuse}
+
+
+def fuse(vector_results, lexical_results, alpha: float, k: int, method: str = "rrf"):
+    """Fuse vector and lexical hits with weights alpha and 1 - alpha (as in hybrid_search)."""
+    if method not in FUSERS:
+        raise ValueError(f"Unknown fusion method '{method}'")
+    return FUSERS[method]([vector_results, lexical_results], [alpha, 1 - alpha], k)
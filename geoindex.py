@@ -0,0 +1,235 @@
+# geoindex.py
+# In-memory spatial index over charted features: a lat/lon grid answering radius queries
+# and "features along a route corridor" queries without a round-trip per point.
+
+import math
+import re
+
+import numpy as np
+
+from records import FeatureTable
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320    # at the equator
+GRID_CELL_DEG = 0.1
+MAX_TILE_PRECISION = 29     # deepest geotile_grid level Elasticsearch supports
+
+_DISTANCE = re.compile(r"^\s*([\d.]+)\s*([a-zA-Z]*)\s*$")
+_UNITS_KM = {"km": 1.0, "kilometers": 1.0, "m": 0.001, "meters": 0.001, "cm": 1e-5, "mm": 1e-6,
+             "mi": 1.609344, "miles": 1.609344, "yd": 0.0009144, "ft": 0.0003048, "in": 0.0000254,
+             "nmi": 1.852, "NM": 1.852, "": 0.001}
+
+
+def parse_distance(distance) -> float:
+    """Elasticsearch distance ("10km", "1m", "2nmi", or a number of metres) -> kilometres."""
+    if isinstance(distance, (int, float)):
+        return distance / 1000.0
+    m = _DISTANCE.match(distance)
+    if not m:
+        raise ValueError(f"Bad distance: {distance!r}")
+    unit = m.group(2) if m.group(2) in _UNITS_KM else m.group(2).lower()
+    if unit not in _UNITS_KM:
+        raise ValueError(f"Bad distance unit in {distance!r}")
+    return float(m.group(1)) * _UNITS_KM[unit]
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance between points or arrays of points (broadcasting)."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def tile_keys(lats: np.ndarray, lons: np.ndarray, precision: int) -> np.ndarray:
+    """Web-mercator tile (x, y) at `precision` packed into one int64 per point (as geotile_grid buckets)."""
+    n = 1 << precision
+    lat = np.radians(np.clip(lats, -85.05112878, 85.05112878))
+    x = np.clip(np.floor((lons + 180.0) / 360.0 * n), 0, n - 1).astype(np.int64)
+    y = np.clip(np.floor((1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * n), 0, n - 1).astype(np.int64)
+    return x * n + y
+
+
+def in_bbox(lats: np.ndarray, lons: np.ndarray, bbox) -> np.ndarray:
+    """Mask of points inside (west, south, east, north); west > east crosses the antimeridian."""
+    west, south, east, north = bbox
+    lat_ok = (lats >= south) & (lats <= north)
+    if west <= east:
+        return lat_ok & (lons >= west) & (lons <= east)
+    return lat_ok & ((lons >= west) | (lons <= east))
+
+
+def normalize_bbox(bbox) -> tuple[float, float, float, float]:
+    """
+    Map bounds as sent by Leaflet (longitudes past +-180 after panning across the antimeridian,
+    latitudes past the poles) -> (west, south, east, north) with longitudes in [-180, 180] and
+    west > east only for a box crossing the antimeridian (as geo_bounding_box and in_bbox expect).
+
+    >>> normalize_bbox((170.0, -10.0, 190.0, 10.0))
+    (170.0, -10.0, -170.0, 10.0)
+    >>> normalize_bbox((-200.0, 0.0, -170.0, 5.0))
+    (160.0, 0.0, -170.0, 5.0)
+    >>> normalize_bbox((190.0, 0.0, 200.0, 5.0))
+    (-170.0, 0.0, -160.0, 5.0)
+    >>> normalize_bbox((-300.0, -95.0, 300.0, 95.0))
+    (-180.0, -90.0, 180.0, 90.0)
+    >>> normalize_bbox((-180.0, 0.0, 180.0, 1.0))
+    (-180.0, 0.0, 180.0, 1.0)
+    >>> normalize_bbox((170.0, 0.0, -170.0, 1.0))      # already crossing
+    (170.0, 0.0, -170.0, 1.0)
+    """
+    west, south, east, north = map(float, bbox)
+    south, north = max(-90.0, min(south, north)), min(90.0, max(south, north))
+    if east - west >= 360.0:
+        return -180.0, south, 180.0, north
+    west, east = _wrap_lon(west), _wrap_lon(east)
+    if east == -180.0:
+        east = 180.0
+    return west, south, east, north
+
+
+def _wrap_lon(dlon):
+    return (dlon + 180.0) % 360.0 - 180.0
+
+
+class FeatureGrid:
+    """
+    Grid of GRID_CELL_DEG cells over feature locations. `features` is a FeatureTable
+    or an iterable of feature docs ({feature_id, name, location:{lat,lon}}, section_id),
+    held as a FeatureTable; query results are row indices into self.features.
+    """
+
+    def __init__(self, features, cell_deg: float = GRID_CELL_DEG):
+        self.features = features if isinstance(features, FeatureTable) else FeatureTable.from_docs(features)
+        self.cell_deg = cell_deg
+        self.lats = self.features.lats
+        self.lons = self.features.lons
+        self.grid = {}
+        rows = np.floor(self.lats / cell_deg).astype(np.int64)
+        cols = np.floor(self.lons / cell_deg).astype(np.int64)
+        for i, key in enumerate(zip(rows.tolist(), cols.tolist())):
+            self.grid.setdefault(key, []).append(i)
+
+    def _candidates(self, lat_min, lat_max, lon_min, lon_max) -> np.ndarray:
+        rows = range(math.floor(lat_min / self.cell_deg), math.floor(lat_max / self.cell_deg) + 1)
+        cols = range(math.floor(lon_min / self.cell_deg), math.floor(lon_max / self.cell_deg) + 1)
+        if len(rows) * len(cols) > len(self.grid):
+            mask = (self.lats >= lat_min) & (self.lats <= lat_max) & (self.lons >= lon_min) & (self.lons <= lon_max)
+            return np.flatnonzero(mask)
+        return np.array([i for r in rows for c in cols for i in self.grid.get((r, c), ())], dtype=np.int64)
+
+    def _bbox(self, lat, lon, radius_km):
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlon = radius_km / max(KM_PER_DEG_LON * math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+    def within(self, lat: float, lon: float, radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """Indices of features within radius_km of (lat, lon), nearest first, and their distances."""
+        cand = self._candidates(*self._bbox(lat, lon, radius_km))
+        if not len(cand):
+            return cand, np.zeros(0)
+        d = haversine_km(lat, lon, self.lats[cand], self.lons[cand])
+        keep = d <= radius_km
+        order = np.argsort(d[keep], kind="stable")
+        return cand[keep][order], d[keep][order]
+
+    def along_corridor(self, waypoints, buffer_km: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Features within buffer_km of the polyline through `waypoints` (lat, lon).
+        Returns (indices, along-track km, cross-track km) ordered by along-track
+        distance. Distances to each leg use a local equirectangular projection, so
+        legs should be short (e.g. the output of refine_passage_geospatial).
+        """
+        pts = np.asarray(waypoints, dtype=np.float64).reshape(-1, 2)
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+        if len(pts) == 0 or not len(self.features):
+            return empty
+        if len(pts) == 1:
+            idx, d = self.within(pts[0, 0], pts[0, 1], buffer_km)
+            return idx, np.zeros(len(idx)), d
+        a, b = pts[:-1], pts[1:]
+        seg_km = haversine_km(a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+        start_km = np.concatenate(([0.0], np.cumsum(seg_km)[:-1]))
+
+        pair_feat, pair_seg = [], []
+        for s in range(len(a)):
+            lat0, lat1 = sorted((a[s, 0], b[s, 0]))
+            lon0, lon1 = sorted((a[s, 1], b[s, 1]))
+            lo = self._bbox(lat0, lon0, buffer_km)
+            hi = self._bbox(lat1, lon1, buffer_km)
+            cand = self._candidates(lo[0], hi[1], min(lo[2], hi[2]), max(lo[3], hi[3]))
+            if len(cand):
+                pair_feat.append(cand)
+                pair_seg.append(np.full(len(cand), s, dtype=np.int64))
+        if not pair_feat:
+            return empty
+        f = np.concatenate(pair_feat)
+        s = np.concatenate(pair_seg)
+
+        # Project leg end and feature into km around the leg start, then clamp onto the leg.
+        kx = KM_PER_DEG_LON * np.cos(np.radians((a[s, 0] + b[s, 0]) / 2))
+        bx, by = _wrap_lon(b[s, 1] - a[s, 1]) * kx, (b[s, 0] - a[s, 0]) * KM_PER_DEG_LAT
+        px, py = _wrap_lon(self.lons[f] - a[s, 1]) * kx, (self.lats[f] - a[s, 0]) * KM_PER_DEG_LAT
+        seg_sq = bx * bx + by * by
+        t = np.clip(np.divide(px * bx + py * by, seg_sq, out=np.zeros_like(seg_sq), where=seg_sq > 0), 0.0, 1.0)
+        cross = np.hypot(px - t * bx, py - t * by)
+        along = start_km[s] + t * seg_km[s]
+
+        keep = cross <= buffer_km
+        f, cross, along = f[keep], cross[keep], along[keep]
+        if not len(f):
+            return empty
+        # Nearest leg per feature, then order by position along the route.
+        order = np.lexsort((cross, f))
+        f, cross, along = f[order], cross[order], along[order]
+        _, first = np.unique(f, return_index=True)
+        f, cross, along = f[first], cross[first], along[first]
+        order = np.argsort(along, kind="stable")
+        return f[order], along[order], cross[order]
+
+
+def view_items(grid: FeatureGrid, bbox, zoom: int, max_points: int, max_zoom: int,
+               precision_offset: int) -> tuple[list[dict], int]:
+    """
+    Features inside bbox for a map at `zoom`, and how many there are: individual features
+    when there are at most max_points of them (from max_zoom, the first max_points),
+    otherwise one cluster per geotile cell {lat, lon, count} at the centroid of its
+    members. Singleton cells keep their feature.
+    """
+    idx = np.flatnonzero(in_bbox(grid.lats, grid.lons, bbox))
+    if len(idx) <= max_points or zoom >= max_zoom:
+        return [{**grid.features[i], "count": 1} for i in idx[:max_points]], len(idx)
+    lats, lons = grid.lats[idx], grid.lons[idx]
+    keys, inverse, counts = np.unique(tile_keys(lats, lons, min(zoom + precision_offset, MAX_TILE_PRECISION)),
+                                      return_inverse=True, return_counts=True)
+    c_lat = np.bincount(inverse, weights=lats) / counts
+    c_lon = np.bincount(inverse, weights=lons) / counts
+    first = np.empty(len(keys), dtype=np.int64)
+    first[inverse] = idx        # only read for single-member cells
+    return [{**grid.features[first[k]], "count": 1} if counts[k] == 1
+            else {"location": {"lat": float(c_lat[k]), "lon": float(c_lon[k])}, "count": int(counts[k])}
+            for k in range(len(keys))], len(idx)
+
+
+def features_along_corridor(grid: FeatureGrid, waypoints, buffer="2km") -> dict:
+    """
+    Charted features and their sections along a route. Features with the same name
+    and position (the same object cited by several sections) are reported once with
+    every section_id. Both lists are ordered by along-track distance.
+    """
+    idx, along, cross = grid.along_corridor(waypoints, parse_distance(buffer))
+    features, by_key, sections = [], {}, {}
+    table = grid.features
+    for i, a_km, c_km in zip(idx.tolist(), along.tolist(), cross.tolist()):
+        sid = table.section_id(i)
+        key = (table.names[i].strip().lower(), round(float(table.lats[i]), 5), round(float(table.lons[i]), 5))
+        if key in by_key:
+            if sid not in by_key[key]["section_ids"]:
+                by_key[key]["section_ids"].append(sid)
+        else:
+            by_key[key] = {**table[i], "section_ids": [sid],
+                           "along_track_km": round(a_km, 3), "cross_track_km": round(c_km, 3)}
+            features.append(by_key[key])
+        sec = sections.setdefault(sid, {"section_id": sid, "along_track_km": round(a_km, 3), "feature_count": 0})
+        sec["feature_count"] += 1
+    return {"features": features, "sections": list(sections.values())}
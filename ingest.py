@@ -2,42 +2,47 @@
 # Self-contained script to parse nautical sections, extract geo-features via LLM, embed content, and index into two Elasticsearch indices with search utilities.
 
 import re
-from dotenv import load_dotenv
-from elasticsearch import Elasticsearch
-from openai import OpenAI
+from typing import Iterable, Iterator
+from records import Section
 
 
 # ——— Helpers ————————————————————————————————————————————————
 
-def parse_and_chunk(text: str) -> list[dict]:
-    """Split Markdown into numbered sections, capturing headings as metadata."""
-    sections = []
+# One dispatch pattern for every structural line; only lines starting with '#' or a digit can match.
+_LINE = re.compile(
+    r'^(?:#\s+CHAPTER\s+\d+\s*-\s*(?P<chapter>.+)'
+    r'|##\s+(?P<section>.+)'
+    r'|###\s+(?P<subsection>.+)'
+    r'|(?P<id>\d+\.\d+)\s+(?P<title>.+))$'
+)
+_STRUCTURAL_START = frozenset("#0123456789")
+
+
+def iter_sections(lines: Iterable[str]) -> Iterator[Section]:
+    """
+    Streaming parse_and_chunk: consume lines (e.g. an open file object) and yield
+    each numbered section as soon as the next one starts, so memory stays bounded
+    by the largest section and downstream stages can start before parsing ends.
+    """
     parents = {"chapter": None, "section": None, "subsection": None}
     buf, cur_id, cur_title = [], None, None
-    for line in text.splitlines():
-        if m := re.match(r'^#\s+CHAPTER\s+\d+\s*-\s*(.+)$', line):
-            parents["chapter"] = m.group(1); continue
-        if m := re.match(r'^##\s+(.+)$', line):
-            parents["section"] = m.group(1); continue
-        if m := re.match(r'^###\s+(.+)$', line):
-            parents["subsection"] = m.group(1); continue
-        if m := re.match(r'^(\d+\.\d+)\s+(.+)$', line):
+    match = _LINE.match
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line and line[0] in _STRUCTURAL_START and (m := match(line)):
+            kind = m.lastgroup
+            if kind != "title":
+                parents[kind] = m.group(kind); continue
             if buf and cur_id:
-                sections.append({"id":cur_id, "title":cur_title,
-                                 "parents":{k:v for k,v in parents.items() if v},
-                                 "content":"\n".join(buf).strip()})
+                yield Section(cur_id, cur_title, "\n".join(buf).strip(), **parents)
                 buf = []
-            cur_id, cur_title = m.group(1), m.group(2)
+            cur_id, cur_title = m.group("id"), m.group("title")
             continue
         if cur_id and line.strip(): buf.append(line)
     if buf and cur_id:
-        sections.append({"id":cur_id, "title":cur_title,
-                         "parents":{k:v for k,v in parents.items() if v},
-                         "content":"\n".join(buf).strip()})
-    return sections
-
-
-
-
+        yield Section(cur_id, cur_title, "\n".join(buf).strip(), **parents)
 
 
+def parse_and_chunk(text: str) -> list[Section]:
+    """Split Markdown into numbered sections, capturing headings as metadata."""
+    return list(iter_sections(text.splitlines()))
@@ -1,10 +1,51 @@
 import json
 import re
-from config import openai_client
-
-def llm_extract_features(text: str) -> list[dict]:
+import time
+from config import get_openai, INGEST_MAX_RETRIES
+from cache import content_key, get_cache
+from metrics import metrics, record_openai_usage
+from coords import parse_ddm
+from records import Feature
+
+FEATURE_MODEL = "gpt-4o-mini"
+# Bump whenever the extraction prompt or post-processing changes, to invalidate cached results.
+FEATURE_PROMPT_VERSION = "1"
+
+def with_retry(call, retries: int = INGEST_MAX_RETRIES, base_delay: float = 1.0):
+    """
+    Run an OpenAI call, backing off exponentially while it is rate limited (HTTP 429).
+    Re-raises the RateLimitError once retries are exhausted.
     """
-    Use LLM to extract features with DMS coords, returning [{name, location:{lat,lon}}].
+    from openai import RateLimitError     # deferred: the openai package is slow to import
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except RateLimitError:
+            if attempt == retries:
+                raise
+            delay = base_delay * 2 ** attempt
+            metrics.inc("retries", service="openai")
+            print(f"[Warning] Rate limited, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+async def with_retry_async(call, retries: int = INGEST_MAX_RETRIES, base_delay: float = 1.0):
+    """with_retry for async OpenAI calls: awaits call() and backs off with asyncio.sleep."""
+    import asyncio
+    from openai import RateLimitError
+    for attempt in range(retries + 1):
+        try:
+            return await call()
+        except RateLimitError:
+            if attempt == retries:
+                raise
+            delay = base_delay * 2 ** attempt
+            metrics.inc("retries", service="openai")
+            print(f"[Warning] Rate limited, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+def llm_extract_features(text: str) -> list[Feature]:
+    """
+    Use LLM to extract features with DMS coords, returning Feature records.
     Graceful fallback if parse errors.
     """
     system_msg = (
@@ -31,14 +72,25 @@ def llm_extract_features(text: str) -> list[dict]:
         "between Dye r Point (2.21) and Youngs Point (442397N 675759W) -> 'Dye r Point' , 'Youngs Point' are the feature names."
         " Do not use 'and' in feature names. Do not include features that do not have valid coordinates."
     )
+    cache = get_cache()
+    key = content_key("features", FEATURE_MODEL, FEATURE_PROMPT_VERSION, text)
+    if cache is not None and (cached := cache.get_json(key)) is not None:
+        return [Feature.from_dict(d) for d in cached]
     usr_msg = f"Extract features from text:\n{text}"
     try:
-        resp = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role":"system","content":system_msg},
-                      {"role":"user","content":usr_msg}],
-            temperature=0
-        )
+        metrics.inc("api_calls", service="openai", op="chat")
+        # Timed with observe() rather than timer(): failures are counted once, below
+        t0 = time.perf_counter()
+        try:
+            resp = with_retry(lambda: get_openai().chat.completions.create(
+                model=FEATURE_MODEL,
+                messages=[{"role":"system","content":system_msg},
+                          {"role":"user","content":usr_msg}],
+                temperature=0
+            ))
+        finally:
+            metrics.observe("llm_extract", time.perf_counter() - t0)
+        record_openai_usage(FEATURE_MODEL, getattr(resp, "usage", None))
         content = resp.choices[0].message.content
         content = re.sub(r'```(?:json)?\s*', '', content)
         content = re.sub(r'\s*```$', '', content)
@@ -46,127 +98,32 @@ def llm_extract_features(text: str) -> list[dict]:
         if end!=-1: content = content[:end+1]
         items = json.loads(content)
     except json.JSONDecodeError as e:
+        metrics.inc("errors", stage="llm_parse")
         print(f"[Warning] JSON parse error: {e}")
         return []
     except Exception as e:
+        metrics.inc("errors", stage="llm_extract")
         print(f"[Warning] LLM extraction failed: {e}")
         return []
     feats = []
     for it in items:
         name = it.get("name"); coords=it.get("coords")
         if not name or not coords or coords == '': continue
-        try:
-            lat, lon = parse_ddm_coordinates(coords)
-            feats.append({"name":name, "location":{"lat":lat,"lon":lon}})
-        except Exception as e:
-            print(f"[Warning] Bad DMS coords '{coords}' in feature '{name}', skipping {e}")
-            continue
+        latlon = parse_ddm_coordinates(coords, name)
+        if latlon is None: continue
+        feats.append(Feature(name, latlon[0], latlon[1]))
+    if cache is not None:
+        cache.put_json(key, [f.to_dict() for f in feats])
     return feats
 
 
 def parse_ddm_coordinates(coord_string: str, feature_name: str = "N/A") -> tuple[float, float] | None:
     """
-    Parses a DDM (Degrees and Decimal Minutes) coordinate string, validates it,
-    and converts it to decimal degrees.
-
-    The expected format is 'DDMMmmH DDDMMmmH', where:
-    - DD/DDD: Degrees (2 digits for Lat, 2 or 3 for Lon)
-    - MM: Minutes
-    - mm: Decimal part of minutes (hundredths)
-    - H: Hemisphere ('N', 'S', 'E', 'W')
-
-    Example: '441782N 681870W' -> (44.297, -68.311666...)
-
-    Args:
-        coord_string: The DDM coordinate string.
-        feature_name: An optional name of the feature for more descriptive error messages.
-
-    Returns:
-        A tuple containing (latitude, longitude) as floats if parsing is successful.
-        Returns None if the input is invalid or out of range.
-    """
-    if not isinstance(coord_string, str):
-        print(f"[Warning] Invalid input for feature '{feature_name}': Input must be a string.")
-        return None
-
-    parts = coord_string.strip().upper().split()
-    if len(parts) != 2:
-        print(f"[Warning] Bad DDM coords '{coord_string}' in feature '{feature_name}', skipping. Expected 2 parts, got {len(parts)}.")
-        return None
-
-    lat_str, lon_str = parts
-
-    try:
-        # --- Latitude Parsing ---
-        # Pattern: (DD)(MMmm)(H) -> e.g., (44)(1782)(N)
-        lat_match = re.match(r'^(\d{2})(\d{4})([NS])$', lat_str)
-        if not lat_match:
-            raise ValueError(f"Latitude part '{lat_str}' does not match expected DDM format.")
-
-        lat_deg = int(lat_match.group(1))
-        lat_min_decimal = float(f"{lat_match.group(2)[:2]}.{lat_match.group(2)[2:]}")
-        lat_hemisphere = lat_match.group(3)
-
-        latitude = lat_deg + (lat_min_decimal / 60.0)
-        if lat_hemisphere == 'S':
-            latitude *= -1
-
-        # --- Longitude Parsing ---
-        # Pattern: (DDD)(MMmm)(H) -> e.g., (068)(1870)(W) or (68)(1870)(W)
-        # We'll pad the string to handle both 2 and 3 digit degrees gracefully
-        lon_padded_str = lon_str.zfill(8) # e.g. 681870W -> 0681870W
-        lon_match = re.match(r'^(\d{3})(\d{4})([EW])$', lon_padded_str)
-
-        if not lon_match:
-             raise ValueError(f"Longitude part '{lon_str}' does not match expected DDM format.")
-
-        lon_deg = int(lon_match.group(1))
-        lon_min_decimal = float(f"{lon_match.group(2)[:2]}.{lon_match.group(2)[2:]}")
-        lon_hemisphere = lon_match.group(3)
-
-        longitude = lon_deg + (lon_min_decimal / 60.0)
-        if lon_hemisphere == 'W':
-            longitude *= -1
-
-        # --- Validation ---
-        if not -90 <= latitude <= 90:
-            print(f"[Warning] Bad DDM coords '{coord_string}' in feature '{feature_name}', skipping. Latitude out of range: {latitude:.8f}.")
-            return None
-
-        if not -180 <= longitude <= 180:
-            print(f"[Warning] Bad DDM coords '{coord_string}' in feature '{feature_name}', skipping. Longitude out of range: {longitude:.8f}.")
-            return None
-
-        return (latitude, longitude)
-
-    except (ValueError, TypeError) as e:
-        print(f"[Warning] Bad DDM coords '{coord_string}' in feature '{feature_name}', skipping. Error: {e}.")
-        return None
-    
-def parse_dms_pair(s: str) -> tuple[float,float]:
-    """
-    Convert UKHO DDM ('DDMM.mmN DDDMM.mmW') or DMS ('DDMMSSN DDDMMSSW') to (lat, lon).
-    Auto-detects format by length of minute field.
+    'DDMMmmH DDDMMmmH' -> (lat, lon), warning and returning None when the string is
+    invalid or out of range. Bulk and hot-path callers should use coords.parse_ddm.
     """
-    s = s.strip()
-    # Always treat compact UKHO format as DDM: DDMM.mmN DDDMM.mmW or DDMM.mmN DDMM.mmW
-    # Try DDM with or without decimal point: DDMM.mmN DDDMM.mmW or DDMMmmN DDDMMmmW
-    # UKHO DDM: always 2 digits for lat deg, 2 for lon deg, 2+ for minutes (with or without decimal)
-    m = re.match(r"^(\d{2})(\d{2,}(?:\.\d*)?)([NS])\s*(\d{2})(\d{2,}(?:\.\d*)?)([EW])$", s)
-    if m:
-        d0, m0, dir0, l0, m1, dir1 = m.groups()
-        # If no decimal, treat as hundredths of a minute (e.g., 2205 = 22.05')
-        if '.' not in m0 and len(m0) > 2:
-            m0 = str(int(m0[:2])) + '.' + m0[2:]
-        if '.' not in m1 and len(m1) > 2:
-            m1 = str(int(m1[:2])) + '.' + m1[2:]
-        lat = (int(d0) + float(m0)/60) * (1 if dir0 == 'N' else -1)
-        lon = (int(l0) + float(m1)/60) * (1 if dir1 == 'E' else -1)
-        # Validate latitude and longitude ranges
-        if not (-90 <= lat <= 90):
-            raise ValueError(f"Latitude out of range: {lat} from '{s}'")
-        if not (-180 <= lon <= 180):
-            raise ValueError(f"Longitude out of range: {lon} from '{s}'")
-        return lat, lon
-    raise ValueError(f"Bad coordinate format: {s}")
+    latlon = parse_ddm(coord_string)
+    if latlon is None:
+        print(f"[Warning] Bad DDM coords '{coord_string}' in feature '{feature_name}', skipping.")
+    return latlon
 
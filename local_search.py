@@ -0,0 +1,275 @@
+# local_search.py
+# In-process search engine for offline use: a VectorStore (float32/float16/int8 NumPy matrix,
+# memory-mapped on load) for content_vector cosine search,
+# a positional inverted index for match_phrase-style lexical search, and a lat/lon grid for
+# geo_distance queries. Documents are persisted under one directory and indexes rebuilt on load.
+
+import json
+import math
+import os
+import re
+import threading
+
+import numpy as np
+
+from backend import SearchBackend
+from geoindex import FeatureGrid, parse_distance
+from config import (RE_INDEX_INCREMENTAL, INGEST_BATCH_SIZE, INGEST_WORKERS, HYBRID_FUSION, HYBRID_WINDOW,
+                    LOCAL_VECTOR_DTYPE)
+from fusion import fuse
+from coords import parse_dms_pair
+from vectors import DTYPES, VectorStore, quantize
+
+POSITION_GAP = 100      # like ES position_increment_gap: phrases never span array values
+DEFAULT_SIZE = 10       # ES returns 10 hits when no size is given
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class PhraseIndex:
+    """Positional inverted index with phrase matching and BM25 scoring of the phrase terms."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.postings = {}      # token -> {doc: [positions]}
+        self.lengths = {}       # doc -> token count
+
+    def add(self, doc, texts: list[str]):
+        pos, n = 0, 0
+        for text in texts:
+            toks = tokenize(text)
+            for i, tok in enumerate(toks):
+                self.postings.setdefault(tok, {}).setdefault(doc, []).append(pos + i)
+            pos += len(toks) + POSITION_GAP
+            n += len(toks)
+        self.lengths[doc] = n
+
+    def match(self, phrase: str) -> dict:
+        """doc -> BM25 score for every doc containing the phrase."""
+        toks = tokenize(phrase)
+        if not toks or any(t not in self.postings for t in toks):
+            return {}
+        docs = set(self.postings[toks[0]])
+        for t in toks[1:]:
+            docs &= self.postings[t].keys()
+        n_docs = len(self.lengths)
+        avgdl = sum(self.lengths.values()) / max(n_docs, 1)
+        out = {}
+        for doc in docs:
+            rest = [set(self.postings[t][doc]) for t in toks[1:]]
+            if not any(all(p + i + 1 in s for i, s in enumerate(rest)) for p in self.postings[toks[0]][doc]):
+                continue
+            score = 0.0
+            for t in toks:
+                df = len(self.postings[t])
+                tf = len(self.postings[t][doc])
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * self.lengths[doc] / avgdl))
+            out[doc] = score
+        return out
+
+
+class LocalSearchBackend(SearchBackend):
+    """
+    SearchBackend held entirely in memory and persisted to `path`
+    (sections.json, vectors.npy, features.json). Indexes are rebuilt lazily
+    after writes, so bulk loads pay for them once.
+    """
+
+    def __init__(self, path: str, vector_dtype: str = LOCAL_VECTOR_DTYPE):
+        self.path = path
+        self.vector_dtype = vector_dtype
+        self.sections = {}      # section_id -> section doc without content_vector
+        self.vectors = {}       # section_id -> unit vector (vector_dtype), or a row of the mapped store
+        self.features = {}      # feature_id -> feature doc
+        self._section_features = {}   # section_id -> [feature_id]
+        self._dirty = True
+        self._store = None            # VectorStore over self._ids, rebuilt only when vectors change
+        self._generation = 0          # bumped on every write, see features_version
+        self._build_lock = threading.Lock()
+        if os.path.exists(os.path.join(path, "sections.json")):
+            self.load()
+
+    # ——— Persistence ——————————————————————————————————————————————
+
+    def load(self):
+        with open(os.path.join(self.path, "sections.json"), encoding="utf-8") as f:
+            docs = json.load(f)
+        store = VectorStore.load(os.path.join(self.path, "vectors.npy"))
+        if store.dtype != self.vector_dtype:
+            store = VectorStore(quantize(np.asarray(store.matrix, dtype=np.float32), self.vector_dtype))
+        with open(os.path.join(self.path, "features.json"), encoding="utf-8") as f:
+            feats = json.load(f)
+        self.sections = {d["section_id"]: d for d in docs}
+        self.vectors = {d["section_id"]: store.matrix[i] for i, d in enumerate(docs)}
+        self.features = {f["feature_id"]: f for f in feats}
+        self._section_features = {}
+        for f in feats:
+            self._section_features.setdefault(f["section_id"], []).append(f["feature_id"])
+        self._ids = [d["section_id"] for d in docs]
+        self._store = store
+        self._dirty = True
+        self._generation += 1
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        ids = list(self.sections)
+        with open(os.path.join(self.path, "sections.json"), "w", encoding="utf-8") as f:
+            json.dump([self.sections[i] for i in ids], f)
+        self._vector_store(ids).save(os.path.join(self.path, "vectors.npy"))
+        with open(os.path.join(self.path, "features.json"), "w", encoding="utf-8") as f:
+            json.dump(list(self.features.values()), f)
+
+    # ——— Writes ———————————————————————————————————————————————————
+
+    def ensure_index(self):
+        os.makedirs(self.path, exist_ok=True)
+
+    def upsert(self, sec, vec, feats):
+        from search import section_doc, feature_docs
+        self.delete(sec["id"])
+        doc = section_doc(sec, None, feats)
+        del doc["content_vector"]
+        self.sections[sec["id"]] = doc
+        self.vectors[sec["id"]] = quantize(vec, self.vector_dtype)
+        self._store = None
+        for fid, fdoc in feature_docs(sec, feats):
+            self.features[fid] = fdoc
+            self._section_features.setdefault(sec["id"], []).append(fid)
+        self._dirty = True
+        self._generation += 1
+
+    def delete(self, section_id):
+        if self.sections.pop(section_id, None) is not None:
+            self.vectors.pop(section_id, None)
+            self._store = None
+            for fid in self._section_features.pop(section_id, ()):
+                self.features.pop(fid, None)
+            self._dirty = True
+            self._generation += 1
+
+    def clear(self):
+        """Drop every section and feature (persisted on the next save)."""
+        self.sections, self.vectors, self.features, self._section_features = {}, {}, {}, {}
+        self._store = None
+        self._dirty = True
+        self._generation += 1
+
+    def index_sections(self, sections, incremental=RE_INDEX_INCREMENTAL,
+                       batch_size=INGEST_BATCH_SIZE, workers=INGEST_WORKERS):
+        from search import enrich_sections, section_fingerprint
+        sections = list(sections)
+        todo = sections
+        if incremental:
+            current = {sec["id"] for sec in sections}
+            for sid in [sid for sid in self.sections if sid not in current]:
+                self.delete(sid)
+            todo = [sec for sec in sections
+                    if self.sections.get(sec["id"], {}).get("content_hash") != section_fingerprint(sec)]
+        else:
+            self.clear()        # a full load replaces the index, like the ES rebuild
+        done = 0
+        for batch in enrich_sections(todo, batch_size, workers):
+            for sec, vec, feats in batch:
+                self.upsert(sec, vec, feats)
+            done += len(batch)
+            print(f"Upserted {done}/{len(todo)} sections into local index")
+        self.save()
+        return done
+
+    # ——— Index building ———————————————————————————————————————————
+
+    def _build(self):
+        # Concurrent requests after a write build once; the others wait, then see it clean.
+        # The indexes are swapped in together, and a write during the build leaves it dirty.
+        if not self._dirty:
+            return
+        with self._build_lock:
+            if not self._dirty:
+                return
+            generation = self._generation
+            ids = list(self.sections)
+            store = self._vector_store(ids)
+            content, names = PhraseIndex(), PhraseIndex()
+            for sid, doc in self.sections.items():
+                content.add(sid, [doc["content"]])
+                names.add(sid, [f["name"] for f in doc["features"]])
+            grid = FeatureGrid(self.features.values())
+            self._ids, self._store, self._content, self._names, self._grid = ids, store, content, names, grid
+            self._dirty = self._generation != generation
+
+    def _vector_store(self, ids) -> VectorStore:
+        """Store over ids; the current one (e.g. the memory-mapped file) if vectors haven't changed."""
+        if self._store is not None and getattr(self, "_ids", None) == ids:
+            return self._store
+        dims = len(next(iter(self.vectors.values()))) if self.vectors else 0
+        return VectorStore(np.stack([self.vectors[i] for i in ids]) if ids
+                           else np.zeros((0, dims), dtype=DTYPES[self.vector_dtype]))
+
+    def _features_within(self, lat, lon, distance) -> list[dict]:
+        """Features within distance of (lat, lon), nearest first."""
+        self._build()
+        idx, _ = self._grid.within(lat, lon, parse_distance(distance))
+        return [self._grid.features[i] for i in idx]
+
+    def _vector_scores(self, query) -> np.ndarray:
+        from search import embed_query
+        self._build()
+        if not self._ids:
+            return np.zeros(0, dtype=np.float32)       # empty index: nothing to score (or embed)
+        return (1.0 + self._store.scores(embed_query(query))) / 2.0      # same scale as the ES cosine kNN score
+
+    # ——— Searches —————————————————————————————————————————————————
+
+    def semantic_search(self, query, k=5):
+        scores = self._vector_scores(query)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [{"section_id": self._ids[i], "title": self.sections[self._ids[i]]["title"],
+                 "score": float(scores[i])} for i in top]
+
+    def geo_search(self, lat, lon, distance="10km"):
+        seen = dict.fromkeys(f["section_id"] for f in self._features_within(lat, lon, distance))
+        return [{"section_id": sid, "features": self.sections[sid]["features"], "score": 1.0}
+                for sid in list(seen)[:DEFAULT_SIZE]]
+
+    def geo_search_dms(self, coord_input, distance="10km"):
+        if isinstance(coord_input, str): lat, lon = parse_dms_pair(coord_input)
+        else: lat, lon = coord_input
+        return [{**f, "score": 1.0} for f in self._features_within(lat, lon, distance)[:DEFAULT_SIZE]]
+
+    def lexical_search(self, term, size=DEFAULT_SIZE):
+        self._build()
+        content, names = self._content.match(term), self._names.match(term)
+        scores = {sid: content.get(sid, 0.0) + names.get(sid, 0.0) for sid in content.keys() | names.keys()}
+        top = sorted(scores, key=lambda sid: -scores[sid])[:size]
+        return [{"section_id": sid, "title": self.sections[sid]["title"],
+                 "matched_in": [f for f, m in (("content", content), ("features", names)) if sid in m],
+                 "score": scores[sid]} for sid in top]
+
+    def hybrid_search(self, query, alpha=0.5, k=5, fusion=HYBRID_FUSION, window=HYBRID_WINDOW):
+        if fusion:
+            window = max(window, k)
+            return fuse(self.semantic_search(query, k=window), self.lexical_search(query, size=window),
+                        alpha, k, fusion)
+        vec = self._vector_scores(query)
+        content, names = self._content.match(query), self._names.match(query)
+        scores = alpha * vec
+        for i, sid in enumerate(self._ids):
+            scores[i] += (1 - alpha) * (content.get(sid, 0.0) + names.get(sid, 0.0))
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [{"section_id": self._ids[i], "title": self.sections[self._ids[i]]["title"],
+                 "score": float(scores[i])} for i in top]
+
+    def iter_features(self):
+        return (dict(f) for f in list(self.features.values()))
+
+    def features_version(self):
+        return self._generation
+
+    def feature_grid(self, refresh=False):
+        self._build()
+        return self._grid
@@ -14,42 +14,59 @@ def get_passage_plan_bucks_to_somes():
         (44.3333, -68.3117)   # Somes Sound
     ]
 
-import os
-from dotenv import load_dotenv
-from elasticsearch import Elasticsearch
-from openai import OpenAI
-import folium
-from ingest import parse_and_chunk
+import json
+import time
 from passage import refine_passage_geospatial
-from search import ensure_features_index, ensure_index, index_sections, semantic_search, geo_search_dms, lexical_search, hybrid_search
+from metrics import metrics
 
 
-from config import ES_INDEX_NAME, ES_FEATURES_INDEX, RE_INDEX, es
+from config import ES_INDEX_NAME, ES_FEATURES_INDEX, RE_INDEX, RE_INDEX_INCREMENTAL, INGEST_BATCH_SIZE, INGEST_WORKERS, SEARCH_BACKEND, INGEST_SUMMARY_PATH, ROUTE_SIMPLIFY_PIXELS
+
+
+def write_ingest_summary(result, path=INGEST_SUMMARY_PATH):
+    """Print the ingest run's metrics (stage latencies, API calls, tokens, cache hits, errors) and save them as JSON."""
+    summary = {"result": result, **metrics.summary()}
+    text = json.dumps(summary, indent=2, default=str)
+    print(text)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Ingest summary written to '{path}'")
+    return summary
 
 
 
 # ——— Main —————————————————————————————————————————————
 if __name__=="__main__":
-    
+    # Imported here so app.py (which only needs the passage plan) doesn't load folium and the ingest stack
+    import folium
+    import numpy as np
+    from passage import simplify_passage_array
+    from ingest import iter_sections
+    from backend import get_backend
+    from extract import extraction_stats
+    backend=get_backend()
+
     if RE_INDEX:
         with open("e-NP68_17_2021-chapter2.md",encoding="utf-8") as f: 
-            raw=f.read()
-            secs=parse_and_chunk(raw)
-            ensure_index(es,ES_INDEX_NAME)
-            ensure_features_index(es,ES_FEATURES_INDEX)
-            index_sections(es,secs,ES_INDEX_NAME,ES_FEATURES_INDEX)
-            print(f"Indexed {len(secs)} sections with features into {ES_INDEX_NAME} and {ES_FEATURES_INDEX}")
+            # Parsing happens wherever the backend consumes secs (up front for incremental runs)
+            secs=metrics.timed_iter("parse",iter_sections(f))
+            backend.ensure_index()
+            result=backend.index_sections(secs,incremental=RE_INDEX_INCREMENTAL,batch_size=INGEST_BATCH_SIZE,workers=INGEST_WORKERS)
+            print(f"Indexed sections with features into {ES_INDEX_NAME} and {ES_FEATURES_INDEX} ({SEARCH_BACKEND}): {result}")
+            print(extraction_stats.summary())
+            write_ingest_summary(result)
     else:
-        print(f"Skipping re-indexing, using existing indices {ES_INDEX_NAME} and {ES_FEATURES_INDEX}")
+        print(f"Skipping re-indexing, using existing indices {ES_INDEX_NAME} and {ES_FEATURES_INDEX} ({SEARCH_BACKEND})")
 
     print("\n-- Semantic Search --")
-    for r in semantic_search(es,ES_INDEX_NAME,"Bar Island",k=3): print(r)
+    for r in backend.semantic_search("Bar Island",k=3): print(r)
     print("\n-- Geo Search (DMS) --")
-    for r in geo_search_dms(es,"442390N 681240W","1m"): print(r)
+    for r in backend.geo_search_dms("442390N 681240W","1m"): print(r)
     print("\n-- Lexical Search --")
-    for r in lexical_search(es,ES_INDEX_NAME,"Bar Island"): print(r)
+    for r in backend.lexical_search("Bar Island"): print(r)
     print("\n-- Hybrid Search --")
-    for r in hybrid_search(es,ES_INDEX_NAME,"Bar Island",alpha=0.7,k=5): print(r)
+    for r in backend.hybrid_search("Bar Island",alpha=0.7,k=5): print(r)
 
 
     # A ship passage from Bucks Harbour to Somes Sound (with safe waypoints)
@@ -64,6 +81,7 @@ if __name__=="__main__":
 
     # --- Create Map with Folium ---
     print("Creating map...")
+    map_started = time.perf_counter()
     # Center the map on the average of the waypoints.
     avg_lat = sum(p[0] for p in ship_passage_latlon) / len(ship_passage_latlon)
     avg_lon = sum(p[1] for p in ship_passage_latlon) / len(ship_passage_latlon)
@@ -77,41 +95,29 @@ if __name__=="__main__":
             icon=folium.Icon(color='blue', icon='flag')
         ).add_to(m)
 
-    # Add refined path to the map as a red polyline
+    # Add refined path to the map as a single red polyline, simplified for the initial zoom
+    # (no marker per interpolated point: thousands of them on long passages)
+    passage_line = simplify_passage_array(np.asarray(fine_grained_passage_geo), 9, ROUTE_SIMPLIFY_PIXELS)
     folium.PolyLine(
-        locations=fine_grained_passage_geo,
+        locations=passage_line.tolist(),
         color='red',
         weight=3,
         opacity=0.8,
         tooltip="Refined Passage"
     ).add_to(m)
 
-
-    # Add small markers for the newly interpolated points
-    for point in fine_grained_passage_geo:
-        if point not in ship_passage_latlon:
-            folium.CircleMarker(
-                location=point,
-                radius=3,
-                color='red',
-                fill=True,
-                fill_color='darkred',
-                fill_opacity=0.7,
-                popup=f"Interpolated Point\n({point[0]:.4f}, {point[1]:.4f})"
-            ).add_to(m)
-
-    # --- Add features from Elasticsearch ---
-    from feature_map import get_all_features, add_features_to_map
-    print("Loading features from Elasticsearch and adding to map...")
-    features = get_all_features(es, ES_FEATURES_INDEX)
-    add_features_to_map(m, features)
+    # --- Add features from the search backend ---
+    from feature_map import add_features_to_map
+    print("Loading features from the search backend and adding to map...")
+    add_features_to_map(m, backend.iter_features())
 
     # Save the map to an HTML file
     output_filename = "ship_passage_map.html"
     m.save(output_filename)
+    metrics.observe("map_render", time.perf_counter() - map_started, view="passage_map")
 
     print("-" * 30)
     print(f"Map has been generated and saved to '{output_filename}'")
     print(f"Original waypoints: {len(ship_passage_latlon)}")
-    print(f"Refined waypoints: {len(fine_grained_passage_geo)}")
+    print(f"Refined waypoints: {len(fine_grained_passage_geo)} ({len(passage_line)} drawn at zoom 9)")
     print("-" * 30)
\ No newline at end of file
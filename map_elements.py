@@ -0,0 +1,77 @@
+# map_elements.py
+# Leaflet behaviour injected into the folium map on the index page. Kept out of app.py so
+# workers that never render the page don't import folium.
+
+from folium import MacroElement
+from jinja2 import Template
+
+
+# Inject JS for ALT+click event in the map iframe
+class AltClickJS(MacroElement):
+    _template = Template(r"""
+{% macro script(this, kwargs) %}
+if (typeof window.L !== 'undefined' && {{this._parent.get_name()}}) {
+    {{this._parent.get_name()}}.on('click', function(e) {
+        if (e.originalEvent && e.originalEvent.altKey) {
+            window.parent.postMessage({lat: e.latlng.lat, lng: e.latlng.lng, alt: true}, '*');
+        }
+    });
+}
+{% endmacro %}
+""")
+
+
+# Load features for the visible area (clustered server-side) whenever the map stops moving.
+class ViewportFeaturesJS(MacroElement):
+    _template = Template(r"""
+{% macro script(this, kwargs) %}
+(function(map) {
+    var layer = L.geoJSON(null, {
+        pointToLayer: function(f, latlng) {
+            var n = f.properties.count;
+            if (n) {
+                return L.circleMarker(latlng, {radius: Math.min(8 + 3 * Math.log2(n), 28), color: '#1b7a3a',
+                                               fillColor: '#2ca25f', fillOpacity: 0.6, weight: 1})
+                        .bindTooltip(String(n), {permanent: true, direction: 'center', className: 'cluster-label'})
+                        .on('click', function() { map.setView(latlng, map.getZoom() + 2); });
+            }
+            // Feature names come from extracted source text: add them as text nodes, never as HTML
+            var popup = document.createElement('div');
+            popup.appendChild(document.createTextNode(String(f.properties.name)));
+            popup.appendChild(document.createElement('br'));
+            popup.appendChild(document.createTextNode('(' + latlng.lat.toFixed(4) + ', ' + latlng.lng.toFixed(4) + ')'));
+            return L.circleMarker(latlng, {radius: 5, color: '#1b7a3a', fillColor: '#31a354', fillOpacity: 0.9})
+                    .bindPopup(popup);
+        }
+    }).addTo(map);
+    // Past the clustering zooms the API returns at most a fixed number of features per view
+    var notice = L.control({position: 'bottomleft'});
+    notice.onAdd = function() {
+        var div = L.DomUtil.create('div', 'viewport-notice');
+        div.style.cssText = 'background: rgba(255,255,255,0.85); padding: 2px 6px; font: 12px sans-serif; display: none';
+        return div;
+    };
+    notice.addTo(map);
+    var pending = null;
+    function load() {
+        var b = map.getBounds();
+        var url = '{{ this.url }}?bbox=' + [b.getWest(), b.getSouth(), b.getEast(), b.getNorth()].map(function(v) { return v.toFixed(5); }).join(',') + '&zoom=' + map.getZoom();
+        if (pending) pending.abort();
+        pending = new AbortController();
+        fetch(url, {signal: pending.signal}).then(function(r) { return r.json(); }).then(function(data) {
+            layer.clearLayers();
+            layer.addData(data);
+            var div = notice.getContainer();
+            div.textContent = data.truncated ? 'Showing ' + data.features.length + ' of ' + data.total + ' features; zoom in to see the rest' : '';
+            div.style.display = data.truncated ? '' : 'none';
+        }).catch(function() {});
+    }
+    map.on('moveend', load);
+    load();
+})({{this._parent.get_name()}});
+{% endmacro %}
+""")
+
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
@@ -0,0 +1,231 @@
+# metrics.py
+# In-process instrumentation: per-stage latency histograms (parse, embed, llm_extract, es_write,
+# es_query, map_render, http), counters for API calls, tokens, cache lookups and errors, and
+# gauges read from other components at scrape time. Exposed as Prometheus text by app.py's
+# /metrics and as a JSON summary at the end of an ingest run.
+
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Seconds; spans a cached lookup up to a slow LLM call or force-merge
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SAMPLES_KEPT = 2048     # most recent observations per series, for summary percentiles
+PREFIX = "sailing"
+
+COUNTERS = {
+    "api_calls": "External API requests by service and operation",
+    "tokens": "OpenAI tokens consumed by model and kind",
+    "cache": "Cache lookups by cache and result",
+    "documents": "Documents bulk-written to Elasticsearch by result",
+    "errors": "Failures by stage",
+    "retries": "Rate-limit retries by service",
+    "http_requests": "HTTP requests by endpoint and status",
+}
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: tuple) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+
+
+class Metrics:
+    """Thread-safe registry of stage histograms, counters and scrape-time gauges."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._collectors = {}       # name -> fn() returning {gauge: value}
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hist = {}         # (stage, labels) -> [bucket counts..., +Inf count, sum]
+            self._samples = {}      # (stage, labels) -> deque of recent observations
+            self._counters = {}     # (name, labels) -> value
+            self.started = time.time()
+
+    # ——— Recording ————————————————————————————————————————————————
+
+    def observe(self, stage: str, seconds: float, **labels) -> None:
+        key = (stage, _labels(labels))
+        with self._lock:
+            h = self._hist.get(key)
+            if h is None:
+                h = self._hist[key] = [0] * (len(self.buckets) + 2)
+                self._samples[key] = deque(maxlen=SAMPLES_KEPT)
+            for i, b in enumerate(self.buckets):
+                if seconds <= b:
+                    h[i] += 1
+            h[-2] += 1
+            h[-1] += seconds
+            self._samples[key].append(seconds)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        if name not in COUNTERS:
+            raise ValueError(f"Unknown counter '{name}'")
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        """Time the block as one `stage` observation; an exception also counts as a stage error."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("errors", stage=stage)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - t0, **labels)
+
+    def timed_iter(self, stage: str, iterable, **labels):
+        """
+        Yield from iterable, timing only the work of producing its items (e.g. a lazy parser,
+        wherever it ends up being consumed) as one `stage` observation once it is exhausted
+        or closed; an exception also counts as a stage error.
+        """
+        it = iter(iterable)
+        spent = 0.0
+        try:
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                except Exception:
+                    self.inc("errors", stage=stage)
+                    raise
+                finally:
+                    spent += time.perf_counter() - t0
+                yield item
+        finally:
+            self.observe(stage, spent, **labels)
+
+    def timed(self, stage: str, **labels):
+        """Decorator form of timer()."""
+        def wrap(fn):
+            def inner(*args, **kwargs):
+                with self.timer(stage, **labels):
+                    return fn(*args, **kwargs)
+            inner.__name__, inner.__doc__, inner.__wrapped__ = fn.__name__, fn.__doc__, fn
+            return inner
+        return wrap
+
+    def register_collector(self, name: str, fn) -> None:
+        """fn() -> {gauge_name: value}, read at scrape / summary time (e.g. cache hit counters)."""
+        self._collectors[name] = fn
+
+    # ——— Reporting ————————————————————————————————————————————————
+
+    def _gauges(self) -> dict:
+        out = {}
+        for name, fn in list(self._collectors.items()):
+            try:
+                out.update({f"{name}_{k}": v for k, v in fn().items() if isinstance(v, (int, float))})
+            except Exception as e:
+                print(f"[Warning] metrics collector '{name}' failed: {e}")
+        return out
+
+    def summary(self) -> dict:
+        """JSON-friendly snapshot: per-stage count / total / mean / p50 / p95 / p99 / error rate, counters, gauges."""
+        with self._lock:
+            hist = {k: list(v) for k, v in self._hist.items()}
+            samples = {k: sorted(v) for k, v in self._samples.items()}
+            counters = dict(self._counters)
+        errors = {}
+        for (name, labels), v in counters.items():
+            if name == "errors":
+                errors[dict(labels)["stage"]] = v
+        stages = {}
+        for (stage, labels), h in sorted(hist.items()):
+            s = samples[(stage, labels)]
+            q = lambda p: round(s[min(len(s) - 1, int(p * len(s)))], 6)
+            key = stage + "".join(f"[{k}={v}]" for k, v in labels)
+            stages[key] = {"count": h[-2], "total_s": round(h[-1], 6), "mean_s": round(statistics.fmean(s), 6),
+                           "p50_s": q(0.50), "p95_s": q(0.95), "p99_s": q(0.99)}
+        for stage, n in errors.items():
+            count = sum(h[-2] for (st, _), h in hist.items() if st == stage)
+            stages.setdefault(stage, {})["error_rate"] = round(n / count, 6) if count else None
+        return {"uptime_s": round(time.time() - self.started, 3), "stages": stages,
+                "counters": {name + "".join(f"[{k}={v}]" for k, v in labels): v
+                             for (name, labels), v in sorted(counters.items())},
+                "gauges": self._gauges()}
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            hist = {k: list(v) for k, v in self._hist.items()}
+            counters = dict(self._counters)
+        lines = [f"# HELP {PREFIX}_stage_seconds Latency of each pipeline stage",
+                 f"# TYPE {PREFIX}_stage_seconds histogram"]
+        for (stage, labels), h in sorted(hist.items()):
+            labels = (("stage", stage),) + labels
+            for le, n in zip([str(b) for b in self.buckets] + ["+Inf"], h):
+                lines.append(f"{PREFIX}_stage_seconds_bucket{_fmt_labels(labels + (('le', le),))} {n}")
+            lines.append(f"{PREFIX}_stage_seconds_sum{_fmt_labels(labels)} {h[-1]}")
+            lines.append(f"{PREFIX}_stage_seconds_count{_fmt_labels(labels)} {h[-2]}")
+        for name, help_text in COUNTERS.items():
+            series = sorted((labels, v) for (n, labels), v in counters.items() if n == name)
+            lines += [f"# HELP {PREFIX}_{name}_total {help_text}", f"# TYPE {PREFIX}_{name}_total counter"]
+            lines += [f"{PREFIX}_{name}_total{_fmt_labels(labels)} {v}" for labels, v in series]
+        for name, v in sorted(self._gauges().items()):
+            lines += [f"# TYPE {PREFIX}_{name} gauge", f"{PREFIX}_{name} {v}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def record_openai_usage(model: str, usage) -> None:
+    """Count tokens from an OpenAI response's `usage` (absent on some mocks / errors)."""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        n = getattr(usage, kind, None)
+        if n:
+            metrics.inc("tokens", n, model=model, kind=kind.split("_")[0])
+
+
+class RequestProfiler:
+    """
+    Profile one unit of work: kind "pyinstrument" (if installed) or anything else for
+    cProfile. stop() returns the report as text (pyinstrument: HTML).
+    """
+
+    def __init__(self, kind: str = "cprofile"):
+        self.kind = kind
+        if kind == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("[Warning] pyinstrument is not installed, profiling with cProfile")
+                self.kind = "cprofile"
+            else:
+                self._profiler = Profiler(async_mode="disabled")
+        if self.kind != "pyinstrument":
+            import cProfile
+            self._profiler = cProfile.Profile()
+        self._profiler.start() if self.kind == "pyinstrument" else self._profiler.enable()
+
+    @property
+    def mimetype(self) -> str:
+        return "text/html" if self.kind == "pyinstrument" else "text/plain"
+
+    def stop(self, limit: int = 60) -> str:
+        if self.kind == "pyinstrument":
+            self._profiler.stop()
+            return self._profiler.output_html()
+        import io
+        import pstats
+        self._profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
@@ -1,6 +1,10 @@
 import math
 from typing import List, Tuple
 
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
 def refine_passage(
     waypoints: List[Tuple[float, float]],
     interpolation_distance: float
@@ -93,6 +97,73 @@ def find_destination_point(start_point: Tuple[float, float], bearing_deg: float,
     
     return (math.degrees(lat2), math.degrees(lon2))
 
+def haversine_distance_array(p1: np.ndarray, p2: np.ndarray) -> np.ndarray:
+    """Vectorized haversine_distance for (N, 2) arrays of (lat, lon) in degrees."""
+    lat1, lon1 = np.radians(p1[:, 0]), np.radians(p1[:, 1])
+    lat2, lon2 = np.radians(p2[:, 0]), np.radians(p2[:, 1])
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def calculate_initial_bearing_array(p1: np.ndarray, p2: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_initial_bearing for (N, 2) arrays; bearings in degrees."""
+    lat1, lon1 = np.radians(p1[:, 0]), np.radians(p1[:, 1])
+    lat2, lon2 = np.radians(p2[:, 0]), np.radians(p2[:, 1])
+    dLon = lon2 - lon1
+    x = np.sin(dLon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dLon)
+    return np.degrees(np.arctan2(x, y))
+
+def find_destination_point_array(start_points: np.ndarray, bearing_deg: np.ndarray, distance_km: np.ndarray) -> np.ndarray:
+    """Vectorized find_destination_point; returns an (N, 2) array of (lat, lon)."""
+    lat1, lon1 = np.radians(start_points[:, 0]), np.radians(start_points[:, 1])
+    bearing = np.radians(bearing_deg)
+    ang = distance_km / EARTH_RADIUS_KM
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(ang) + np.cos(lat1) * np.sin(ang) * np.cos(bearing))
+    lon2 = lon1 + np.arctan2(np.sin(bearing) * np.sin(ang) * np.cos(lat1),
+                             np.cos(ang) - np.sin(lat1) * np.sin(lat2))
+    return np.column_stack((np.degrees(lat2), np.degrees(lon2)))
+
+def refine_passage_geospatial_array(
+    waypoints: np.ndarray,
+    interpolation_distance_km: float
+) -> np.ndarray:
+    """
+    Array-based refine_passage_geospatial: takes an (N, 2) array of (lat, lon) and
+    returns the refined (M, 2) array.
+
+    All segment lengths, bearings and interpolated points are computed in single
+    vectorized passes. Each segment contributes its interpolated points followed by
+    its end point; an end point is only dropped when it repeats the segment start.
+    """
+    if interpolation_distance_km <= 0:
+        raise ValueError("Interpolation distance must be a positive number.")
+    pts = np.asarray(waypoints, dtype=np.float64).reshape(-1, 2)
+    if len(pts) < 2:
+        return pts
+
+    starts, ends = pts[:-1], pts[1:]
+    seg_len = haversine_distance_array(starts, ends)
+    bearings = calculate_initial_bearing_array(starts, ends)
+    n_new = np.where(seg_len > interpolation_distance_km,
+                     np.floor(seg_len / interpolation_distance_km), 0).astype(np.int64)
+    keep_end = (n_new > 0) | np.any(ends != starts, axis=1)
+
+    # Row r of the output (after the first waypoint) belongs to segment seg[r] at step j[r];
+    # step n_new+1 is the segment's end point.
+    counts = n_new + keep_end
+    seg = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    j = np.arange(len(seg)) - np.repeat(offsets, counts) + 1
+    is_end = j > n_new[seg]
+
+    out = np.empty((len(seg) + 1, 2), dtype=np.float64)
+    out[0] = pts[0]
+    interp = ~is_end
+    out[1:][interp] = find_destination_point_array(starts[seg[interp]], bearings[seg[interp]],
+                                                   j[interp] * interpolation_distance_km)
+    out[1:][is_end] = ends[seg[is_end]]
+    return out
+
 def refine_passage_geospatial(
     waypoints: List[Tuple[float, float]],
     interpolation_distance_km: float
@@ -101,33 +172,57 @@ def refine_passage_geospatial(
     Refines a passage plan using GEOSPATIAL coordinates (lat/lon).
     
     This function correctly calculates distances and interpolates points along
-    great-circle paths on the Earth's surface.
+    great-circle paths on the Earth's surface. It wraps
+    `refine_passage_geospatial_array` and returns a list of (lat, lon) tuples.
     """
     if interpolation_distance_km <= 0:
         raise ValueError("Interpolation distance must be a positive number.")
     if not waypoints or len(waypoints) < 2:
         return waypoints
 
-    refined_path = [waypoints[0]]
-    for i in range(len(waypoints) - 1):
-        start_point = waypoints[i]
-        end_point = waypoints[i+1]
-
-        segment_length = haversine_distance(start_point, end_point)
-        if segment_length <= interpolation_distance_km:
-            if end_point not in refined_path:
-                refined_path.append(end_point)
+    return list(map(tuple, refine_passage_geospatial_array(waypoints, interpolation_distance_km).tolist()))
+
+def refined_point_count(waypoints, interpolation_distance_km: float) -> int:
+    """Upper bound on len(refine_passage_geospatial_array(...)) without building it."""
+    pts = np.asarray(waypoints, dtype=np.float64).reshape(-1, 2)
+    if len(pts) < 2:
+        return len(pts)
+    seg_len = haversine_distance_array(pts[:-1], pts[1:])
+    return int(np.floor(seg_len / interpolation_distance_km).sum()) + len(pts)
+
+def mercator_pixels(points: np.ndarray, zoom: float) -> np.ndarray:
+    """(lat, lon) degrees -> Web Mercator pixel (x, y) at `zoom` (256 px tiles), as Leaflet draws them."""
+    scale = 256.0 * 2.0 ** zoom
+    lat = np.radians(np.clip(points[:, 0], -85.05112878, 85.05112878))
+    x = (points[:, 1] + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * scale
+    return np.column_stack((x, y))
+
+def simplify_passage_array(points: np.ndarray, zoom: float, tolerance_px: float = 1.0) -> np.ndarray:
+    """
+    Douglas-Peucker simplification of an (N, 2) (lat, lon) array for display at `zoom`:
+    drops every point within tolerance_px screen pixels of the line through its kept
+    neighbours. Distances are measured in Web Mercator pixels, the projection the map
+    draws straight segments in, so interpolated great-circle points are only kept
+    where the curve is visible at that zoom. End points are always kept.
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(pts) < 3 or tolerance_px <= 0:
+        return pts
+    xy = mercator_pixels(pts, zoom)
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
             continue
-
-        bearing = calculate_initial_bearing(start_point, end_point)
-        num_new_points = int(segment_length / interpolation_distance_km)
-
-        for j in range(1, num_new_points + 1):
-            step_distance = j * interpolation_distance_km
-            new_point = find_destination_point(start_point, bearing, step_distance)
-            refined_path.append(new_point)
-
-        if end_point not in refined_path:
-            refined_path.append(end_point)
-            
-    return refined_path
\ No newline at end of file
+        ab, rel = xy[j] - xy[i], xy[i + 1:j] - xy[i]
+        length2 = ab @ ab
+        t = np.clip(rel @ ab / length2, 0.0, 1.0) if length2 > 0 else np.zeros(len(rel))
+        dist = np.hypot(*(rel - t[:, None] * ab).T)
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance_px:
+            keep[i + 1 + k] = True
+            stack += [(i, i + 1 + k), (i + 1 + k, j)]
+    return pts[keep]
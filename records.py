@@ -0,0 +1,141 @@
+# records.py
+# Compact in-memory records: slotted Section / Feature dataclasses for the ingest pipeline and a
+# columnar FeatureTable (NumPy lat/lon, interned names, categorical section ids) for read paths
+# that hold every feature at once (map, corridor, viewport, export). Records also answer
+# dict-style lookups (sec["content"], feat["location"]) so code written against the Elasticsearch
+# document shape keeps working.
+
+import sys
+from array import array
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(slots=True)
+class Section:
+    """A numbered pilot-book section and the headings it sits under."""
+    id: str
+    title: str
+    content: str
+    chapter: str | None = None
+    section: str | None = None
+    subsection: str | None = None
+
+    @property
+    def parents(self) -> dict:
+        return {k: v for k, v in (("chapter", self.chapter), ("section", self.section),
+                                  ("subsection", self.subsection)) if v}
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "title": self.title, "parents": self.parents, "content": self.content}
+
+
+@dataclass(slots=True)
+class Feature:
+    """A named charted point, optionally tied to the section citing it."""
+    name: str
+    lat: float
+    lon: float
+    section_id: str | None = None
+
+    @property
+    def location(self) -> dict:
+        return {"lat": self.lat, "lon": self.lon}
+
+    @property
+    def feature_id(self) -> str:
+        return feature_id(self.section_id, self.name)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def to_dict(self) -> dict:
+        """Extraction shape {name, location}, as cached and stored on section docs."""
+        return {"name": self.name, "location": self.location}
+
+    def to_doc(self) -> dict:
+        """Features-index document."""
+        return {"feature_id": self.feature_id, "name": self.name, "location": self.location,
+                "section_id": self.section_id}
+
+    @classmethod
+    def from_dict(cls, d: dict, section_id: str | None = None) -> "Feature":
+        return cls(d["name"], d["location"]["lat"], d["location"]["lon"], d.get("section_id", section_id))
+
+
+def feature_id(section_id, name: str) -> str:
+    return f"{section_id}_{name.replace(' ', '_')}"
+
+
+class FeatureTable:
+    """
+    Features as columns: lat / lon float64 arrays, names as interned strings and section
+    ids as int32 codes into `section_ids`. Indexing with an int returns the feature doc
+    ({feature_id, name, location, section_id}) built on the fly, so a table can stand in
+    for a list of feature docs; feature ids are derived, not stored.
+    """
+
+    def __init__(self, lats, lons, names: list[str], section_codes, section_ids: list[str]):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.names = names
+        self.section_codes = np.asarray(section_codes, dtype=np.int32)
+        self.section_ids = section_ids
+
+    @classmethod
+    def from_docs(cls, docs) -> "FeatureTable":
+        """Build from an iterable of feature docs or Feature records, consuming it once."""
+        lats, lons, codes = array("d"), array("d"), array("i")
+        names, section_ids, code_of = [], [], {}
+        intern = sys.intern
+        for d in docs:
+            if isinstance(d, Feature):
+                lat, lon, name, sid = d.lat, d.lon, d.name, d.section_id
+            else:
+                lat, lon, name, sid = d["location"]["lat"], d["location"]["lon"], d["name"], d["section_id"]
+            lats.append(lat)
+            lons.append(lon)
+            names.append(intern(name))
+            code = code_of.get(sid)
+            if code is None:
+                code = code_of[sid] = len(section_ids)
+                section_ids.append(sid)
+            codes.append(code)
+        return cls(np.frombuffer(lats, dtype=np.float64) if lats else np.zeros(0),
+                   np.frombuffer(lons, dtype=np.float64) if lons else np.zeros(0),
+                   names, np.frombuffer(codes, dtype=np.int32) if codes else np.zeros(0, dtype=np.int32),
+                   section_ids)
+
+    def __len__(self):
+        return len(self.names)
+
+    def section_id(self, i: int) -> str:
+        return self.section_ids[self.section_codes[i]]
+
+    def __getitem__(self, i: int) -> dict:
+        sid = self.section_ids[self.section_codes[i]]
+        return {"feature_id": feature_id(sid, self.names[i]), "name": self.names[i],
+                "location": {"lat": float(self.lats[i]), "lon": float(self.lons[i])}, "section_id": sid}
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def feature(self, i: int) -> Feature:
+        return Feature(self.names[i], float(self.lats[i]), float(self.lons[i]), self.section_id(i))
+
+    def take(self, idx) -> "FeatureTable":
+        """Sub-table of the rows in idx (sharing the section id list)."""
+        idx = np.asarray(idx, dtype=np.int64)
+        return FeatureTable(self.lats[idx], self.lons[idx], [self.names[i] for i in idx.tolist()],
+                            self.section_codes[idx], self.section_ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate footprint: arrays plus the name and section id strings."""
+        strings = sum(map(sys.getsizeof, dict.fromkeys(self.names))) + sum(map(sys.getsizeof, self.section_ids))
+        return (self.lats.nbytes + self.lons.nbytes + self.section_codes.nbytes + strings
+                + sys.getsizeof(self.names) + sys.getsizeof(self.section_ids))
@@ -0,0 +1,79 @@
+# route_format.py
+# Compact encodings of refined passages for /api/route: Google encoded polylines, packed
+# little-endian float32 (lat, lon) pairs and GeoJSON LineStrings, plus the legacy
+# {"refined": [[lat, lon], ...]} list.
+
+import hashlib
+import json
+
+import numpy as np
+
+ROUTE_FORMATS = ("json", "polyline", "float32", "geojson")
+MIMETYPES = {"json": "application/json", "polyline": "application/json",
+             "float32": "application/octet-stream", "geojson": "application/geo+json"}
+
+
+def encode_polyline(points, precision: int = 5) -> str:
+    """
+    Google encoded polyline of (lat, lon) points: zig-zagged deltas of the coordinates
+    scaled by 10**precision, in 5-bit chunks offset by 63. ~5-6 bytes per point.
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(pts):
+        return ""
+    scaled = np.floor(pts * 10 ** precision + 0.5).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    # Up to 7 chunks per value (enough for 35 bits, i.e. precision <= 7); all but the last carry 0x20
+    shifts = 5 * np.arange(7)
+    n_chunks = 1 + (values[:, None] >= (1 << shifts[1:])).sum(axis=1)
+    chunks = (values[:, None] >> shifts) & 0x1F
+    chunks |= np.where(shifts / 5 < (n_chunks - 1)[:, None], 0x20, 0)
+    used = shifts / 5 < n_chunks[:, None]
+    return (chunks[used] + 63).astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> np.ndarray:
+    """Inverse of encode_polyline: (N, 2) array of (lat, lon)."""
+    values, value, shift = [], 0, 0
+    for c in encoded.encode("ascii"):
+        c -= 63
+        value |= (c & 0x1F) << shift
+        shift += 5
+        if c < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+    return np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+
+
+def route_to_float32(points) -> bytes:
+    """Interleaved little-endian float32 lat, lon (8 bytes per point, ~1 m resolution)."""
+    return np.asarray(points, dtype="<f4").reshape(-1, 2).tobytes()
+
+
+def route_to_geojson(points, properties: dict | None = None) -> dict:
+    """LineString Feature (GeoJSON coordinates are [lon, lat]), rounded to 6 decimals (~0.1 m)."""
+    coords = np.round(np.asarray(points, dtype=np.float64).reshape(-1, 2)[:, ::-1], 6).tolist()
+    return {"type": "Feature", "geometry": {"type": "LineString", "coordinates": coords},
+            "properties": properties or {}}
+
+
+def encode_route(points, fmt: str, precision: int = 5, properties: dict | None = None) -> str | bytes:
+    """Response body of `points` in one of ROUTE_FORMATS (content type in MIMETYPES)."""
+    if fmt == "float32":
+        return route_to_float32(points)
+    if fmt == "geojson":
+        return json.dumps(route_to_geojson(points, properties), separators=(",", ":"))
+    if fmt == "polyline":
+        return json.dumps({"polyline": encode_polyline(points, precision), "precision": precision,
+                           **(properties or {})}, separators=(",", ":"))
+    if fmt == "json":
+        return json.dumps({"refined": np.asarray(points).tolist()})
+    raise ValueError(f"Unknown route format '{fmt}'")
+
+
+def route_key(waypoints, **params) -> str:
+    """Cache key: hash of the waypoints and every parameter shaping the response."""
+    h = hashlib.sha1(np.asarray(waypoints, dtype=np.float64).tobytes())
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
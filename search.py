@@ -1,35 +1,132 @@
+import hashlib
+import json
+import re
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from elasticsearch import BadRequestError, helpers
 from config import *
-from llm import llm_extract_features, parse_dms_pair
+from cache import content_key, get_cache, query_embedding_cache
+from fusion import fuse
+from coords import parse_dms_pair
+from extract import extract_features
+from llm import with_retry
+from metrics import metrics, record_openai_usage
+from records import feature_id
+from vectors import byte_vector
 
 # ——— Index setup ————————————————————————————————————————————————
+EMBED_CACHE_VERSION = "1"
+MODEL_DIMS = {"text-embedding-ada-002":1536,"text-embedding-3-small":1536,"text-embedding-3-large":3072}
+
+def embed_dims() -> int:
+    """Size of content_vector: EMBED_DIMS when shortening embeddings, else the model's native size."""
+    return EMBED_DIMS or MODEL_DIMS.get(EMBED_MODEL,1536)
+
+def embedding_params() -> dict:
+    """Model arguments for embeddings.create (dimensions only when EMBED_DIMS is set)."""
+    return {"model":EMBED_MODEL,**({"dimensions":EMBED_DIMS} if EMBED_DIMS else {})}
+
+def index_vector(vec):
+    """An embedding as stored in / queried against content_vector (int8 when VECTOR_ELEMENT_TYPE=byte)."""
+    return byte_vector(vec) if VECTOR_ELEMENT_TYPE=="byte" else vec
+
+def content_vector_mapping() -> dict:
+    mapping={"type":"dense_vector","dims":embed_dims(),"index":True,"similarity":"cosine",
+             "index_options":{"type":"hnsw","m":HNSW_M,"ef_construction":HNSW_EF_CONSTRUCTION}}
+    if VECTOR_ELEMENT_TYPE=="byte": mapping["element_type"]="byte"
+    elif VECTOR_ELEMENT_TYPE=="int8_hnsw": mapping["index_options"]["type"]="int8_hnsw"
+    elif VECTOR_ELEMENT_TYPE!="float": raise ValueError(f"Unknown VECTOR_ELEMENT_TYPE '{VECTOR_ELEMENT_TYPE}'")
+    return mapping
+
+def create_embeddings(inputs: list[str]):
+    """One embeddings request (retrying on 429), timed and counted; returns resp.data in input order."""
+    metrics.inc("api_calls",service="openai",op="embeddings")
+    with metrics.timer("embed"):
+        resp=with_retry(lambda: get_openai().embeddings.create(**embedding_params(), input=inputs))
+    record_openai_usage(EMBED_MODEL,getattr(resp,"usage",None))
+    return sorted(resp.data,key=lambda d: d.index)
+
 def embed(text: str) -> list[float]:
     """Generate embedding via OpenAI 1.x"""
-    resp = openai_client.embeddings.create(model=EMBED_MODEL, input=[text])
-    return resp.data[0].embedding
+    return embed_batch([text])[0]
 
-def ensure_index(es,name:str):
-    mapping={"properties":{
+def embed_query(query: str) -> list[float]:
+    """Embedding for a search query, served from the in-process query cache when hot."""
+    return query_embedding_cache.get_or_compute(query,embed)
+
+def embed_queries(queries: list[str]) -> list[list[float]]:
+    """
+    Embeddings for many search queries: hot ones come from the query cache, and every
+    distinct uncached query goes out in as few embeddings requests as possible.
+    """
+    out=[query_embedding_cache.peek(q) for q in queries]
+    todo={}
+    for q,v in zip(queries,out):
+        if v is None: todo.setdefault(query_embedding_cache.normalize(q),q)
+    pending=list(todo.items())
+    for start in range(0,len(pending),EMBED_BATCH_MAX_INPUTS):
+        chunk=pending[start:start+EMBED_BATCH_MAX_INPUTS]
+        for (key,q),d in zip(chunk,create_embeddings([q for _,q in chunk])):
+            query_embedding_cache.put(q,d.embedding)
+            todo[key]=d.embedding
+    return [v if v is not None else todo[query_embedding_cache.normalize(q)] for q,v in zip(queries,out)]
+
+def embed_cache_key(text: str) -> str:
+    """Content-cache key of text's embedding under the configured model and dimensions."""
+    model = f"{EMBED_MODEL}@{EMBED_DIMS}" if EMBED_DIMS else EMBED_MODEL
+    return content_key("embed", model, EMBED_CACHE_VERSION, text)
+
+def embed_batch(texts: list[str]) -> list[list[float]]:
+    """
+    Embed many texts in input order. Cached vectors are served from the content
+    cache; the rest go out in a single OpenAI request, retrying on 429.
+    """
+    cache = get_cache()
+    keys = [embed_cache_key(t) for t in texts]
+    out = [cache.get_vector(k) if cache is not None else None for k in keys]
+    missing = [i for i,v in enumerate(out) if v is None]
+    if missing:
+        for i,d in zip(missing, create_embeddings([texts[i] for i in missing])):
+            out[i] = d.embedding
+            if cache is not None: cache.put_vector(keys[i], d.embedding)
+    return out
+
+def sections_mapping() -> dict:
+    return {"properties":{
         "section_id":{"type":"keyword"},"title":{"type":"text"},
         "parents":{"type":"object"},"content":{"type":"text"},
-        "content_vector":{"type":"dense_vector","dims":1536},
+        "content_hash":{"type":"keyword"},
+        "content_vector":content_vector_mapping(),
         "features":{"type":"nested","properties":{
             "name":{"type":"text"},"location":{"type":"geo_point"}}},
         "locations":{"type":"geo_point"},
         "feature_names":{"type":"keyword"}
     }}
-    if not es.indices.exists(index=name):
-        es.indices.create(index=name,body={"mappings":mapping})
-    else:
-        es.indices.put_mapping(index=name,body=mapping)
 
-
-def ensure_features_index(es,name:str):
-    mapping={"properties":{
+def features_mapping() -> dict:
+    return {"properties":{
         "feature_id":{"type":"keyword"},
         "name":{"type":"text"},
         "location":{"type":"geo_point"},
         "section_id":{"type":"keyword"}
     }}
+
+def ensure_index(es,name:str):
+    mapping=sections_mapping()
+    if not es.indices.exists(index=name):
+        es.indices.create(index=name,body={"mappings":mapping})
+    else:
+        try:
+            es.indices.put_mapping(index=name,body=mapping)
+        except BadRequestError as e:
+            # dense_vector dims / element_type / index type can't be changed in place.
+            print(f"[Warning] Could not update mapping of '{name}', delete and re-index it to apply vector settings: {e}")
+
+
+def ensure_features_index(es,name:str):
+    mapping=features_mapping()
     if not es.indices.exists(index=name):
         es.indices.create(index=name,body={"mappings":mapping})
     else:
@@ -37,79 +134,386 @@ def ensure_features_index(es,name:str):
 
 # ——— Ingestion ————————————————————————————————————————————————
 
+def section_fingerprint(sec) -> str:
+    """Stable hash of everything in a parsed section that ends up in the index."""
+    payload=json.dumps([sec["title"],sec["parents"],sec["content"]],sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def section_doc(sec,vec,feats):
+    """Build the sections-index document for a parsed section (a Section record or dict)."""
+    feats=[{"name":f["name"],"location":f["location"]} for f in feats]
+    return {
+        "section_id":sec["id"],"title":sec["title"],
+        "parents":sec["parents"],"content":sec["content"],
+        "content_hash":section_fingerprint(sec),
+        "content_vector":index_vector(vec) if vec is not None else None,"features":feats,
+        "locations":[f["location"] for f in feats],"feature_names":[f['name'] for f in feats]
+    }
+
+def feature_docs(sec,feats):
+    """Yield (feature_id, doc) for each distinct feature of a section."""
+    seen=set()
+    for feat in feats:
+        key=(feat['name'],feat['location']['lat'],feat['location']['lon'],sec['id'])
+        if key in seen: continue
+        seen.add(key)
+        fid=feature_id(sec['id'],feat['name'])
+        yield fid,{"feature_id":fid,"name":feat['name'],"location":feat['location'],"section_id":sec['id']}
+
 def index_sections(es,sections,index_name,features_index):
+    """Kept for existing callers; indexes through index_sections_bulk."""
+    return index_sections_bulk(es,sections,index_name,features_index)
+
+
+def enrich_sections(sections,batch_size=INGEST_BATCH_SIZE,workers=INGEST_WORKERS):
+    """
+    Yield lists of (section, vector, features) per batch: each batch of sections is
+    embedded in one request while feature extraction runs on a bounded thread pool.
+    `sections` may be a generator (e.g. ingest.iter_sections); it is consumed lazily,
+    so callers time its parsing (metrics.timed_iter) wherever it actually runs.
+    """
+    it=iter(sections)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch=list(islice(it,batch_size))
+            if not batch: break
+            feat_futures=[pool.submit(extract_features,sec["content"]) for sec in batch]
+            vecs=embed_batch([sec["content"] for sec in batch])
+            yield [(sec,vec,fut.result()) for sec,vec,fut in zip(batch,vecs,feat_futures)]
+
+def bulk_write(es,actions,**kwargs):
+    """helpers.bulk without raising on per-document errors, timed as es_write; returns (ok, errors)."""
+    metrics.inc("api_calls",service="elasticsearch",op="bulk")
+    with metrics.timer("es_write"):
+        ok,errors=helpers.bulk(es,actions,raise_on_error=False,max_retries=INGEST_MAX_RETRIES,**kwargs)
+    metrics.inc("documents",ok,result="ok")
+    if errors:
+        metrics.inc("documents",len(errors),result="error")
+        metrics.inc("errors",stage="es_write")
+    return ok,errors
+
+def index_sections_bulk(es,sections,index_name,features_index,batch_size=INGEST_BATCH_SIZE,workers=INGEST_WORKERS):
+    """
+    Index sections and their features: sections are enriched in batches by
+    enrich_sections and the resulting section and feature documents are written
+    with the bulk helper. Accepts a generator, so writing starts before parsing ends.
+    """
+    total=len(sections) if hasattr(sections,"__len__") else "?"
+    done,nfeats=0,0
+    for batch in enrich_sections(sections,batch_size,workers):
+        actions=[]
+        for sec,vec,feats in batch:
+            nfeats+=len(feats)
+            actions.append({"_index":index_name,"_id":sec["id"],"_source":section_doc(sec,vec,feats)})
+            actions.extend({"_index":features_index,"_id":fid,"_source":fdoc} for fid,fdoc in feature_docs(sec,feats))
+        ok,errors=bulk_write(es,actions)
+        done+=len(batch)
+        if errors: print(f"[Warning] {len(errors)} bulk write errors, first: {errors[0]}")
+        print(f"Upserted {done}/{total} sections ({nfeats} feats so far)")
+    return done
+
+def indexed_fingerprints(es,index_name) -> dict[str,str|None]:
+    """Map section_id -> stored content_hash for every section currently indexed."""
+    if not es.indices.exists(index=index_name): return {}
+    hits=helpers.scan(es,index=index_name,query={"query":{"match_all":{}}},_source=["section_id","content_hash"])
+    return {h['_source']['section_id']:h['_source'].get('content_hash') for h in hits}
+
+def delete_section_features(es,features_index,section_ids):
+    """Remove every feature document belonging to the given sections."""
+    section_ids=list(section_ids)
+    for start in range(0,len(section_ids),1000):
+        es.delete_by_query(index=features_index,body={"query":{"terms":{"section_id":section_ids[start:start+1000]}}},
+                           refresh=True,conflicts="proceed")
+
+def index_sections_incremental(es,sections,index_name,features_index,batch_size=INGEST_BATCH_SIZE,workers=INGEST_WORKERS):
+    """
+    Diff a fresh parse against what is indexed and only pay for the delta: added or
+    modified sections are re-embedded and upserted (their old features replaced),
+    removed sections and their features are deleted.
+    """
+    sections=list(sections)
+    existing=indexed_fingerprints(es,index_name)
+    current={sec["id"] for sec in sections}
+    changed=[sec for sec in sections if existing.get(sec["id"])!=section_fingerprint(sec)]
+    removed=[sid for sid in existing if sid not in current]
+    modified=[sec["id"] for sec in changed if sec["id"] in existing]
+    print(f"Incremental re-index: {len(changed)-len(modified)} added, {len(modified)} modified, "
+          f"{len(removed)} removed, {len(sections)-len(changed)} unchanged")
+    if modified or removed:
+        delete_section_features(es,features_index,modified+removed)
+    if removed:
+        bulk_write(es,({"_op_type":"delete","_index":index_name,"_id":sid} for sid in removed))
+    if changed:
+        index_sections_bulk(es,changed,index_name,features_index,batch_size=batch_size,workers=workers)
+    return {"added":len(changed)-len(modified),"modified":len(modified),"removed":len(removed),
+            "unchanged":len(sections)-len(changed)}
 
-    for sec in sections:
-        vec = embed(sec["content"])
-        feats = llm_extract_features(sec["content"])
-        locs = [f["location"] for f in feats]
-        doc={
-            "section_id":sec["id"],"title":sec["title"],
-            "parents":sec["parents"],"content":sec["content"],
-            "content_vector":vec,"features":feats,
-            "locations":locs,"feature_names":[f['name'] for f in feats]
-        }
-        es.index(index=index_name,id=sec["id"],body=doc)
-        print(f"Upserted {sec['id']} with {len(feats)} feats")
-        seen=set()
-        for feat in feats:
-            key=(feat['name'],feat['location']['lat'],feat['location']['lon'],sec['id'])
-            if key in seen: continue
-            seen.add(key)
-            fid=f"{sec['id']}_{feat['name'].replace(' ','_')}"
-            fdoc={"feature_id":fid,"name":feat['name'],"location":feat['location'],"section_id":sec['id']}
-            es.index(index=features_index,id=fid,body=fdoc)
+# ——— Bulk-load profile and versioned rebuilds ———————————————————————
+# Loads run with refresh off (and, for indices nobody searches yet, no replicas); settings are
+# restored and segments merged afterwards. Full rebuilds go into new timestamped indices that
+# the search aliases (ES_INDEX_NAME / ES_FEATURES_INDEX) are switched to in one atomic call.
+
+BULK_LOAD_SETTINGS={"refresh_interval":"-1","number_of_replicas":0}
+
+def _index_settings(es,index,keys):
+    res=es.indices.get_settings(index=index,flat_settings=True)
+    return {k:next(iter(res.values()))["settings"].get(f"index.{k}") for k in keys}
+
+@contextmanager
+def bulk_load(es,indices,replicas:bool=False,force_merge:bool=True,restore:dict=None):
+    """
+    Apply BULK_LOAD_SETTINGS to indices for the duration of a load (keeping replicas if
+    replicas=True, e.g. for live indices), then restore the previous settings (or
+    `restore`), refresh, and force-merge to one segment. Clusters that refuse a setting
+    just load slower.
+    """
+    profile={k:v for k,v in BULK_LOAD_SETTINGS.items() if not replicas or k!="number_of_replicas"}
+    saved={}
+    for index in indices:
+        try:
+            saved[index]=restore if restore is not None else _index_settings(es,index,profile)
+            es.indices.put_settings(index=index,body={"index":profile})
+        except BadRequestError as e:
+            print(f"[Warning] Could not apply bulk-load settings to '{index}': {e}")
+    try:
+        yield
+    finally:
+        for index,prev in saved.items():
+            # None resets a setting that was never set explicitly to the cluster default.
+            es.indices.put_settings(index=index,body={"index":prev})
+        for index in indices:
+            es.indices.refresh(index=index)
+            if force_merge:
+                try:
+                    es.options(request_timeout=INDEX_FORCE_MERGE_TIMEOUT).indices.forcemerge(index=index,max_num_segments=1)
+                except Exception as e:
+                    print(f"[Warning] Force-merge of '{index}' failed: {e}")
+
+_VERSIONED=re.compile(r"\d{14}(\d{3})?")    # timestamp to the millisecond (seconds only before)
+
+def versioned_index_name(alias:str) -> str:
+    now=time.time()
+    return f"{alias}-{time.strftime('%Y%m%d%H%M%S',time.localtime(now))}{int(now*1000)%1000:03d}"
+
+def alias_targets(es,alias:str) -> list[str]:
+    """Indices behind alias; [alias] if it is still a concrete index, [] if it doesn't exist."""
+    if es.indices.exists_alias(name=alias):
+        return list(es.indices.get_alias(name=alias))
+    return [alias] if es.indices.exists(index=alias) else []
+
+def swap_aliases(es,targets:dict[str,str],keep:int=INDEX_KEEP_PREVIOUS):
+    """
+    Point every alias in targets {alias: new_index} at its new index in one atomic
+    update_aliases call. A concrete index still using an alias name is dropped in the
+    same call; older versioned indices beyond the newest `keep` are deleted afterwards.
+    """
+    actions,old=[],{}
+    for alias,index in targets.items():
+        current=alias_targets(es,alias)
+        old[alias]=[i for i in current if i not in (index,alias)]
+        actions+=[{"remove_index":{"index":alias}}] if alias in current else \
+                 [{"remove":{"index":i,"alias":alias}} for i in old[alias]]
+        actions.append({"add":{"index":index,"alias":alias}})
+    es.indices.update_aliases(body={"actions":actions})
+    for alias,index in targets.items():
+        versions=sorted(i for i in es.indices.get(index=f"{alias}-*") if i!=index and _VERSIONED.fullmatch(i[len(alias)+1:]))
+        for stale in versions[:max(len(versions)-keep,0)]:
+            es.indices.delete(index=stale)
+            print(f"Deleted previous index {stale}")
+
+def rebuild_indices(es,sections,index_name=ES_INDEX_NAME,features_index=ES_FEATURES_INDEX,
+                    batch_size=INGEST_BATCH_SIZE,workers=INGEST_WORKERS) -> dict:
+    """
+    Full re-index without touching what searches see: build new versioned sections and
+    features indices under the bulk-load profile, then swap both aliases at once.
+    """
+    new_sections,new_features=versioned_index_name(index_name),versioned_index_name(features_index)
+    for index,mapping in ((new_sections,sections_mapping()),(new_features,features_mapping())):
+        es.indices.create(index=index,body={"mappings":mapping,"settings":{"index":BULK_LOAD_SETTINGS}})
+    t0=time.perf_counter()
+    # Created with the load profile, so "restoring" applies the serving settings.
+    with bulk_load(es,[new_sections,new_features],restore={"refresh_interval":None,"number_of_replicas":INDEX_REPLICAS}):
+        n=index_sections_bulk(es,sections,new_sections,new_features,batch_size=batch_size,workers=workers)
+    load_s=time.perf_counter()-t0
+    swap_aliases(es,{index_name:new_sections,features_index:new_features})
+    print(f"Rebuilt {n} sections into {new_sections} / {new_features} in {load_s:.1f}s and swapped aliases")
+    return {"sections":n,"index":new_sections,"features_index":new_features,"seconds":round(load_s,1)}
 
 # ——— Searches —————————————————————————————————————————————
+# Each search is split into a *_body builder and a *_results parser so the sync functions
+# below and the async service (async_search.py) send identical requests.
+
+SECTION_SOURCE=["section_id","title"]
+GEO_SOURCE=["section_id","features"]
+FEATURE_SOURCE=["feature_id","name","location","section_id"]
 
-def semantic_search(es,index_name,query,k=5):
-    qv=embed(query)
-    body={"size":k,"query":{"script_score":{
-        "query":{"match_all":{}},
-        "script":{"source":"cosineSimilarity(params.query_vector,'content_vector')+1.0","params":{"query_vector":qv}}
-    }}}
-    res=es.search(index=index_name,body=body)
+def lean_body(body,source,lean=LEAN_RESPONSES):
+    """body limited to the `source` fields (and without hit counting) when lean."""
+    if not lean: return body
+    return {**body,"_source":source,"track_total_hits":TRACK_TOTAL_HITS}
+
+def knn_clause(qv,k,num_candidates=KNN_NUM_CANDIDATES,boost=None):
+    """Top-level approximate kNN clause over the HNSW-indexed content_vector."""
+    knn={"field":"content_vector","query_vector":index_vector(qv),"k":k,"num_candidates":max(num_candidates,k)}
+    if boost is not None: knn["boost"]=boost
+    return knn
+
+def semantic_body(qv,k=5,num_candidates=KNN_NUM_CANDIDATES,exact=False,lean=LEAN_RESPONSES):
+    if exact:
+        return lean_body({"size":k,"query":{"script_score":{
+            "query":{"match_all":{}},
+            "script":{"source":"cosineSimilarity(params.query_vector,'content_vector')+1.0","params":{"query_vector":index_vector(qv)}}
+        }}},SECTION_SOURCE,lean)
+    return lean_body({"size":k,"knn":knn_clause(qv,k,num_candidates)},SECTION_SOURCE,lean)
+
+def section_results(res):
     return [{"section_id":h['_source']['section_id'],"title":h['_source']['title'],"score":h['_score']} for h in res['hits']['hits']]
 
+def es_search(es,op,msearch=False,**kwargs):
+    """es.search (or es.msearch) timed as an es_query stage labelled with the search kind."""
+    metrics.inc("api_calls",service="elasticsearch",op="msearch" if msearch else "search")
+    with metrics.timer("es_query",op=op):
+        return es.msearch(**kwargs) if msearch else es.search(**kwargs)
 
-def geo_search(es,index_name,lat,lon,distance="10km"):
-    body={"query":{"nested":{"path":"features","query":{"geo_distance":{"distance":distance,"features.location":{"lat":lat,"lon":lon}}}}}}
-    res=es.search(index=index_name,body=body)
+def semantic_search(es,index_name,query,k=5,num_candidates=KNN_NUM_CANDIDATES,exact=False):
+    """
+    Vector search over content_vector. Uses the HNSW kNN query by default;
+    exact=True keeps the brute-force script_score scan (for recall comparisons).
+    """
+    qv=embed_query(query)
+    res=es_search(es,"semantic",index=index_name,body=semantic_body(qv,k,num_candidates,exact))
+    return section_results(res)
+
+
+def geo_body(lat,lon,distance="10km",lean=LEAN_RESPONSES):
+    return lean_body({"query":{"nested":{"path":"features","query":{"geo_distance":{"distance":distance,"features.location":{"lat":lat,"lon":lon}}}}}},GEO_SOURCE,lean)
+
+def geo_results(res):
     return [{"section_id":h['_source']['section_id'],"features":h['_source']['features'],"score":h['_score']} for h in res['hits']['hits']]
 
+def geo_search(es,index_name,lat,lon,distance="10km"):
+    res=es_search(es,"geo",index=index_name,body=geo_body(lat,lon,distance))
+    return geo_results(res)
 
-def geo_search_dms(es,coord_input,distance="10km"):
+
+def geo_dms_body(coord_input,distance="10km",lean=LEAN_RESPONSES):
     if isinstance(coord_input,str): lat,lon=parse_dms_pair(coord_input)
     else: lat,lon=coord_input
-    body={"query":{"geo_distance":{"distance":distance,"location":{"lat":lat,"lon":lon}}}}
-    res=es.search(index=ES_FEATURES_INDEX,body=body)
+    return lean_body({"query":{"geo_distance":{"distance":distance,"location":{"lat":lat,"lon":lon}}}},FEATURE_SOURCE,lean)
+
+def feature_results(res):
     return [{"feature_id":h['_source']['feature_id'],"name":h['_source']['name'],"location":h['_source']['location'],"section_id":h['_source']['section_id'],"score":h['_score']} for h in res['hits']['hits']]
 
+def geo_search_dms(es,coord_input,distance="10km"):
+    res=es_search(es,"geo_dms",index=ES_FEATURES_INDEX,body=geo_dms_body(coord_input,distance))
+    return feature_results(res)
 
-def lexical_search(es,index_name,term):
-    body={"query":{"bool":{"should":[
-        {"match_phrase":{"content":term}},
-        {"nested":{"path":"features","query":{"match_phrase":{"features.name":term}}}}
-    ]}}}
-    res=es.search(index=index_name,body=body)
+
+def lexical_body(term,lean=LEAN_RESPONSES):
+    if not lean:
+        return {"query":{"bool":{"should":[
+            {"match_phrase":{"content":term}},
+            {"nested":{"path":"features","query":{"match_phrase":{"features.name":term}}}}
+        ]}}}
+    # Named clauses: each hit reports which of them matched, so content needn't be fetched.
+    return lean_body({"query":{"bool":{"should":[
+        {"match_phrase":{"content":{"query":term,"_name":"content"}}},
+        {"nested":{"path":"features","query":{"match_phrase":{"features.name":term}},"_name":"features"}}
+    ]}}},SECTION_SOURCE,lean)
+
+def lexical_results(res,term):
     out=[]
     for h in res['hits']['hits']:
-        src=h['_source']; m=[]
-        if term.lower() in src['content'].lower(): m.append('content')
-        if any(term.lower() in f['name'].lower() for f in src['features']): m.append('features')
+        src=h['_source']
+        if 'content' not in src:
+            m=[q for q in ('content','features') if q in h.get('matched_queries',())]
+        else:
+            m=[]
+            if term.lower() in src['content'].lower(): m.append('content')
+            if any(term.lower() in f['name'].lower() for f in src['features']): m.append('features')
         out.append({"section_id":src['section_id'],"title":src['title'],"matched_in":m,"score":h['_score']})
     return out
 
+def lexical_search(es,index_name,term):
+    res=es_search(es,"lexical",index=index_name,body=lexical_body(term))
+    return lexical_results(res,term)
+
 
-def hybrid_search(es,index_name,query,alpha=0.5,k=5):
-    qv=embed(query)
-    body={"size":k,"query":{"script_score":{
-        "query":{"bool":{"should":[
-            {"match_phrase":{"content":{"query":query,"boost":1-alpha}}},
-            {"nested":{"path":"features","query":{"match_phrase":{"features.name":{"query":query,"boost":1-alpha}}}}}
-        ]}},
-        "script":{"source":"(cosineSimilarity(params.query_vector,'content_vector')+1.0)*params.alpha+_score*(1-params.alpha)","params":{"query_vector":qv,"alpha":alpha}}
-    }}}
-    res=es.search(index=index_name,body=body)
-    return [{"section_id":h['_source']['section_id'],"title":h['_source']['title'],"score":h['_score']} for h in res['hits']['hits']]
+def hybrid_body(qv,query,alpha=0.5,k=5,num_candidates=KNN_NUM_CANDIDATES,exact=False,lean=LEAN_RESPONSES):
+    lexical={"bool":{"should":[
+        {"match_phrase":{"content":{"query":query,"boost":1-alpha}}},
+        {"nested":{"path":"features","query":{"match_phrase":{"features.name":{"query":query,"boost":1-alpha}}}}}
+    ]}}
+    if exact:
+        return lean_body({"size":k,"query":{"script_score":{
+            "query":lexical,
+            "script":{"source":"(cosineSimilarity(params.query_vector,'content_vector')+1.0)*params.alpha+_score*(1-params.alpha)","params":{"query_vector":index_vector(qv),"alpha":alpha}}
+        }}},SECTION_SOURCE,lean)
+    return lean_body({"size":k,"query":lexical,"knn":knn_clause(qv,k,num_candidates,boost=alpha)},SECTION_SOURCE,lean)
+
+def fused_bodies(qv,query,k=5,num_candidates=KNN_NUM_CANDIDATES,window=HYBRID_WINDOW,lean=LEAN_RESPONSES):
+    """The two independent top-window requests (kNN, BM25) fused by hybrid_search."""
+    window=max(window,k)
+    return semantic_body(qv,window,num_candidates,lean=lean),{**lexical_body(query,lean),"size":window}
+
+def hybrid_search(es,index_name,query,alpha=0.5,k=5,num_candidates=KNN_NUM_CANDIDATES,exact=False,
+                  fusion=HYBRID_FUSION,window=HYBRID_WINDOW):
+    """
+    Lexical + vector search weighted by alpha.
+
+    fusion="rrf"/"weighted" runs a top-window kNN query and a top-window BM25 query in
+    one _msearch and fuses the two rankings client-side (see fusion.py), so vector-only
+    matches are candidates too. fusion="" combines the kNN clause (boost alpha) and the
+    phrase queries (boost 1-alpha) in one request; exact=True keeps the script_score
+    rescoring of lexical matches.
+    """
+    qv=embed_query(query)
+    if fusion and not exact:
+        vec_body,lex_body=fused_bodies(qv,query,k,num_candidates,window)
+        res=es_search(es,"hybrid",msearch=True,body=[{"index":index_name},vec_body,{"index":index_name},lex_body])
+        for r in res['responses']:
+            if 'error' in r: raise RuntimeError(f"hybrid sub-search failed: {r['error']}")
+        vec_res,lex_res=res['responses']
+        return fuse(section_results(vec_res),section_results(lex_res),alpha,k,fusion)
+    res=es_search(es,"hybrid",index=index_name,body=hybrid_body(qv,query,alpha,k,num_candidates,exact))
+    return section_results(res)
+
+
+# ——— Batch searches ———————————————————————————————————————————
+# Many queries in one round-trip per chunk_size searches (_msearch). Results come back in
+# input order; a sub-search that fails (or whose input can't be parsed) yields None.
+
+def msearch_ordered(es,requests,chunk_size=BATCH_CHUNK_SIZE):
+    """Run [(index, body) | None, ...] through _msearch in chunks, returning responses in input order."""
+    out=[None]*len(requests)
+    live=[i for i,r in enumerate(requests) if r is not None]
+    for start in range(0,len(live),chunk_size):
+        idx=live[start:start+chunk_size]
+        searches=[]
+        for i in idx:
+            index,body=requests[i]
+            searches.extend(({"index":index},body))
+        res=es_search(es,"batch",msearch=True,body=searches)
+        for i,r in zip(idx,res['responses']):
+            if 'error' in r: print(f"[Warning] batch sub-search {i} failed: {r['error']}")
+            else: out[i]=r
+    return out
+
+def batch_semantic_search(es,index_name,queries,k=5,num_candidates=KNN_NUM_CANDIDATES,chunk_size=BATCH_CHUNK_SIZE):
+    vecs=embed_queries(queries)
+    res=msearch_ordered(es,[(index_name,semantic_body(qv,k,num_candidates)) for qv in vecs],chunk_size)
+    return [section_results(r) if r is not None else None for r in res]
+
+def batch_lexical_search(es,index_name,terms,chunk_size=BATCH_CHUNK_SIZE):
+    res=msearch_ordered(es,[(index_name,lexical_body(t)) for t in terms],chunk_size)
+    return [lexical_results(r,t) if r is not None else None for r,t in zip(res,terms)]
 
+def batch_geo_search_dms(es,coord_inputs,distance="10km",chunk_size=BATCH_CHUNK_SIZE):
+    requests=[]
+    for c in coord_inputs:
+        try: requests.append((ES_FEATURES_INDEX,geo_dms_body(c,distance)))
+        except ValueError as e:
+            print(f"[Warning] Skipping coordinates {c!r}: {e}")
+            requests.append(None)
+    res=msearch_ordered(es,requests,chunk_size)
+    return [feature_results(r) if r is not None else None for r in res]
@@ -0,0 +1,78 @@
+# vectors.py
+# Compact storage for content_vector embeddings: unit vectors held as float32, float16 or int8
+# in one row-major NumPy matrix (memory-mappable from a .npy file), scored by cosine similarity.
+
+import os
+
+import numpy as np
+
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+INT8_SCALE = 127.0      # unit-vector components in [-1, 1] -> [-127, 127]
+SCORE_CHUNK_ROWS = 512
+
+
+def quantize(vectors, dtype: str = "float32") -> np.ndarray:
+    """Normalise vectors (one per row, or a single vector) to unit length and store them as dtype."""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown vector dtype '{dtype}'")
+    v = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(v, axis=-1, keepdims=True)
+    v = v / np.where(norms > 0, norms, 1.0)
+    if dtype == "int8":
+        return np.clip(np.rint(v * INT8_SCALE), -127, 127).astype(np.int8)
+    return v.astype(DTYPES[dtype])
+
+
+def byte_vector(vec) -> list[int]:
+    """A vector as the int8 values of an Elasticsearch `element_type: byte` dense_vector."""
+    return quantize(vec, "int8").tolist()
+
+
+class VectorStore:
+    """
+    Matrix of unit vectors (rows) in float32, float16 or int8. scores() returns
+    float32 cosine similarities, converting at most SCORE_CHUNK_ROWS rows at a time
+    so a quantized or memory-mapped matrix never gets a full float32 copy.
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+        self.dtype = np.dtype(matrix.dtype).name
+        if self.dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype '{self.dtype}'")
+
+    @classmethod
+    def from_vectors(cls, vectors, dims: int = 0, dtype: str = "float32") -> "VectorStore":
+        vectors = list(vectors) if not isinstance(vectors, np.ndarray) else vectors
+        if not len(vectors):
+            return cls(np.zeros((0, dims), dtype=DTYPES[dtype]))
+        return cls(quantize(np.stack(vectors) if isinstance(vectors, list) else vectors, dtype))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "VectorStore":
+        return cls(np.load(path, mmap_mode="r" if mmap else None))
+
+    def save(self, path: str):
+        # Write beside the old file and swap, so a store still mapping it stays valid.
+        tmp = path + ".tmp.npy"
+        np.save(tmp, np.ascontiguousarray(self.matrix))
+        os.replace(tmp, path)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes
+
+    def scores(self, query) -> np.ndarray:
+        """Cosine similarity of every row with query."""
+        q = quantize(query, "float32")
+        scale = 1.0 / INT8_SCALE if self.dtype == "int8" else 1.0
+        if self.dtype == "float32" and not isinstance(self.matrix, np.memmap):
+            return self.matrix @ q
+        out = np.empty(len(self.matrix), dtype=np.float32)
+        for start in range(0, len(self.matrix), SCORE_CHUNK_ROWS):
+            chunk = np.asarray(self.matrix[start:start + SCORE_CHUNK_ROWS], dtype=np.float32)
+            out[start:start + len(chunk)] = chunk @ q * scale
+        return out